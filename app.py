@@ -1,25 +1,72 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session, flash
-from models import db, Order, ProductionStage, TimeLog, User
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session, flash, g
+from models import (db, Order, ProductionStage, TimeLog, User, StageDurationSketch, Job, user_stages,
+                    validate_project_data, validate_session_limit)
+from reports import (parse_order_filters, order_filter_criteria, order_times_report, worker_productivity_report,
+                     stage_efficiency_report, dashboard_report, merge_order_times, merge_worker_productivity,
+                     merge_stage_efficiency, merge_dashboard, report_facets, merge_facets)
+from sketches import PROFILE_DIMENSIONS, record_session_duration, rebuild_sketches, stage_percentiles
+import estimator
+from wip import wip_index
+from timeline import order_timelines
+from importer import OrderImportError, import_orders
+from search import ensure_search_index, search_orders
+from exports import EXPORTS, XLSX_MIMETYPE, export_filename, write_export
+from jobs import JOB_KINDS, submit_job, recover_jobs, job_to_dict
+from scan_dedupe import scan_deduplicator
+from journal import (EVENT_START, EVENT_STOP, configured_instance_path, configured_journal_dir, scan_journal,
+                     segment_paths)
+from assets import init_assets
+from templating import init_templating
+from sweeper import SWEEP_ACTIONS, sweep_stale_sessions, sweep_reports, start_background_sweeps
+from profiling import (PROFILE_MODES, init_profiling, enable_profiling, disable_profiling, profiling_targets,
+                       recent_profiles, profile_file)
+from plants import (configure_plants, init_plants, current_plant, default_plant, use_plant, fan_out,
+                    plant_engine, plant_tables, plant_filename, PlantSession)
+from generations import init_write_generations
 from datetime import datetime
 from functools import wraps
+from werkzeug.datastructures import MultiDict
 import qrcode
 import io
+import math
 import os
 import secrets
-from openpyxl import Workbook
 
-app = Flask(__name__)
+# INSTANCE_PATH (absolute) moves the databases, journal and job artifacts, e.g. for the test suite
+app = Flask(__name__, instance_path=configured_instance_path())
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///production.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # Use environment variable for SECRET_KEY in production, generate random one for development
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+# How often the stage-time estimator is retrained in the background (seconds)
+app.config['ESTIMATOR_RETRAIN_INTERVAL'] = int(os.environ.get('ESTIMATOR_RETRAIN_INTERVAL', '3600'))
+# Number of processes running background jobs (exports, report rebuilds)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', '2'))
+# Repeated scans of the same order and stage within this window are answered from memory (seconds)
+app.config['SCAN_DEBOUNCE_SECONDS'] = float(os.environ.get('SCAN_DEBOUNCE_SECONDS', '2'))
+# How long responses to scans sent with an idempotency key are kept for retries (seconds)
+app.config['SCAN_IDEMPOTENCY_TTL'] = float(os.environ.get('SCAN_IDEMPOTENCY_TTL', '600'))
+# Sessions in progress longer than their stage's limit, or this default (minutes), are swept as stale
+app.config['STALE_SESSION_MINUTES'] = int(os.environ.get('STALE_SESSION_MINUTES', '720'))
+# What the sweep does with a stale session: 'close' it at the limit or 'flag' it for review
+app.config['STALE_SESSION_ACTION'] = os.environ.get('STALE_SESSION_ACTION', 'close')
+# How often the stale session sweep runs (seconds); 0 disables it
+app.config['STALE_SWEEP_INTERVAL'] = int(os.environ.get('STALE_SWEEP_INTERVAL', '300'))
+
+# Directory of the append-only scan event journal (see journal.py)
+app.config['SCAN_JOURNAL_DIR'] = configured_journal_dir(app.instance_path)
+
+# Plants (comma-separated PLANTS env var) each get their own database; see plants.py
+configure_plants(app)
 
 db.init_app(app)
-
-# ========== Constants for Project Data Validation ==========
-VALID_SYSTEMS = ['SLIM', 'JENSEN', 'LITE', 'OTTOSTUM', 'RPTECHNIK', 'W10']
-VALID_HANDLE_STYLES = ['1', '2', '3', '4', '5', 'kaseta']
-
+init_plants(app, db)
+init_write_generations(PlantSession)
+init_assets(app)
+init_templating(app)
+init_profiling(app, db)
+scan_deduplicator.debounce_seconds = app.config['SCAN_DEBOUNCE_SECONDS']
+scan_deduplicator.idempotency_seconds = app.config['SCAN_IDEMPOTENCY_TTL']
 
 # ========== Authentication Decorators ==========
 
@@ -53,12 +100,71 @@ def role_required(*roles):
     return decorator
 
 
+@app.before_request
+def select_plant():
+    """Route the request to the user's plant; admins and managers can pick one with ?plant=
+    
+    The choice is kept for later requests only when it comes from a page view (the
+    plant switcher); API calls with ?plant= use that plant for the one request.
+    """
+    plants = app.config['PLANTS']
+    g.plant = session.get('plant') if session.get('plant') in plants else plants[0]
+    requested = request.args.get('plant')
+    if requested in plants and session.get('role') in ['admin', 'manager']:
+        g.plant = requested
+        if request.method == 'GET' and not request.path.startswith('/api/'):
+            session['plant'] = requested
+
+
+@app.context_processor
+def inject_plants():
+    return {'plants': app.config['PLANTS'], 'current_plant': current_plant()}
+
+
+def plant_users_query():
+    """Users working in the current plant"""
+    if current_plant() == default_plant():
+        return User.query.filter(db.or_(User.plant == current_plant(), User.plant.is_(None)))
+    return User.query.filter(User.plant == current_plant())
+
+
+def assign_stages(user, stage_ids):
+    """Replace a user's stage links with those of the given ids that exist in the user's plant
+    
+    user_stages lives in the directory database and is written with table
+    statements, which the session routes there; relationship writes would go
+    through the plant's connection and lock the directory against this session.
+    """
+    with use_plant(user.plant or default_plant()):
+        stage_ids = [stage_id for stage_id, in db.session.query(ProductionStage.id)
+                     .filter(ProductionStage.id.in_(stage_ids))]
+    db.session.execute(user_stages.delete().where(user_stages.c.user_id == user.id))
+    if stage_ids:
+        db.session.execute(user_stages.insert(), [{'user_id': user.id, 'stage_id': stage_id}
+                                                  for stage_id in stage_ids])
+    db.session.expire(user, ['assigned_stages'])
+
+
 def get_current_user():
     """Get the currently logged-in user"""
     if 'user_id' in session:
         return User.query.get(session['user_id'])
     return None
 
+
+def resolve_worker(worker_id=None, worker_name=None):
+    """Resolve the worker for a scan: logged-in user first, then explicit id or name"""
+    user = get_current_user()
+    if user:
+        return user
+    if worker_id:
+        return User.query.get(worker_id)
+    if worker_name:
+        return User.query.filter(
+            db.or_(User.full_name == worker_name, User.username == worker_name)
+        ).order_by(User.is_active.desc(), User.id).first()
+    return None
+
 # Create QR codes directory
 QR_CODE_DIR = os.path.join(app.root_path, 'static', 'qr_codes')
 os.makedirs(QR_CODE_DIR, exist_ok=True)
@@ -87,6 +193,7 @@ def login():
             session['user_id'] = user.id
             session['username'] = user.username
             session['role'] = user.role
+            session['plant'] = user.plant or default_plant()
             flash(f'Witaj, {user.full_name}!', 'success')
             
             # Redirect to user's designated panel based on role
@@ -120,9 +227,13 @@ def logout():
 @role_required('admin')
 def admin_panel():
     """Admin panel for user and process management"""
-    users = User.query.all()
-    stages = ProductionStage.query.all()
-    return render_template('admin.html', users=users, stages=stages, user=get_current_user())
+    # Queries are passed unexecuted; cached page fragments skip them
+    users = plant_users_query()
+    stages = ProductionStage.query
+    return render_template('admin.html', users=users, stages=stages, user=get_current_user(),
+                           stale_session_hours=round(app.config['STALE_SESSION_MINUTES'] / 60, 1),
+                           stale_session_action=app.config['STALE_SESSION_ACTION'],
+                           stale_sweep_interval=app.config['STALE_SWEEP_INTERVAL'])
 
 
 @app.route('/api/users', methods=['GET', 'POST'])
@@ -131,14 +242,20 @@ def manage_users():
     """Get all users or create a new user"""
     if request.method == 'GET':
         users = User.query.all()
-        return jsonify([{
-            'id': user.id,
-            'username': user.username,
-            'full_name': user.full_name,
-            'role': user.role,
-            'is_active': user.is_active,
-            'assigned_stages': [{'id': s.id, 'name': s.name} for s in user.assigned_stages]
-        } for user in users]), 200
+        user_list = []
+        for user in users:
+            # Assigned stages live in the user's own plant database
+            with use_plant(user.plant or default_plant()):
+                user_list.append({
+                    'id': user.id,
+                    'username': user.username,
+                    'full_name': user.full_name,
+                    'role': user.role,
+                    'plant': user.plant or default_plant(),
+                    'is_active': user.is_active,
+                    'assigned_stages': [{'id': s.id, 'name': s.name} for s in user.assigned_stages]
+                })
+        return jsonify(user_list), 200
     
     elif request.method == 'POST':
         data = request.json
@@ -146,33 +263,42 @@ def manage_users():
         password = data.get('password')
         full_name = data.get('full_name')
         role = data.get('role')
+        plant = data.get('plant') or current_plant()
         stage_ids = data.get('stage_ids', [])
         
         if not all([username, password, full_name, role]):
             return jsonify({'error': 'All fields are required'}), 400
         
+        if plant not in app.config['PLANTS']:
+            return jsonify({'error': f'Invalid plant. Must be one of: {", ".join(app.config["PLANTS"])}'}), 400
+        
         if User.query.filter_by(username=username).first():
             return jsonify({'error': 'Username already exists'}), 400
         
-        user = User(username=username, full_name=full_name, role=role)
+        user = User(username=username, full_name=full_name, role=role, plant=plant)
         user.set_password(password)
+        db.session.add(user)
         
         # Assign stages if role is worker
         if role == 'worker' and stage_ids:
-            stages = ProductionStage.query.filter(ProductionStage.id.in_(stage_ids)).all()
-            user.assigned_stages = stages
+            db.session.flush()
+            assign_stages(user, stage_ids)
         
-        db.session.add(user)
         db.session.commit()
         
         return jsonify({
             'id': user.id,
             'username': user.username,
             'full_name': user.full_name,
-            'role': user.role
+            'role': user.role,
+            'plant': user.plant
         }), 201
 
 
+def worker_has_time_logs(user_id):
+    return db.session.query(TimeLog.id).filter(TimeLog.worker_id == user_id).first() is not None
+
+
 @app.route('/api/users/<int:user_id>', methods=['PUT', 'DELETE'])
 @role_required('admin')
 def manage_user(user_id):
@@ -190,36 +316,139 @@ def manage_user(user_id):
             user.is_active = data['is_active']
         if 'password' in data and data['password']:
             user.set_password(data['password'])
-        if 'stage_ids' in data:
-            stage_ids = data['stage_ids']
-            stages = ProductionStage.query.filter(ProductionStage.id.in_(stage_ids)).all()
-            user.assigned_stages = stages
+        if 'plant' in data:
+            if data['plant'] not in app.config['PLANTS']:
+                return jsonify({'error': f'Invalid plant. Must be one of: {", ".join(app.config["PLANTS"])}'}), 400
+            user.plant = data['plant']
         
-        db.session.commit()
+        if 'stage_ids' in data:
+            assign_stages(user, data['stage_ids'])
         
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'full_name': user.full_name,
-            'role': user.role,
-            'is_active': user.is_active,
-            'assigned_stages': [{'id': s.id, 'name': s.name} for s in user.assigned_stages]
-        }), 200
+        with use_plant(user.plant or default_plant()):
+            db.session.commit()
+            
+            return jsonify({
+                'id': user.id,
+                'username': user.username,
+                'full_name': user.full_name,
+                'role': user.role,
+                'plant': user.plant or default_plant(),
+                'is_active': user.is_active,
+                'assigned_stages': [{'id': s.id, 'name': s.name} for s in user.assigned_stages]
+            }), 200
     
     elif request.method == 'DELETE':
+        # Time logs of every plant keep pointing at the user; retire such accounts with is_active
+        if any(fan_out(worker_has_time_logs, user_id).values()):
+            return jsonify({'error': 'User has time logs and cannot be deleted; deactivate the account instead'}), 400
+        
+        db.session.execute(user_stages.delete().where(user_stages.c.user_id == user.id))
         db.session.delete(user)
         db.session.commit()
         return jsonify({'message': 'User deleted'}), 200
 
 
+
+# ========== Request Profiling ==========
+
+def profilable_rules():
+    return sorted({rule.rule for rule in app.url_map.iter_rules() if rule.endpoint not in ['static', 'asset']})
+
+
+@app.route('/admin/profiles')
+@role_required('admin')
+def profiles_panel():
+    """Admin page for profiling endpoints and browsing saved profiles"""
+    return render_template('profiles.html', rules=profilable_rules(), modes=PROFILE_MODES, user=get_current_user())
+
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST', 'DELETE'])
+@role_required('admin')
+def manage_profiling():
+    """List profiling targets and recent profiles, or switch profiling on or off for an endpoint
+    
+    Enable with {"rule": "/api/reports/order-times", "mode": "cprofile" or "sampling",
+    "sample_rate": fraction of requests to profile, "interval_ms": sampling interval}.
+    """
+    if request.method == 'GET':
+        return jsonify({
+            'targets': profiling_targets(),
+            'profiles': recent_profiles(request.args.get('limit', 50, type=int))
+        }), 200
+    
+    elif request.method == 'POST':
+        data = request.json or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        rule = data.get('rule')
+        mode = data.get('mode', 'sampling')
+        
+        if rule not in profilable_rules():
+            return jsonify({'error': 'Unknown endpoint'}), 400
+        if mode not in PROFILE_MODES:
+            return jsonify({'error': f'Invalid mode. Must be one of: {", ".join(PROFILE_MODES)}'}), 400
+        try:
+            sample_rate = float(data.get('sample_rate', 1.0))
+            interval_ms = int(data.get('interval_ms', 5))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'sample_rate and interval_ms must be numbers'}), 400
+        if not 0 < sample_rate <= 1:
+            return jsonify({'error': 'Sample rate must be greater than 0 and at most 1'}), 400
+        if not 1 <= interval_ms <= 1000:
+            return jsonify({'error': 'Sampling interval must be between 1 and 1000 ms'}), 400
+        
+        return jsonify(enable_profiling(rule, mode, sample_rate, interval_ms)), 201
+    
+    elif request.method == 'DELETE':
+        if not disable_profiling(request.args.get('rule')):
+            return jsonify({'error': 'Profiling is not enabled for this endpoint'}), 404
+        return jsonify({'message': 'Profiling disabled'}), 200
+
+
+@app.route('/api/admin/profiles/<profile_id>/<kind>')
+@role_required('admin')
+def download_profile(profile_id, kind):
+    """Download a saved profile as cProfile stats (prof) or collapsed stacks (collapsed)"""
+    path = profile_file(profile_id, kind)
+    if not path:
+        return jsonify({'error': 'Profile file not found'}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
+
+# ========== Stale Sessions ==========
+
+@app.route('/api/admin/stale-sessions', methods=['GET', 'POST'])
+@role_required('admin', 'manager')
+def manage_stale_sessions():
+    """List the current plant's recent stale session sweeps, or run a sweep now
+    
+    POST accepts an optional {"action": "close" or "flag"}; the configured action is the default.
+    """
+    if request.method == 'GET':
+        return jsonify({
+            'default_minutes': app.config['STALE_SESSION_MINUTES'],
+            'action': app.config['STALE_SESSION_ACTION'],
+            'interval_seconds': app.config['STALE_SWEEP_INTERVAL'],
+            'reports': sweep_reports()
+        }), 200
+    
+    elif request.method == 'POST':
+        data = request.json or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        action = data.get('action', app.config['STALE_SESSION_ACTION'])
+        if action not in SWEEP_ACTIONS:
+            return jsonify({'error': f'Invalid action. Must be one of: {", ".join(SWEEP_ACTIONS)}'}), 400
+        return jsonify(sweep_stale_sessions(app.config['STALE_SESSION_MINUTES'], action)), 200
+
+
 # ========== Designer Panel ==========
 
 @app.route('/designer')
 @role_required('admin', 'designer')
 def designer_panel():
     """Designer panel for creating orders and generating QR codes"""
-    orders = Order.query.order_by(Order.created_at.desc()).all()
-    return render_template('designer.html', orders=orders, user=get_current_user())
+    return render_template('designer.html', user=get_current_user())
 
 
 @app.route('/api/orders', methods=['POST'])
@@ -239,28 +468,9 @@ def create_order():
     if not order_number:
         return jsonify({'error': 'Order number is required'}), 400
     
-    # Validate system value
-    if system and system not in VALID_SYSTEMS:
-        return jsonify({'error': f'Invalid system. Must be one of: {", ".join(VALID_SYSTEMS)}'}), 400
-    
-    # Validate handle_style value
-    if handle_style and handle_style not in VALID_HANDLE_STYLES:
-        return jsonify({'error': f'Invalid handle style. Must be one of: {", ".join(VALID_HANDLE_STYLES)}'}), 400
-    
-    # Validate welding_frames_qty (1-15)
-    if welding_frames_qty is not None:
-        if not isinstance(welding_frames_qty, int) or welding_frames_qty < 1 or welding_frames_qty > 15:
-            return jsonify({'error': 'Welding frames quantity must be between 1 and 15'}), 400
-    
-    # Validate glazing_frames_qty (1-15)
-    if glazing_frames_qty is not None:
-        if not isinstance(glazing_frames_qty, int) or glazing_frames_qty < 1 or glazing_frames_qty > 15:
-            return jsonify({'error': 'Glazing frames quantity must be between 1 and 15'}), 400
-    
-    # Validate szpros_complication (1-5)
-    if szpros_complication is not None:
-        if not isinstance(szpros_complication, int) or szpros_complication < 1 or szpros_complication > 5:
-            return jsonify({'error': 'Szpros complication must be between 1 and 5'}), 400
+    error = validate_project_data(system, handle_style, welding_frames_qty, glazing_frames_qty, szpros_complication)
+    if error:
+        return jsonify({'error': error}), 400
     
     # Check if order already exists
     existing_order = Order.query.filter_by(order_number=order_number).first()
@@ -292,6 +502,31 @@ def create_order():
     }), 201
 
 
+@app.route('/api/orders/search')
+@login_required
+def search_orders_api():
+    """Search orders by number and description with prefix matching, ranked and paginated"""
+    return jsonify(search_orders(request.args.get('q', ''),
+                                 page=request.args.get('page', 1, type=int),
+                                 per_page=request.args.get('per_page', 20, type=int))), 200
+
+
+@app.route('/api/orders/import', methods=['POST'])
+@role_required('admin', 'designer')
+def import_orders_file():
+    """Bulk import orders from an uploaded XLSX or CSV file"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'File is required'}), 400
+    
+    try:
+        result = import_orders(upload.filename, upload.stream)
+    except OrderImportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(result), 200
+
+
 @app.route('/api/orders/<int:order_id>/qrcode')
 def generate_qr_code(order_id):
     """Generate QR code for an order"""
@@ -318,6 +553,39 @@ def generate_qr_code(order_id):
                      download_name=f'qr_order_{order.order_number}.png')
 
 
+@app.route('/api/orders/<int:order_id>/timeline')
+def get_order_timeline(order_id):
+    """Get an order's sessions merged into elapsed intervals per stage, with gaps and lead time"""
+    order = Order.query.get_or_404(order_id)
+    timelines = order_timelines(order_ids=[order.id])
+    if not timelines:
+        return jsonify({'error': 'No time logs for this order'}), 404
+    return jsonify(timelines[0]), 200
+
+
+@app.route('/api/orders/timelines')
+def get_order_timelines():
+    """Get timelines for many orders at once
+    
+    Orders are selected by a comma-separated "order_ids" list or by the report
+    filters. Pass intervals=0 to return only the per-stage and lead-time summary.
+    """
+    order_ids = request.args.get('order_ids')
+    if order_ids:
+        try:
+            order_ids = [int(order_id) for order_id in order_ids.split(',') if order_id.strip()]
+        except ValueError:
+            return jsonify({'error': 'order_ids must be a comma-separated list of integers'}), 400
+    else:
+        order_ids = None
+    include_intervals = request.args.get('intervals', '1') not in ('0', 'false', 'no')
+    
+    timelines = order_timelines(order_ids=order_ids,
+                                criteria=order_filter_criteria(parse_order_filters(request.args)),
+                                include_intervals=include_intervals)
+    return jsonify(timelines), 200
+
+
 # ========== Worker Panel ==========
 
 @app.route('/worker')
@@ -325,11 +593,12 @@ def generate_qr_code(order_id):
 def worker_panel():
     """Worker panel for scanning QR codes and tracking time"""
     user = get_current_user()
-    # Show only assigned stages for workers, all stages for admin
+    # Show only assigned stages for workers, all stages for admin; loaded only if the
+    # cached stage list is stale
     if user.role == 'worker':
-        stages = user.assigned_stages
+        stages = ProductionStage.query.with_parent(user, User.assigned_stages)
     else:
-        stages = ProductionStage.query.all()
+        stages = ProductionStage.query
     return render_template('worker.html', stages=stages, user=user)
 
 
@@ -338,13 +607,28 @@ def process_scan():
     """Process QR code scan and start/stop time tracking"""
     data = request.json
     qr_data = data.get('qr_data')
-    worker_name = data.get('worker_name')
     stage_id = data.get('stage_id')
     action = data.get('action')  # 'start' or 'stop'
     
-    if not all([qr_data, worker_name, stage_id, action]):
+    if not all([qr_data, stage_id, action]):
         return jsonify({'error': 'Missing required fields'}), 400
     
+    worker = resolve_worker(data.get('worker_id'), data.get('worker_name'))
+    if not worker:
+        return jsonify({'error': 'Worker not found'}), 404
+    
+    # Scans sent without a login session go to the worker's own plant
+    if 'user_id' not in session:
+        g.plant = worker.plant or default_plant()
+    
+    # Double reads and client retries are answered from memory before the order and time log lookups
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    scan_key = (worker.id, qr_data, str(stage_id), action)
+    cached = scan_deduplicator.lookup(*scan_key, idempotency_key=idempotency_key)
+    if cached:
+        status, payload = cached
+        return jsonify({**payload, 'duplicate': True}), status
+    
     # Extract order number from QR code
     if not qr_data.startswith('ORDER:'):
         return jsonify({'error': 'Invalid QR code format'}), 400
@@ -364,7 +648,7 @@ def process_scan():
         active_log = TimeLog.query.filter_by(
             order_id=order.id,
             stage_id=stage_id,
-            worker_name=worker_name,
+            worker_id=worker.id,
             status='in_progress'
         ).first()
         
@@ -375,27 +659,33 @@ def process_scan():
         time_log = TimeLog(
             order_id=order.id,
             stage_id=stage_id,
-            worker_name=worker_name,
+            worker_id=worker.id,
+            worker_name=worker.full_name,
             start_time=datetime.utcnow(),
             status='in_progress'
         )
         db.session.add(time_log)
         db.session.commit()
+        wip_index.start(stage.id, order.id, worker.id)
+        scan_journal.append(EVENT_START, time_log)
         
-        return jsonify({
+        payload = {
             'message': 'Work started',
+            'action': 'start',
             'log_id': time_log.id,
             'order_number': order.order_number,
             'stage': stage.name,
             'start_time': time_log.start_time.isoformat()
-        }), 201
+        }
+        scan_deduplicator.remember(*scan_key, 201, payload, idempotency_key=idempotency_key)
+        return jsonify(payload), 201
     
     elif action == 'stop':
         # Find active session
         active_log = TimeLog.query.filter_by(
             order_id=order.id,
             stage_id=stage_id,
-            worker_name=worker_name,
+            worker_id=worker.id,
             status='in_progress'
         ).first()
         
@@ -405,15 +695,21 @@ def process_scan():
         # Stop the session
         active_log.end_time = datetime.utcnow()
         active_log.status = 'completed'
+        record_session_duration(active_log, order)
         db.session.commit()
+        wip_index.stop(stage.id, order.id, worker.id)
+        scan_journal.append(EVENT_STOP, active_log)
         
-        return jsonify({
+        payload = {
             'message': 'Work stopped',
+            'action': 'stop',
             'log_id': active_log.id,
             'order_number': order.order_number,
             'stage': stage.name,
             'duration_minutes': active_log.duration_minutes
-        }), 200
+        }
+        scan_deduplicator.remember(*scan_key, 200, payload, idempotency_key=idempotency_key)
+        return jsonify(payload), 200
     
     else:
         return jsonify({'error': 'Invalid action. Use "start" or "stop"'}), 400
@@ -422,13 +718,16 @@ def process_scan():
 @app.route('/api/worker/active-sessions')
 def get_active_sessions():
     """Get all active sessions for a worker"""
-    worker_name = request.args.get('worker_name')
+    worker = resolve_worker(request.args.get('worker_id', type=int), request.args.get('worker_name'))
     
-    if not worker_name:
-        return jsonify({'error': 'Worker name is required'}), 400
+    if not worker:
+        return jsonify({'error': 'Worker is required'}), 400
+    
+    if 'user_id' not in session:
+        g.plant = worker.plant or default_plant()
     
     active_logs = TimeLog.query.filter_by(
-        worker_name=worker_name,
+        worker_id=worker.id,
         status='in_progress'
     ).all()
     
@@ -440,6 +739,7 @@ def get_active_sessions():
             'qr_data': f'ORDER:{log.order.order_number}',
             'stage_id': log.stage_id,
             'stage_name': log.stage.name,
+            'worker_id': log.worker_id,
             'worker_name': log.worker_name,  # Add worker_name to response
             'start_time': log.start_time.isoformat()
         })
@@ -447,326 +747,228 @@ def get_active_sessions():
     return jsonify(sessions), 200
 
 
+@app.route('/api/wip')
+def get_wip():
+    """Get live work-in-progress counts per stage from the in-memory index"""
+    return jsonify(wip_index.snapshot()), 200
+
+
 # ========== Manager Panel ==========
 
 @app.route('/manager')
 @role_required('admin', 'manager')
 def manager_panel():
     """Manager panel for viewing reports and analytics"""
-    orders = Order.query.all()
-    stages = ProductionStage.query.all()
-    return render_template('manager.html', orders=orders, stages=stages, user=get_current_user())
+    return render_template('manager.html', user=get_current_user())
+
+
+def plant_report(report, merge):
+    """Run a report for the current plant, or across all plants with ?plant=all"""
+    filters = parse_order_filters(request.args)
+    if request.args.get('plant') != 'all':
+        return jsonify(report(filters)), 200
+    if session.get('role') not in ['admin', 'manager']:
+        return jsonify({'error': 'Cross-plant reports require the admin or manager role'}), 403
+    filters.pop('order_id', None)  # order ids are only unique within a plant
+    return jsonify(merge(fan_out(report, filters))), 200
 
 
 @app.route('/api/reports/order-times')
 def get_order_times_report():
     """Get time report for all orders"""
-    order_id = request.args.get('order_id', type=int)
-    system = request.args.get('system')
-    handle_style = request.args.get('handle_style')
-    welding_frames_min = request.args.get('welding_frames_min', type=int)
-    glazing_frames_min = request.args.get('glazing_frames_min', type=int)
-    szpros_complication = request.args.get('szpros_complication', type=int)
-    
-    # Calculate duration in days (SQLite Julian day difference)
-    duration_days = db.func.julianday(TimeLog.end_time) - db.func.julianday(TimeLog.start_time)
-    
-    query = db.session.query(
-        Order.order_number,
-        Order.description,
-        Order.system,
-        Order.handle_style,
-        Order.welding_frames_qty,
-        Order.glazing_frames_qty,
-        Order.szpros_complication,
-        ProductionStage.name.label('stage_name'),
-        db.func.count(TimeLog.id).label('work_sessions'),
-        db.func.sum(duration_days).label('total_days')
-    ).select_from(Order)\
-     .join(TimeLog, Order.id == TimeLog.order_id)\
-     .join(ProductionStage, TimeLog.stage_id == ProductionStage.id)\
-     .filter(TimeLog.status == 'completed')
-    
-    if order_id:
-        query = query.filter(Order.id == order_id)
-    if system:
-        query = query.filter(Order.system == system)
-    if handle_style:
-        query = query.filter(Order.handle_style == handle_style)
-    if welding_frames_min:
-        query = query.filter(Order.welding_frames_qty >= welding_frames_min)
-    if glazing_frames_min:
-        query = query.filter(Order.glazing_frames_qty >= glazing_frames_min)
-    if szpros_complication:
-        query = query.filter(Order.szpros_complication == szpros_complication)
-    
-    query = query.group_by(Order.id, ProductionStage.id)
-    
-    results = query.all()
-    
-    report_data = []
-    for row in results:
-        total_minutes = (row.total_days * 24 * 60) if row.total_days else 0
-        report_data.append({
-            'order_number': row.order_number,
-            'description': row.description,
-            'system': row.system,
-            'handle_style': row.handle_style,
-            'welding_frames_qty': row.welding_frames_qty,
-            'glazing_frames_qty': row.glazing_frames_qty,
-            'szpros_complication': row.szpros_complication,
-            'stage_name': row.stage_name,
-            'work_sessions': row.work_sessions,
-            'total_minutes': round(total_minutes, 2),
-            'total_hours': round(total_minutes / 60, 2)
-        })
-    
-    return jsonify(report_data), 200
+    return plant_report(order_times_report, merge_order_times)
 
 
 @app.route('/api/reports/worker-productivity')
 def get_worker_productivity_report():
     """Get productivity report by worker"""
-    # Calculate duration in days (SQLite Julian day difference)
-    duration_days = db.func.julianday(TimeLog.end_time) - db.func.julianday(TimeLog.start_time)
-    
-    results = db.session.query(
-        TimeLog.worker_name,
-        db.func.count(TimeLog.id).label('work_sessions'),
-        db.func.sum(duration_days).label('total_days')
-    ).filter(TimeLog.status == 'completed')\
-     .group_by(TimeLog.worker_name).all()
-    
-    report_data = []
-    for row in results:
-        total_minutes = (row.total_days * 24 * 60) if row.total_days else 0
-        report_data.append({
-            'worker_name': row.worker_name,
-            'work_sessions': row.work_sessions,
-            'total_minutes': round(total_minutes, 2),
-            'total_hours': round(total_minutes / 60, 2)
-        })
-    
-    return jsonify(report_data), 200
+    return plant_report(worker_productivity_report, merge_worker_productivity)
 
 
 @app.route('/api/reports/stage-efficiency')
 def get_stage_efficiency_report():
     """Get efficiency report by production stage"""
-    # Calculate duration in days (SQLite Julian day difference)
-    duration_days = db.func.julianday(TimeLog.end_time) - db.func.julianday(TimeLog.start_time)
-    
-    results = db.session.query(
-        ProductionStage.name,
-        db.func.count(TimeLog.id).label('work_sessions'),
-        db.func.avg(duration_days).label('avg_days'),
-        db.func.sum(duration_days).label('total_days')
-    ).select_from(ProductionStage)\
-     .join(TimeLog, TimeLog.stage_id == ProductionStage.id)\
-     .filter(TimeLog.status == 'completed')\
-     .group_by(ProductionStage.id).all()
-    
-    report_data = []
-    for row in results:
-        avg_minutes = (row.avg_days * 24 * 60) if row.avg_days else 0
-        total_minutes = (row.total_days * 24 * 60) if row.total_days else 0
-        report_data.append({
-            'stage_name': row.name,
-            'work_sessions': row.work_sessions,
-            'avg_minutes': round(avg_minutes, 2),
-            'avg_hours': round(avg_minutes / 60, 2),
-            'total_minutes': round(total_minutes, 2),
-            'total_hours': round(total_minutes / 60, 2)
-        })
+    return plant_report(stage_efficiency_report, merge_stage_efficiency)
+
+
+@app.route('/api/reports/dashboard')
+def get_dashboard_report():
+    """Get order, worker and stage reports for the manager dashboard in one query"""
+    return plant_report(dashboard_report, merge_dashboard)
+
+
+@app.route('/api/reports/facets')
+def get_report_facets():
+    """Get order counts and hours for every report filter value under the current filters"""
+    return plant_report(report_facets, merge_facets)
+
+
+@app.route('/api/reports/stage-percentiles')
+def get_stage_percentiles_report():
+    """Get median and tail session durations per stage, optionally by order profile"""
+    dimension = request.args.get('dimension', 'all')
+    if dimension != 'all' and dimension not in PROFILE_DIMENSIONS:
+        return jsonify({'error': f'Invalid dimension. Must be one of: all, {", ".join(PROFILE_DIMENSIONS)}'}), 400
+    return jsonify(stage_percentiles(dimension)), 200
+
+
+# ========== Stage Time Estimates ==========
+
+@app.route('/api/estimates/stage-times', methods=['POST'])
+def estimate_stage_times():
+    """Estimate per-stage minutes for a batch of orders
+    
+    Accepts existing orders by id ("order_ids") and/or unsaved project data
+    ("orders": list of objects with system, handle_style and quantities).
+    """
+    model = estimator.get_model()
+    if model is None:
+        return jsonify({'error': 'Stage time model is not trained yet'}), 503
+    
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    order_ids = data.get('order_ids', [])
+    project_data = data.get('orders', [])
+    
+    if not isinstance(order_ids, list) or not all(
+            isinstance(order_id, int) and not isinstance(order_id, bool) for order_id in order_ids):
+        return jsonify({'error': 'order_ids must be a list of integers'}), 400
+    if not isinstance(project_data, list):
+        return jsonify({'error': 'orders must be a list of objects'}), 400
+    for position, order in enumerate(project_data):
+        if not isinstance(order, dict):
+            return jsonify({'error': f'orders[{position}] must be an object'}), 400
+        error = validate_project_data(order.get('system'), order.get('handle_style'), order.get('welding_frames_qty'),
+                                      order.get('glazing_frames_qty'), order.get('szpros_complication'))
+        if error:
+            return jsonify({'error': f'orders[{position}]: {error}'}), 400
+    
+    orders = Order.query.filter(Order.id.in_(order_ids)).all() if order_ids else []
+    orders_by_id = {order.id: order for order in orders}
+    missing_ids = [order_id for order_id in order_ids if order_id not in orders_by_id]
+    if missing_ids:
+        return jsonify({'error': f'Orders not found: {missing_ids}'}), 404
+    
+    batch = [orders_by_id[order_id] for order_id in order_ids] + project_data
+    minutes = estimator.estimate_orders(model, batch) if batch else []
+    
+    stage_names = dict(db.session.query(ProductionStage.id, ProductionStage.name))
+    estimates = []
+    for position, row in enumerate(minutes):
+        estimate = {'minutes': [None if math.isnan(value) else round(float(value), 2) for value in row]}
+        if position < len(order_ids):
+            estimate['order_id'] = order_ids[position]
+            estimate['order_number'] = orders_by_id[order_ids[position]].order_number
+        estimate['total_minutes'] = round(sum(value for value in estimate['minutes'] if value is not None), 2)
+        estimates.append(estimate)
     
-    return jsonify(report_data), 200
+    return jsonify({
+        'trained_at': model.trained_at.isoformat(),
+        'stages': [{'id': stage_id, 'name': stage_names.get(stage_id)} for stage_id in model.stage_ids],
+        'estimates': estimates
+    }), 200
+
+
+@app.route('/api/estimates/retrain', methods=['POST'])
+@role_required('admin', 'manager')
+def retrain_stage_time_model():
+    """Trigger a background retrain of the stage time model"""
+    if not estimator.retrain_in_background(app):
+        return jsonify({'message': 'Retraining already in progress'}), 409
+    return jsonify({'message': 'Retraining started'}), 202
 
 
 # ========== Export Reports to XLSX ==========
 
-@app.route('/api/reports/order-times/export')
-@role_required('admin', 'manager')
-def export_order_times_report():
-    """Export order times report to XLSX file"""
-    order_id = request.args.get('order_id', type=int)
-    system = request.args.get('system')
-    handle_style = request.args.get('handle_style')
-    welding_frames_min = request.args.get('welding_frames_min', type=int)
-    glazing_frames_min = request.args.get('glazing_frames_min', type=int)
-    szpros_complication = request.args.get('szpros_complication', type=int)
-    
-    # Calculate duration in days (SQLite Julian day difference)
-    duration_days = db.func.julianday(TimeLog.end_time) - db.func.julianday(TimeLog.start_time)
-    
-    query = db.session.query(
-        Order.order_number,
-        Order.description,
-        Order.system,
-        Order.handle_style,
-        Order.welding_frames_qty,
-        Order.glazing_frames_qty,
-        Order.szpros_complication,
-        ProductionStage.name.label('stage_name'),
-        db.func.count(TimeLog.id).label('work_sessions'),
-        db.func.sum(duration_days).label('total_days')
-    ).select_from(Order)\
-     .join(TimeLog, Order.id == TimeLog.order_id)\
-     .join(ProductionStage, TimeLog.stage_id == ProductionStage.id)\
-     .filter(TimeLog.status == 'completed')
-    
-    if order_id:
-        query = query.filter(Order.id == order_id)
-    if system:
-        query = query.filter(Order.system == system)
-    if handle_style:
-        query = query.filter(Order.handle_style == handle_style)
-    if welding_frames_min:
-        query = query.filter(Order.welding_frames_qty >= welding_frames_min)
-    if glazing_frames_min:
-        query = query.filter(Order.glazing_frames_qty >= glazing_frames_min)
-    if szpros_complication:
-        query = query.filter(Order.szpros_complication == szpros_complication)
-    
-    query = query.group_by(Order.id, ProductionStage.id)
-    results = query.all()
-    
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Czasy zleceń"
-    
-    # Add headers
-    headers = ['Zlecenie', 'Opis', 'System', 'Klamka', 'Ramy spaw.', 'Ramy szkl.', 
-               'Szprosy', 'Etap', 'Liczba sesji', 'Całkowity czas (min)', 'Całkowity czas (godz)']
-    ws.append(headers)
-    
-    # Add data
-    for row in results:
-        total_minutes = (row.total_days * 24 * 60) if row.total_days else 0
-        ws.append([
-            row.order_number,
-            row.description or '',
-            row.system or '',
-            row.handle_style or '',
-            row.welding_frames_qty or '',
-            row.glazing_frames_qty or '',
-            row.szpros_complication or '',
-            row.stage_name,
-            row.work_sessions,
-            round(total_minutes, 2),
-            round(total_minutes / 60, 2)
-        ])
-    
+def send_export(name):
+    """Send a report as an XLSX attachment with a timestamped file name"""
     # Save to bytes
     output = io.BytesIO()
-    wb.save(output)
+    write_export(name, parse_order_filters(request.args), output)
     output.seek(0)
     
     return send_file(
         output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        mimetype=XLSX_MIMETYPE,
         as_attachment=True,
-        download_name=f'raport_czasy_zlecen_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        download_name=export_filename(name)
     )
 
 
+@app.route('/api/reports/order-times/export')
+@role_required('admin', 'manager')
+def export_order_times_report():
+    """Export order times report to XLSX file"""
+    return send_export('order-times')
+
+
 @app.route('/api/reports/worker-productivity/export')
 @role_required('admin', 'manager')
 def export_worker_productivity_report():
     """Export worker productivity report to XLSX file"""
-    # Calculate duration in days (SQLite Julian day difference)
-    duration_days = db.func.julianday(TimeLog.end_time) - db.func.julianday(TimeLog.start_time)
-    
-    results = db.session.query(
-        TimeLog.worker_name,
-        db.func.count(TimeLog.id).label('work_sessions'),
-        db.func.sum(duration_days).label('total_days')
-    ).filter(TimeLog.status == 'completed')\
-     .group_by(TimeLog.worker_name).all()
-    
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Wydajność pracowników"
-    
-    # Add headers
-    headers = ['Pracownik', 'Liczba sesji', 'Całkowity czas (min)', 'Całkowity czas (godz)']
-    ws.append(headers)
-    
-    # Add data
-    for row in results:
-        total_minutes = (row.total_days * 24 * 60) if row.total_days else 0
-        ws.append([
-            row.worker_name,
-            row.work_sessions,
-            round(total_minutes, 2),
-            round(total_minutes / 60, 2)
-        ])
-    
-    # Save to bytes
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'raport_wydajnosc_pracownikow_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    return send_export('worker-productivity')
 
 
 @app.route('/api/reports/stage-efficiency/export')
 @role_required('admin', 'manager')
 def export_stage_efficiency_report():
     """Export stage efficiency report to XLSX file"""
-    # Calculate duration in days (SQLite Julian day difference)
-    duration_days = db.func.julianday(TimeLog.end_time) - db.func.julianday(TimeLog.start_time)
-    
-    results = db.session.query(
-        ProductionStage.name,
-        db.func.count(TimeLog.id).label('work_sessions'),
-        db.func.avg(duration_days).label('avg_days'),
-        db.func.sum(duration_days).label('total_days')
-    ).select_from(ProductionStage)\
-     .join(TimeLog, TimeLog.stage_id == ProductionStage.id)\
-     .filter(TimeLog.status == 'completed')\
-     .group_by(ProductionStage.id).all()
-    
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Efektywność etapów"
-    
-    # Add headers
-    headers = ['Etap', 'Liczba sesji', 'Średni czas (min)', 'Średni czas (godz)', 
-               'Całkowity czas (min)', 'Całkowity czas (godz)']
-    ws.append(headers)
-    
-    # Add data
-    for row in results:
-        avg_minutes = (row.avg_days * 24 * 60) if row.avg_days else 0
-        total_minutes = (row.total_days * 24 * 60) if row.total_days else 0
-        ws.append([
-            row.name,
-            row.work_sessions,
-            round(avg_minutes, 2),
-            round(avg_minutes / 60, 2),
-            round(total_minutes, 2),
-            round(total_minutes / 60, 2)
-        ])
+    return send_export('stage-efficiency')
+
+
+# ========== Background Jobs ==========
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+@role_required('admin', 'manager')
+def manage_jobs():
+    """List recent jobs or submit a new one
     
-    # Save to bytes
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    Exports are submitted as {"kind": "export", "params": {"report": "order-times",
+    "filters": {...}}}; report filters use the same names as the report endpoints.
+    """
+    if request.method == 'GET':
+        jobs = Job.query.order_by(Job.id.desc()).limit(request.args.get('limit', 20, type=int)).all()
+        return jsonify([job_to_dict(job) for job in jobs]), 200
     
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'raport_efektywnosc_etapow_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    elif request.method == 'POST':
+        data = request.json or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        kind = data.get('kind')
+        params = data.get('params') or {}
+        
+        if kind not in JOB_KINDS:
+            return jsonify({'error': f'Invalid job kind. Must be one of: {", ".join(JOB_KINDS)}'}), 400
+        if not isinstance(params, dict):
+            return jsonify({'error': 'params must be an object'}), 400
+        if kind == 'export':
+            if params.get('report') not in EXPORTS:
+                return jsonify({'error': f'Invalid report. Must be one of: {", ".join(EXPORTS)}'}), 400
+            filters = params.get('filters') or {}
+            if not isinstance(filters, dict):
+                return jsonify({'error': 'params.filters must be an object'}), 400
+            params['filters'] = parse_order_filters(MultiDict(filters))
+        
+        job = submit_job(app, kind, params, session.get('user_id'))
+        return jsonify(job_to_dict(job)), 202
+
+
+@app.route('/api/jobs/<int:job_id>')
+@role_required('admin', 'manager')
+def get_job(job_id):
+    """Get a job's status and progress"""
+    return jsonify(job_to_dict(Job.query.get_or_404(job_id))), 200
+
+
+@app.route('/api/jobs/<int:job_id>/artifact')
+@role_required('admin', 'manager')
+def download_job_artifact(job_id):
+    """Download the file produced by a completed job"""
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'completed' or not job.artifact_path or not os.path.exists(job.artifact_path):
+        return jsonify({'error': 'No artifact available for this job'}), 404
+    return send_file(job.artifact_path, as_attachment=True, download_name=job.artifact_name)
 
 
 # ========== Production Stage Management ==========
@@ -779,25 +981,32 @@ def manage_stages():
         return jsonify([{
             'id': stage.id,
             'name': stage.name,
-            'description': stage.description
+            'description': stage.description,
+            'max_session_minutes': stage.max_session_minutes
         } for stage in stages]), 200
     
     elif request.method == 'POST':
         data = request.json
         name = data.get('name')
         description = data.get('description', '')
+        max_session_minutes = data.get('max_session_minutes')
         
         if not name:
             return jsonify({'error': 'Stage name is required'}), 400
+        error = validate_session_limit(max_session_minutes)
+        if error:
+            return jsonify({'error': error}), 400
         
-        stage = ProductionStage(name=name, description=description)
+        stage = ProductionStage(name=name, description=description, max_session_minutes=max_session_minutes)
         db.session.add(stage)
         db.session.commit()
+        wip_index.set_stage(stage.id, stage.name)
         
         return jsonify({
             'id': stage.id,
             'name': stage.name,
-            'description': stage.description
+            'description': stage.description,
+            'max_session_minutes': stage.max_session_minutes
         }), 201
 
 
@@ -811,6 +1020,7 @@ def manage_stage(stage_id):
             'id': stage.id,
             'name': stage.name,
             'description': stage.description,
+            'max_session_minutes': stage.max_session_minutes,
             'assigned_workers': stage.assigned_users.count()
         }), 200
     
@@ -828,13 +1038,20 @@ def manage_stage(stage_id):
             if len(description) > 500:
                 return jsonify({'error': 'Opis może mieć maksymalnie 500 znaków'}), 400
             stage.description = description
+        if 'max_session_minutes' in data:
+            error = validate_session_limit(data['max_session_minutes'])
+            if error:
+                return jsonify({'error': error}), 400
+            stage.max_session_minutes = data['max_session_minutes']
         
         db.session.commit()
+        wip_index.set_stage(stage.id, stage.name)
         
         return jsonify({
             'id': stage.id,
             'name': stage.name,
-            'description': stage.description
+            'description': stage.description,
+            'max_session_minutes': stage.max_session_minutes
         }), 200
     
     elif request.method == 'DELETE':
@@ -842,18 +1059,55 @@ def manage_stage(stage_id):
         if stage.time_logs:
             return jsonify({'error': 'Nie można usunąć procesu, który ma powiązane wpisy czasowe'}), 400
         
+        # Stage links live in the directory database, where stage ids of other plants repeat
+        db.session.execute(user_stages.delete().where(
+            user_stages.c.stage_id == stage_id,
+            user_stages.c.user_id.in_(plant_users_query().with_entities(User.id))
+        ))
         db.session.delete(stage)
         db.session.commit()
+        wip_index.remove_stage(stage_id)
         return jsonify({'message': 'Proces został usunięty'}), 200
 
 
-# Initialize database
-with app.app_context():
-    db.create_all()
+def migrate_time_log_workers():
+    """Map legacy worker_name values on time logs to user ids.
+    
+    Names are matched against full_name, then username. Names with no matching
+    account get an inactive worker account so their history stays grouped.
+    """
+    unmapped_names = [row[0] for row in db.session.query(TimeLog.worker_name)
+                      .filter(TimeLog.worker_id.is_(None)).distinct()]
+    for worker_name in unmapped_names:
+        user = User.query.filter(
+            db.or_(User.full_name == worker_name, User.username == worker_name)
+        ).order_by(User.is_active.desc(), User.id).first()
+        if not user:
+            username = base_username = 'legacy_' + '_'.join(worker_name.lower().split())[:60]
+            suffix = 1
+            while User.query.filter_by(username=username).first():
+                suffix += 1
+                username = f'{base_username}_{suffix}'
+            user = User(username=username, full_name=worker_name, role='worker', is_active=False)
+            user.set_password(secrets.token_hex(16))
+            db.session.add(user)
+            db.session.flush()
+            print(f"Created inactive worker account '{username}' for legacy time logs")
+        TimeLog.query.filter(TimeLog.worker_id.is_(None), TimeLog.worker_name == worker_name)\
+            .update({TimeLog.worker_id: user.id}, synchronize_session=False)
+    if unmapped_names:
+        db.session.commit()
+        print(f"Linked time logs of {len(unmapped_names)} worker name(s) to user accounts")
+
+
+def prepare_plant_database():
+    """Create and migrate the current plant's tables and load its in-memory state"""
+    db.metadata.create_all(plant_engine(), tables=plant_tables(db, current_plant()))
     
     # Add new columns to orders table if they don't exist (for existing databases)
     from sqlalchemy import inspect, text
-    inspector = inspect(db.engine)
+    engine = plant_engine()
+    inspector = inspect(engine)
     if 'orders' in inspector.get_table_names():
         existing_columns = [col['name'] for col in inspector.get_columns('orders')]
         new_columns = [
@@ -865,24 +1119,32 @@ with app.app_context():
         ]
         for col_name, col_type in new_columns:
             if col_name not in existing_columns:
-                with db.engine.connect() as conn:
+                with engine.connect() as conn:
                     conn.execute(text(f'ALTER TABLE orders ADD COLUMN {col_name} {col_type}'))
                     conn.commit()
                 print(f"Added column '{col_name}' to orders table")
     
-    # Create default admin user if no users exist
-    if User.query.count() == 0:
-        admin = User(
-            username='admin',
-            full_name='Administrator',
-            role='admin',
-            is_active=True
-        )
-        admin.set_password('admin123')  # Default password - should be changed after first login
-        db.session.add(admin)
-        db.session.commit()
-        print("Default admin user created: username='admin', password='admin123'")
-        print("IMPORTANT: Please change the default password after first login!")
+    if 'production_stages' in inspector.get_table_names():
+        if 'max_session_minutes' not in [col['name'] for col in inspector.get_columns('production_stages')]:
+            with engine.connect() as conn:
+                conn.execute(text('ALTER TABLE production_stages ADD COLUMN max_session_minutes INTEGER'))
+                conn.commit()
+            print("Added column 'max_session_minutes' to production_stages table")
+    
+    # Link time logs to users by id instead of the free-text worker name
+    if 'time_logs' in inspector.get_table_names():
+        existing_columns = [col['name'] for col in inspector.get_columns('time_logs')]
+        with engine.connect() as conn:
+            if 'worker_id' not in existing_columns:
+                conn.execute(text('ALTER TABLE time_logs ADD COLUMN worker_id INTEGER REFERENCES users(id)'))
+                print("Added column 'worker_id' to time_logs table")
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_time_logs_worker_id ON time_logs (worker_id)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_time_logs_worker_status ON time_logs (worker_id, status)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_time_logs_order_start ON time_logs (order_id, start_time)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_time_logs_status_report ON time_logs '
+                              '(status, order_id, stage_id, worker_id, start_time, end_time)'))
+            conn.commit()
+        migrate_time_log_workers()
     
     # Create default production stages if they don't exist
     if ProductionStage.query.count() == 0:
@@ -895,7 +1157,63 @@ with app.app_context():
         ]
         db.session.add_all(default_stages)
         db.session.commit()
-
+    
+    # Backfill duration sketches for databases that predate them
+    if StageDurationSketch.query.count() == 0 and TimeLog.query.filter_by(status='completed').count() > 0:
+        print(f"Built {rebuild_sketches()} stage duration sketches from existing time logs")
+    
+    ensure_search_index()
+    
+    # Journal scan events; a new journal starts with a snapshot of the existing time logs
+    journal_dir = plant_filename(app.config['SCAN_JOURNAL_DIR'])
+    journal_is_new = not segment_paths(journal_dir)
+    scan_journal.open(journal_dir)
+    if journal_is_new:
+        print(f"Journaled {scan_journal.backfill()} existing scan events")
+    
+    recover_jobs(app)
+    wip_index.rebuild()
+    
+    # Serve estimates from the last saved model
+    estimator.load_model(app)
+
+
+# Initialize database; skipped when a spawned job process re-runs this file as
+# __mp_main__ (under python app.py), since job processes set up their own app in jobs.py
+if __name__ != '__mp_main__':
+    with app.app_context():
+        # Shared user directory (also the first plant's database)
+        db.create_all()
+        from sqlalchemy import inspect, text
+        if 'plant' not in [col['name'] for col in inspect(db.engine).get_columns('users')]:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE users ADD COLUMN plant VARCHAR(20)'))
+                conn.commit()
+            print("Added column 'plant' to users table")
+    
+        # Create default admin user if no users exist
+        if User.query.count() == 0:
+            admin = User(
+                username='admin',
+                full_name='Administrator',
+                role='admin',
+                is_active=True
+            )
+            admin.set_password('admin123')  # Default password - should be changed after first login
+            db.session.add(admin)
+            db.session.commit()
+            print("Default admin user created: username='admin', password='admin123'")
+            print("IMPORTANT: Please change the default password after first login!")
+    
+        for plant in app.config['PLANTS']:
+            with use_plant(plant):
+                prepare_plant_database()
+    
+        # Keep every plant's estimator fresh off the request path
+        estimator.start_background_retraining(app, app.config['ESTIMATOR_RETRAIN_INTERVAL'])
+    
+        # Close or flag sessions nobody stopped, so the in-progress set stays small
+        start_background_sweeps(app, app.config['STALE_SWEEP_INTERVAL'])
 
 if __name__ == '__main__':
     # Only enable debug mode if explicitly set via environment variable
@@ -0,0 +1,142 @@
+"""Fingerprinted, precompressed static assets and on-the-fly response compression.
+
+The build copies each stylesheet and page script to static/dist under a name
+containing a hash of its content, writes gzip and brotli variants next to it
+and records logical name -> built name in a manifest. Templates link assets
+through asset_url(), and /assets/ serves the best variant the browser accepts
+with an immutable one-year cache lifetime, since a changed file gets a new
+name. Run the build with ``python assets.py``; the app also rebuilds at
+startup when the manifest is missing or older than a source file.
+
+Large JSON and CSV responses are gzipped per request by compress_response().
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped; gzip is always built
+    brotli = None
+
+ASSET_DIRS = ['css', 'js']
+DIST_DIRNAME = 'dist'
+MANIFEST_FILENAME = 'manifest.json'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv'}
+COMPRESS_MIN_BYTES = 2048
+COMPRESS_LEVEL = 6
+
+# (Accept-Encoding token, file suffix) in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+_manifest = {}
+
+
+def source_paths(static_dir):
+    for dirname in ASSET_DIRS:
+        directory = os.path.join(static_dir, dirname)
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                yield f'{dirname}/{name}', os.path.join(directory, name)
+
+
+def build_assets(static_dir):
+    """Write fingerprinted and precompressed copies of every asset; returns the manifest"""
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    for logical_name, path in source_paths(static_dir):
+        with open(path, 'rb') as f:
+            content = f.read()
+        stem, extension = os.path.splitext(os.path.basename(logical_name))
+        built_name = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+        built_path = os.path.join(dist_dir, built_name)
+        if not os.path.exists(built_path):
+            _write(built_path, content)
+            _write(built_path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli:
+                _write(built_path + '.br', brotli.compress(content, quality=11))
+        manifest[logical_name] = built_name
+    _write(os.path.join(dist_dir, MANIFEST_FILENAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def _write(path, content):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _manifest_is_stale(static_dir):
+    manifest_path = os.path.join(static_dir, DIST_DIRNAME, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return True
+    built_at = os.path.getmtime(manifest_path)
+    return any(os.path.getmtime(path) > built_at for _, path in source_paths(static_dir))
+
+
+def init_assets(app):
+    """Load (rebuilding if stale) the asset manifest and register asset_url and /assets/"""
+    global _manifest
+    if _manifest_is_stale(app.static_folder):
+        _manifest = build_assets(app.static_folder)
+    else:
+        with open(os.path.join(app.static_folder, DIST_DIRNAME, MANIFEST_FILENAME)) as f:
+            _manifest = json.load(f)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.after_request(compress_response)
+
+
+def asset_url(logical_name):
+    """URL of an asset's fingerprinted build, or the plain static file if it has none"""
+    built_name = _manifest.get(logical_name)
+    if built_name:
+        return url_for('asset', filename=built_name)
+    return url_for('static', filename=logical_name)
+
+
+def serve_asset(filename):
+    """Serve a fingerprinted asset, precompressed when the browser accepts it"""
+    dist_dir = os.path.join(current_app.static_folder, DIST_DIRNAME)
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+        if accepted[encoding] and os.path.exists(os.path.join(dist_dir, filename + suffix)):
+            response = send_from_directory(dist_dir, filename + suffix, max_age=31536000)
+            response.headers['Content-Encoding'] = encoding
+            response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            break
+    else:
+        response = send_from_directory(dist_dir, filename, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """Gzip large JSON and CSV responses for clients that accept it"""
+    if (response.direct_passthrough or response.status_code != 200
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers
+            or not request.accept_encodings['gzip']):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+if __name__ == '__main__':
+    static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    built = build_assets(static_dir)
+    print(f"Built {len(built)} assets into {os.path.join(static_dir, DIST_DIRNAME)}"
+          f"{'' if brotli else ' (brotli not installed, gzip only)'}")
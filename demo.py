@@ -6,6 +6,11 @@ import requests
 import time
 
 BASE_URL = "http://localhost:5000"
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "admin123"
+
+# Scans are attributed to the logged-in user, so the demo keeps one session
+http = requests.Session()
 
 def print_header(text):
     print("\n" + "="*60)
@@ -15,13 +20,15 @@ def print_header(text):
 def demo():
     print_header("Production Time Tracking Application Demo")
     
+    http.post(f"{BASE_URL}/login", data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    
     # 1. Create an order
     print_header("1. Creating a new order (Designer Panel)")
     order_data = {
         "order_number": "DEMO-2024-001",
         "description": "Demo order for testing the system"
     }
-    response = requests.post(f"{BASE_URL}/api/orders", json=order_data)
+    response = http.post(f"{BASE_URL}/api/orders", json=order_data)
     if response.status_code == 201:
         order = response.json()
         print(f"✓ Order created successfully!")
@@ -34,7 +41,7 @@ def demo():
     
     # 2. Get production stages
     print_header("2. Fetching production stages")
-    response = requests.get(f"{BASE_URL}/api/stages")
+    response = http.get(f"{BASE_URL}/api/stages")
     stages = response.json()
     print(f"✓ Found {len(stages)} production stages:")
     for stage in stages:
@@ -44,15 +51,13 @@ def demo():
     print_header("3. Starting work on the order (Worker Panel)")
     scan_data = {
         "qr_data": f"ORDER:{order['order_number']}",
-        "worker_name": "Anna Nowak",
         "stage_id": stages[0]['id'],
         "action": "start"
     }
-    response = requests.post(f"{BASE_URL}/api/scan", json=scan_data)
+    response = http.post(f"{BASE_URL}/api/scan", json=scan_data)
     if response.status_code == 201:
         result = response.json()
         print(f"✓ Work started!")
-        print(f"  Worker: Anna Nowak")
         print(f"  Order: {result['order_number']}")
         print(f"  Stage: {result['stage']}")
         print(f"  Start time: {result['start_time']}")
@@ -64,7 +69,7 @@ def demo():
     # 4. Stop work on the order
     print_header("4. Stopping work on the order (Worker Panel)")
     scan_data['action'] = 'stop'
-    response = requests.post(f"{BASE_URL}/api/scan", json=scan_data)
+    response = http.post(f"{BASE_URL}/api/scan", json=scan_data)
     if response.status_code == 200:
         result = response.json()
         print(f"✓ Work stopped!")
@@ -76,21 +81,19 @@ def demo():
     print_header("5. Starting work on a different stage")
     scan_data = {
         "qr_data": f"ORDER:{order['order_number']}",
-        "worker_name": "Jan Kowalski",
         "stage_id": stages[2]['id'],  # Montaż stage
         "action": "start"
     }
-    response = requests.post(f"{BASE_URL}/api/scan", json=scan_data)
+    response = http.post(f"{BASE_URL}/api/scan", json=scan_data)
     if response.status_code == 201:
         result = response.json()
         print(f"✓ Work started!")
-        print(f"  Worker: Jan Kowalski")
         print(f"  Stage: {result['stage']}")
     
     time.sleep(2)
     
     scan_data['action'] = 'stop'
-    response = requests.post(f"{BASE_URL}/api/scan", json=scan_data)
+    response = http.post(f"{BASE_URL}/api/scan", json=scan_data)
     if response.status_code == 200:
         result = response.json()
         print(f"✓ Work stopped!")
@@ -101,7 +104,7 @@ def demo():
     
     # Order times report
     print("\n📊 Order Times Report:")
-    response = requests.get(f"{BASE_URL}/api/reports/order-times")
+    response = http.get(f"{BASE_URL}/api/reports/order-times")
     report = response.json()
     for item in report:
         print(f"  Order: {item['order_number']}")
@@ -112,7 +115,7 @@ def demo():
     
     # Worker productivity report
     print("📊 Worker Productivity Report:")
-    response = requests.get(f"{BASE_URL}/api/reports/worker-productivity")
+    response = http.get(f"{BASE_URL}/api/reports/worker-productivity")
     report = response.json()
     for item in report:
         print(f"  Worker: {item['worker_name']}")
@@ -122,7 +125,7 @@ def demo():
     
     # Stage efficiency report
     print("📊 Stage Efficiency Report:")
-    response = requests.get(f"{BASE_URL}/api/reports/stage-efficiency")
+    response = http.get(f"{BASE_URL}/api/reports/stage-efficiency")
     report = response.json()
     for item in report:
         print(f"  Stage: {item['stage_name']}")
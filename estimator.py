@@ -0,0 +1,196 @@
+"""Stage-time estimates for orders from their project data.
+
+One ridge regression per production stage is fitted with NumPy on the total
+minutes completed orders spent in that stage. All stage models share the
+same feature layout, so their coefficients form one matrix and scoring a
+batch of orders is a single matrix product. Training runs on a background
+thread and the fitted model is swapped in atomically and saved to the
+instance folder, so requests only ever read a ready model. Each plant has its
+own model, trained on that plant's history.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from models import db, Order, TimeLog, ProductionStage, VALID_SYSTEMS, VALID_HANDLE_STYLES
+from plants import current_plant, plant_filename, use_plant
+from reports import duration_days
+
+NUMERIC_FEATURES = ['welding_frames_qty', 'glazing_frames_qty', 'szpros_complication']
+RIDGE_PENALTY = 1.0
+MODEL_FILENAME = 'stage_time_model.npz'
+
+_models = {}  # plant -> StageTimeModel
+_retrain_lock = threading.Lock()
+_retrain_thread = None
+
+
+class StageTimeModel:
+    """Per-stage linear model over one-hot system/handle style and frame quantities"""
+
+    def __init__(self, stage_ids, coefficients, numeric_means, samples, trained_at):
+        self.stage_ids = [int(stage_id) for stage_id in stage_ids]
+        self.coefficients = coefficients  # (features, stages)
+        self.numeric_means = numeric_means
+        self.samples = samples  # training rows per stage
+        self.trained_at = trained_at
+
+    def predict(self, systems, handle_styles, numeric):
+        """Estimated minutes, shape (orders, stages); NaN for stages without history"""
+        features = build_features(systems, handle_styles, numeric, self.numeric_means)
+        minutes = np.clip(features @ self.coefficients, 0, None)
+        minutes[:, self.samples == 0] = np.nan
+        return minutes
+
+    def save(self, path):
+        # Write to a temporary file first so a crash never leaves a truncated model behind
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, stage_ids=np.array(self.stage_ids), coefficients=self.coefficients,
+                     numeric_means=self.numeric_means, samples=self.samples,
+                     trained_at=np.array(self.trained_at.isoformat()))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['stage_ids'], data['coefficients'], data['numeric_means'], data['samples'],
+                       datetime.fromisoformat(str(data['trained_at'])))
+
+
+def _one_hot(values, categories):
+    index = {category: position for position, category in enumerate(categories)}
+    codes = np.array([index.get(value, -1) for value in values], dtype=np.int64)
+    encoded = np.zeros((len(codes), len(categories)))
+    known = codes >= 0
+    encoded[np.nonzero(known)[0], codes[known]] = 1
+    return encoded
+
+
+def build_features(systems, handle_styles, numeric, numeric_means):
+    """Design matrix: intercept, one-hot system, one-hot handle style, numeric quantities
+
+    Missing quantities (NaN) are replaced by their training means.
+    """
+    numeric = np.where(np.isnan(numeric), numeric_means, numeric)
+    return np.hstack([
+        np.ones((len(numeric), 1)),
+        _one_hot(systems, VALID_SYSTEMS),
+        _one_hot(handle_styles, VALID_HANDLE_STYLES),
+        numeric
+    ])
+
+
+def _attr(order, name):
+    return order.get(name) if isinstance(order, dict) else getattr(order, name)
+
+
+def _numeric_matrix(orders):
+    values = [[_attr(order, name) for name in NUMERIC_FEATURES] for order in orders]
+    return np.array([[np.nan if value is None else value for value in row] for row in values],
+                    dtype=float).reshape(len(orders), len(NUMERIC_FEATURES))
+
+
+def train_model():
+    """Fit one ridge regression per stage on completed (order, stage) totals
+
+    Swept sessions (auto_closed, stale) are left out, so a pair whose only
+    sessions were swept is not a sample.
+    """
+    has_open_session = db.func.sum(db.case((TimeLog.status == 'in_progress', 1), else_=0))
+    rows = db.session.query(
+        TimeLog.stage_id,
+        Order.system,
+        Order.handle_style,
+        *[getattr(Order, name) for name in NUMERIC_FEATURES],
+        db.func.sum(db.case((TimeLog.status == 'completed', duration_days), else_=0)).label('total_days')
+    ).join(Order, Order.id == TimeLog.order_id)\
+     .filter(TimeLog.status.in_(['completed', 'in_progress']))\
+     .group_by(TimeLog.order_id, TimeLog.stage_id)\
+     .having(has_open_session == 0).all()
+
+    stage_ids = [stage_id for (stage_id,) in db.session.query(ProductionStage.id).order_by(ProductionStage.id)]
+    numeric = _numeric_matrix(rows)
+    numeric_means = np.nan_to_num(np.nanmean(numeric, axis=0)) if len(rows) else np.zeros(len(NUMERIC_FEATURES))
+    features = build_features([row.system for row in rows], [row.handle_style for row in rows],
+                              numeric, numeric_means)
+    targets = np.array([(row.total_days or 0) * 24 * 60 for row in rows])
+    row_stages = np.array([row.stage_id for row in rows])
+
+    penalty = RIDGE_PENALTY * np.eye(features.shape[1])
+    penalty[0, 0] = 0  # Do not shrink the intercept
+    coefficients = np.zeros((features.shape[1], len(stage_ids)))
+    samples = np.zeros(len(stage_ids), dtype=np.int64)
+    for position, stage_id in enumerate(stage_ids):
+        mask = row_stages == stage_id
+        samples[position] = mask.sum()
+        if samples[position]:
+            X, y = features[mask], targets[mask]
+            coefficients[:, position] = np.linalg.solve(X.T @ X + penalty, X.T @ y)
+
+    return StageTimeModel(stage_ids, coefficients, numeric_means, samples, datetime.utcnow())
+
+
+def model_path(app):
+    return os.path.join(app.instance_path, plant_filename(MODEL_FILENAME))
+
+
+def get_model():
+    return _models.get(current_plant())
+
+
+def load_model(app):
+    """Load the current plant's last saved model, if any, so estimates are available right after startup"""
+    path = model_path(app)
+    if os.path.exists(path):
+        _models[current_plant()] = StageTimeModel.load(path)
+    return get_model()
+
+
+def retrain(app, plant):
+    """Train a new model for a plant, save it and swap it in"""
+    with _retrain_lock, app.app_context(), use_plant(plant):
+        model = train_model()
+        os.makedirs(app.instance_path, exist_ok=True)
+        model.save(model_path(app))
+        _models[plant] = model
+        db.session.remove()
+    return model
+
+
+def retrain_in_background(app):
+    """Start a one-off retrain of the current plant's model unless one is already running"""
+    if _retrain_lock.locked():
+        return False
+    threading.Thread(target=retrain, args=(app, current_plant()), daemon=True).start()
+    return True
+
+
+def start_background_retraining(app, interval_seconds):
+    """Retrain every plant's model on a daemon thread now (if any is missing) and then every interval"""
+    global _retrain_thread
+    if _retrain_thread is not None:
+        return
+
+    def run():
+        plants = app.config['PLANTS']
+        if all(plant in _models for plant in plants):
+            time.sleep(interval_seconds)
+        while True:
+            for plant in plants:
+                try:
+                    retrain(app, plant)
+                except Exception as e:
+                    app.logger.exception('Stage time model retraining failed for plant %s: %s', plant, e)
+            time.sleep(interval_seconds)
+
+    _retrain_thread = threading.Thread(target=run, name='stage-time-retrain', daemon=True)
+    _retrain_thread.start()
+
+
+def estimate_orders(model, orders):
+    """Score a batch of orders (objects or dicts with project data) in one call"""
+    return model.predict([_attr(order, 'system') for order in orders],
+                         [_attr(order, 'handle_style') for order in orders],
+                         _numeric_matrix(orders))
@@ -0,0 +1,81 @@
+"""XLSX report exports shared by the download endpoints and background jobs"""
+from datetime import datetime
+from openpyxl import Workbook
+from reports import order_times_report, worker_productivity_report, stage_efficiency_report
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Report name -> sheet title, headers, row formatter and download file prefix
+EXPORTS = {
+    'order-times': {
+        'report': order_times_report,
+        'title': "Czasy zleceń",
+        'headers': ['Zlecenie', 'Opis', 'System', 'Klamka', 'Ramy spaw.', 'Ramy szkl.',
+                    'Szprosy', 'Etap', 'Liczba sesji', 'Całkowity czas (min)', 'Całkowity czas (godz)'],
+        'row': lambda row: [
+            row['order_number'],
+            row['description'] or '',
+            row['system'] or '',
+            row['handle_style'] or '',
+            row['welding_frames_qty'] or '',
+            row['glazing_frames_qty'] or '',
+            row['szpros_complication'] or '',
+            row['stage_name'],
+            row['work_sessions'],
+            row['total_minutes'],
+            row['total_hours']
+        ],
+        'download_prefix': 'raport_czasy_zlecen'
+    },
+    'worker-productivity': {
+        'report': worker_productivity_report,
+        'title': "Wydajność pracowników",
+        'headers': ['Pracownik', 'Liczba sesji', 'Całkowity czas (min)', 'Całkowity czas (godz)'],
+        'row': lambda row: [
+            row['worker_name'],
+            row['work_sessions'],
+            row['total_minutes'],
+            row['total_hours']
+        ],
+        'download_prefix': 'raport_wydajnosc_pracownikow'
+    },
+    'stage-efficiency': {
+        'report': stage_efficiency_report,
+        'title': "Efektywność etapów",
+        'headers': ['Etap', 'Liczba sesji', 'Średni czas (min)', 'Średni czas (godz)',
+                    'Całkowity czas (min)', 'Całkowity czas (godz)'],
+        'row': lambda row: [
+            row['stage_name'],
+            row['work_sessions'],
+            row['avg_minutes'],
+            row['avg_hours'],
+            row['total_minutes'],
+            row['total_hours']
+        ],
+        'download_prefix': 'raport_efektywnosc_etapow'
+    },
+}
+
+
+def export_filename(name):
+    return f'{EXPORTS[name]["download_prefix"]}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+
+
+def write_export(name, filters, output, progress=None):
+    """Write a report as XLSX to a path or file object
+
+    The workbook is created in write-only mode so rows are streamed to the
+    file instead of being held as cell objects. progress, if given, is
+    called with a percentage as rows are written.
+    """
+    export = EXPORTS[name]
+    report_data = export['report'](filters)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(export['title'])
+    ws.append(export['headers'])
+    for position, row in enumerate(report_data, start=1):
+        ws.append(export['row'](row))
+        if progress and position % 1000 == 0:
+            progress(int(90 * position / len(report_data)))
+    wb.save(output)
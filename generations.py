@@ -0,0 +1,73 @@
+"""Write generations: per-table counters of committed changes, shared by every app process.
+
+Every transaction that changes rows of a table bumps that table's row in the
+data_versions table of the database holding it (users and user_stages count
+in the directory database, everything else in the current plant's). The bump
+runs on the transaction's own connection, so it commits or rolls back with
+the change. Caches of derived data key their entries on the generations of
+the tables they read, so an entry is reused until any process writes one of
+those tables and is then simply recomputed. Read the generation before the
+data it stamps, so a concurrent commit can only leave behind an entry that
+is never looked up again.
+
+Changes are picked up from ORM flushes and from ORM bulk statements
+(session.execute(insert(Model), rows), Query.delete()). Raw SQL run on a
+connection is not seen.
+"""
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from models import db, DataVersion
+from plants import DIRECTORY_TABLES, default_plant, plant_engine
+
+_versions = DataVersion.__table__
+
+
+def _engine(table_name):
+    return plant_engine(default_plant() if table_name in DIRECTORY_TABLES else None)
+
+
+def write_generation(*table_names):
+    """Committed generations of the given tables in the current plant, as a hashable cache key"""
+    engines = {}
+    for name in table_names:
+        engines.setdefault(_engine(name), []).append(name)
+    generations = {}
+    for engine, names in engines.items():
+        connection = db.session.connection(bind_arguments={'bind': engine})
+        generations.update(connection.execute(
+            select(_versions.c.table_name, _versions.c.version).where(_versions.c.table_name.in_(names))
+        ).all())
+    return tuple(generations.get(name, 0) for name in table_names)
+
+
+def init_write_generations(session_class):
+    """Track writes made through sessions of session_class"""
+    event.listen(session_class, 'after_flush', _record_flush)
+    event.listen(session_class, 'do_orm_execute', _record_bulk_statement)
+    event.listen(session_class, 'after_commit', _forget_written_tables)
+    event.listen(session_class, 'after_rollback', _forget_written_tables)
+
+
+def _bump(session, table_name):
+    # Once per table and transaction; later writes commit together with the bump
+    written = session.info.setdefault('_written_tables', set())
+    if table_name in written or table_name == _versions.name:
+        return
+    written.add(table_name)
+    connection = session.connection(bind_arguments={'bind': _engine(table_name)})
+    connection.execute(insert(_versions).values(table_name=table_name, version=1).on_conflict_do_update(
+        index_elements=[_versions.c.table_name], set_={'version': _versions.c.version + 1}))
+
+
+def _record_flush(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        _bump(session, inspect(instance).mapper.local_table.name)
+
+
+def _record_bulk_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _bump(orm_execute_state.session, orm_execute_state.statement.table.name)
+
+
+def _forget_written_tables(session):
+    session.info.pop('_written_tables', None)
@@ -0,0 +1,169 @@
+"""Bulk order import from XLSX or CSV uploads.
+
+Rows are streamed from the upload (openpyxl read-only mode or the csv
+module), validated like single orders, checked for duplicates with one
+set-based query per batch and inserted with one executemany per batch, each
+batch in its own transaction. Invalid rows are reported, not inserted. A CSV
+upload is decoded once in chunks before the first row is read, so an
+encoding error is reported before any batch is committed.
+"""
+import codecs
+import csv
+import io
+from zipfile import BadZipFile
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from sqlalchemy import insert
+from models import db, Order, validate_project_data
+
+BATCH_SIZE = 500
+
+# Accepted header names (lower-cased) -> Order column; includes the XLSX export headers
+COLUMN_ALIASES = {
+    'order_number': 'order_number', 'zlecenie': 'order_number', 'numer zlecenia': 'order_number',
+    'description': 'description', 'opis': 'description',
+    'system': 'system',
+    'handle_style': 'handle_style', 'klamka': 'handle_style', 'styl klamki': 'handle_style',
+    'welding_frames_qty': 'welding_frames_qty', 'ramy spaw.': 'welding_frames_qty',
+    'glazing_frames_qty': 'glazing_frames_qty', 'ramy szkl.': 'glazing_frames_qty',
+    'szpros_complication': 'szpros_complication', 'szprosy': 'szpros_complication',
+}
+INTEGER_COLUMNS = ['welding_frames_qty', 'glazing_frames_qty', 'szpros_complication']
+
+
+class OrderImportError(Exception):
+    """The upload cannot be read as an order sheet at all"""
+
+
+def _iter_xlsx_rows(stream):
+    try:
+        wb = load_workbook(stream, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError):
+        raise OrderImportError('File is not a valid .xlsx workbook')
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def _check_utf8(stream, chunk_size=64 * 1024):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise OrderImportError('CSV file must be UTF-8 encoded')
+    stream.seek(0)
+
+
+def _iter_csv_rows(stream):
+    _check_utf8(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def iter_sheet_rows(filename, stream):
+    """Raw rows of the first sheet of an .xlsx or .csv upload"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'xlsx':
+        return _iter_xlsx_rows(stream)
+    if extension == 'csv':
+        return _iter_csv_rows(stream)
+    raise OrderImportError('Unsupported file type. Use .xlsx or .csv')
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def parse_row(columns, row):
+    """Map a raw row onto Order fields; returns (fields, error)"""
+    fields = {name: _text(row[position]) if position < len(row) else None
+              for position, name in columns.items()}
+    if not fields.get('order_number'):
+        return fields, 'Order number is required'
+    if len(fields['order_number']) > 100:
+        return fields, 'Order number can have at most 100 characters'
+    for name in INTEGER_COLUMNS:
+        if fields.get(name) is not None:
+            try:
+                fields[name] = int(fields[name])
+            except ValueError:
+                return fields, f'{name} must be a whole number'
+    error = validate_project_data(fields.get('system'), fields.get('handle_style'),
+                                  fields.get('welding_frames_qty'), fields.get('glazing_frames_qty'),
+                                  fields.get('szpros_complication'))
+    return fields, error
+
+
+def _insert_batch(batch, errors):
+    """Drop duplicates of existing orders with one query, insert the rest, commit"""
+    numbers = [fields['order_number'] for _, fields in batch]
+    existing = {number for (number,) in db.session.query(Order.order_number)
+                .filter(Order.order_number.in_(numbers))}
+    rows = []
+    for row_number, fields in batch:
+        if fields['order_number'] in existing:
+            errors.append({'row': row_number, 'order_number': fields['order_number'],
+                           'error': 'Order number already exists'})
+        else:
+            rows.append(fields)
+    if rows:
+        db.session.execute(insert(Order), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def import_orders(filename, stream, batch_size=BATCH_SIZE):
+    """Import orders from an uploaded sheet; returns counts and a per-row error report"""
+    rows = iter_sheet_rows(filename, stream)
+    header = next(rows, None)
+    if not header:
+        raise OrderImportError('The file is empty')
+    columns = {}
+    for position, name in enumerate(header):
+        column = COLUMN_ALIASES.get((_text(name) or '').lower())
+        if column and column not in columns.values():
+            columns[position] = column
+    if 'order_number' not in columns.values():
+        raise OrderImportError('Missing order number column (order_number or Zlecenie)')
+
+    imported = 0
+    total_rows = 0
+    errors = []
+    seen = set()
+    batch = []
+    for row_number, row in enumerate(rows, start=2):
+        if not any(_text(value) for value in row):
+            continue
+        total_rows += 1
+        fields, error = parse_row(columns, row)
+        if not error and fields['order_number'] in seen:
+            error = 'Duplicate order number in file'
+        if error:
+            errors.append({'row': row_number, 'order_number': fields.get('order_number'), 'error': error})
+            continue
+        seen.add(fields['order_number'])
+        fields['description'] = fields.get('description') or ''
+        batch.append((row_number, fields))
+        if len(batch) >= batch_size:
+            imported += _insert_batch(batch, errors)
+            batch = []
+    if batch:
+        imported += _insert_batch(batch, errors)
+
+    errors.sort(key=lambda error: error['row'])
+    return {'total_rows': total_rows, 'imported': imported, 'errors': errors}
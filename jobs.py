@@ -0,0 +1,168 @@
+"""Background jobs for heavy work such as XLSX exports and report rebuilds.
+
+Jobs are rows in the jobs table, so their state survives restarts and is
+visible to every web worker. They run in a process pool, keeping request
+workers free for scans. Pool processes are spawned, not forked: a fork of
+the web process, which runs retraining, sweep and journal threads, could
+inherit a lock another thread holds and deadlock on it. Each pool process
+imports only this module's dependencies, sets up its own minimal Flask app
+bound to the same database and reports progress by updating its job row;
+finished exports are written to the instance folder for download. Jobs live
+in their plant's database and run routed to that plant.
+"""
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import Flask
+from generations import init_write_generations
+from models import db, Job
+from plants import PlantSession, current_plant, init_plants, use_plant
+
+ARTIFACT_DIRNAME = 'job_artifacts'
+
+# Job kind -> handler(job, params, progress) returning a dict with optional
+# artifact_name, artifact_path and message
+JOB_KINDS = {}
+
+_executor = None
+_worker_app = None
+
+
+def job_kind(name):
+    """Register a job handler under a kind name"""
+    def decorator(handler):
+        JOB_KINDS[name] = handler
+        return handler
+    return decorator
+
+
+def artifact_dir(app):
+    path = os.path.join(app.instance_path, ARTIFACT_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@job_kind('export')
+def run_export(job, params, progress):
+    """Write a report export to an XLSX artifact"""
+    from exports import export_filename, write_export
+    name = params['report']
+    filename = export_filename(name)
+    path = os.path.join(artifact_dir(_worker_app), f'{current_plant()}_{job.id}_{filename}')
+    write_export(name, params.get('filters') or {}, path, progress)
+    return {'artifact_name': filename, 'artifact_path': path}
+
+
+@job_kind('rebuild_sketches')
+def run_rebuild_sketches(job, params, progress):
+    """Recompute the stage duration quantile sketches from all completed logs"""
+    from sketches import rebuild_sketches
+    return {'message': f'Rebuilt {rebuild_sketches()} stage duration sketches'}
+
+
+# ========== Pool process side ==========
+
+def _init_worker(config, instance_path):
+    """Pool process entrypoint: a minimal app on the web process's databases"""
+    global _worker_app
+    _worker_app = Flask(__name__, instance_path=instance_path)
+    _worker_app.config.update(config)
+    _worker_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(_worker_app)
+    init_plants(_worker_app, db)
+    init_write_generations(PlantSession)
+
+
+def run_job(job_id, plant):
+    """Execute one queued job of a plant inside a pool process"""
+    with _worker_app.app_context(), use_plant(plant):
+        job = Job.query.get(job_id)
+        if not job or job.status != 'queued':
+            return
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        def progress(percent, message=None):
+            job.progress = percent
+            if message:
+                job.message = message
+            db.session.commit()
+
+        try:
+            result = JOB_KINDS[job.kind](job, json.loads(job.params or '{}'), progress) or {}
+            job.artifact_name = result.get('artifact_name')
+            job.artifact_path = result.get('artifact_path')
+            job.message = result.get('message')
+            job.progress = 100
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.message = str(e) or e.__class__.__name__
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+# ========== Web process side ==========
+
+def get_executor(app):
+    """Process pool shared by this web process, created on first use
+
+    Pool processes are spawned and build fresh engines in _init_worker; app.py
+    skips its startup when re-run as a spawned process's main module.
+    """
+    global _executor
+    if _executor is None:
+        engines = db.engines
+        config = {
+            'PLANTS': app.config['PLANTS'],
+            'SQLALCHEMY_DATABASE_URI': engines[None].url.render_as_string(hide_password=False),
+            'SQLALCHEMY_BINDS': {key: engine.url.render_as_string(hide_password=False)
+                                 for key, engine in engines.items() if key is not None}
+        }
+        _executor = ProcessPoolExecutor(
+            max_workers=app.config['JOB_WORKERS'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(config, app.instance_path)
+        )
+    return _executor
+
+
+def submit_job(app, kind, params, user_id=None):
+    """Persist a job in the current plant and queue it on the process pool"""
+    job = Job(kind=kind, params=json.dumps(params), status='queued', created_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+    get_executor(app).submit(run_job, job.id, current_plant())
+    return job
+
+
+def recover_jobs(app):
+    """Fail the current plant's jobs interrupted by a restart and requeue jobs that never started"""
+    Job.query.filter_by(status='running').update({
+        Job.status: 'failed',
+        Job.message: 'Interrupted by server restart',
+        Job.finished_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    for (job_id,) in db.session.query(Job.id).filter_by(status='queued').order_by(Job.id):
+        get_executor(app).submit(run_job, job_id, current_plant())
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params or '{}'),
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'artifact_name': job.artifact_name,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,326 @@
+"""Append-only binary journal of scan events.
+
+Every start and stop from the scan endpoint, and every session the stale
+session sweeper closes or flags, is appended as a fixed-size record (event
+type, time log id, order, stage, worker, timestamp, CRC32) to the current
+segment under SCAN_JOURNAL_DIR (default instance/scan_journal). Appends are
+buffered and written plus fsynced as one batch, either once FSYNC_BATCH
+events are pending or by a background flusher every FSYNC_INTERVAL seconds,
+so a crash loses at most that window. Segments rotate at SEGMENT_BYTES. Every
+app process appends to the same journal, so its events are not in time order
+across processes; replay applies end events after all starts. The first
+segment starts with a snapshot of the time logs that existed before the
+journal, so replaying all segments rebuilds the whole table. Each plant has
+its own journal directory; scan_journal resolves to the current plant's.
+
+Replay memory-maps each segment, decodes records with struct.iter_unpack
+and stops at the first torn or corrupt record:
+
+    python journal.py replay [--plant CODE]   # rebuild time_logs and sketches
+    python journal.py stats [--plant CODE]    # summarise the journal
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import insert
+from werkzeug.local import LocalProxy
+from models import db, TimeLog, User
+from plants import (configure_plants, configured_plants, current_plant, init_plants, plant_bind_key,
+                    plant_engine, plant_filename, plant_tables, use_plant)
+
+SEGMENT_BYTES = 16 * 1024 * 1024
+FSYNC_BATCH = 64
+FSYNC_INTERVAL = 0.2  # seconds
+REPLAY_BATCH = 5000
+
+SEGMENT_MAGIC = b'SJRN\x01\x00\x00\x00'
+_RECORD = struct.Struct('<BIIIIq')   # event, log_id, order_id, stage_id, worker_id, microseconds
+_ENTRY = struct.Struct('<BIIIIqI')   # the record followed by its CRC32
+
+EVENT_START = 1
+EVENT_STOP = 2
+EVENT_AUTO_CLOSE = 3  # closed by the stale session sweeper
+EVENT_FLAG = 4        # flagged stale by the sweeper; the session keeps no end time
+# Event type -> time log status after the event
+EVENT_STATUSES = {EVENT_START: 'in_progress', EVENT_STOP: 'completed',
+                  EVENT_AUTO_CLOSE: 'auto_closed', EVENT_FLAG: 'stale'}
+STATUS_EVENTS = {status: event for event, status in EVENT_STATUSES.items()}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_event(event, log_id, order_id, stage_id, worker_id, timestamp):
+    record = _RECORD.pack(event, log_id, order_id, stage_id, worker_id or 0,
+                          (timestamp - _EPOCH) // _MICROSECOND)
+    return record + struct.pack('<I', zlib.crc32(record))
+
+
+def configured_instance_path():
+    """INSTANCE_PATH, else the instance folder beside the app; app.py and the journal tools share it"""
+    return os.environ.get('INSTANCE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+
+def configured_journal_dir(instance_path):
+    """SCAN_JOURNAL_DIR, else scan_journal in the instance folder; plant_filename gives a plant's directory"""
+    return os.environ.get('SCAN_JOURNAL_DIR') or os.path.join(instance_path, 'scan_journal')
+
+
+def segment_paths(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith('segment_') and name.endswith('.log'))
+
+
+class ScanJournal:
+    """One process's writer of a journal, with batched fsync and segment rotation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._directory = None
+        self._fd = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._pending = bytearray()
+        self._pending_events = 0
+        self._flusher = None
+
+    @property
+    def is_open(self):
+        return self._fd is not None
+
+    def open(self, directory):
+        """Open the newest segment for appending and start the background flusher"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._directory = directory
+            paths = segment_paths(directory)
+            if paths:
+                self._segment_number = int(os.path.basename(paths[-1])[8:-4])
+                self._open_segment(paths[-1])
+            else:
+                self._rotate()
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def append(self, event, time_log, timestamp=None):
+        """Queue one event for a time log (or a row with its columns); written with the next batch"""
+        if timestamp is None:
+            timestamp = time_log.start_time if event == EVENT_START else time_log.end_time
+        entry = encode_event(event, time_log.id, time_log.order_id, time_log.stage_id,
+                             time_log.worker_id, timestamp)
+        with self._lock:
+            if self._fd is None:
+                return
+            self._pending += entry
+            self._pending_events += 1
+            if self._pending_events >= FSYNC_BATCH:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                self._flush()
+                os.close(self._fd)
+                self._fd = None
+
+    def backfill(self):
+        """Snapshot existing time logs into the journal; returns the number of events"""
+        events = 0
+        rows = db.session.query(TimeLog.id, TimeLog.order_id, TimeLog.stage_id, TimeLog.worker_id,
+                                TimeLog.start_time, TimeLog.end_time, TimeLog.status)\
+            .order_by(TimeLog.id).execution_options(yield_per=REPLAY_BATCH)
+        with self._lock:
+            for row in rows:
+                self._pending += encode_event(EVENT_START, row.id, row.order_id, row.stage_id,
+                                              row.worker_id, row.start_time)
+                events += 1
+                end_event = STATUS_EVENTS.get(row.status, EVENT_STOP)
+                if end_event == EVENT_FLAG or (end_event != EVENT_START and row.end_time):
+                    self._pending += encode_event(end_event, row.id, row.order_id, row.stage_id,
+                                                  row.worker_id, row.end_time or row.start_time)
+                    events += 1
+            self._flush()
+        return events
+
+    def _open_segment(self, path):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment_size = os.fstat(self._fd).st_size
+        if self._segment_size == 0:
+            os.write(self._fd, SEGMENT_MAGIC)
+            self._segment_size = len(SEGMENT_MAGIC)
+
+    def _rotate(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+        self._segment_number += 1
+        self._open_segment(os.path.join(self._directory, f'segment_{self._segment_number:06d}.log'))
+        # Make the new segment's directory entry durable
+        dir_fd = os.open(self._directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _flush(self):
+        if not self._pending or self._fd is None:
+            return
+        data = bytes(self._pending)
+        while data:
+            room = max(SEGMENT_BYTES - self._segment_size, 0) // _ENTRY.size * _ENTRY.size
+            if not room:
+                self._rotate()
+                continue
+            chunk, data = data[:room], data[room:]
+            os.write(self._fd, chunk)
+            self._segment_size += len(chunk)
+        os.fsync(self._fd)
+        self._pending.clear()
+        self._pending_events = 0
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FSYNC_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Scan journal flush failed: {e}")
+
+
+scan_journals = defaultdict(ScanJournal)  # plant -> journal
+scan_journal = LocalProxy(lambda: scan_journals[current_plant()])
+
+
+# ========== Replay ==========
+
+def iter_events(directory):
+    """Yield (event, log_id, order_id, stage_id, worker_id, timestamp) from every segment
+
+    Reading a segment stops at its first torn or corrupt record.
+    """
+    for path in segment_paths(directory):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= len(SEGMENT_MAGIC):
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    print(f"Skipping {path}: not a scan journal segment")
+                    continue
+                body = memoryview(mapped)[len(SEGMENT_MAGIC):]
+                whole = len(body) // _ENTRY.size * _ENTRY.size
+                try:
+                    for position, entry in enumerate(_ENTRY.iter_unpack(body[:whole])):
+                        offset = position * _ENTRY.size
+                        if zlib.crc32(body[offset:offset + _RECORD.size]) != entry[6]:
+                            print(f"Stopping {path} at corrupt record {position}")
+                            break
+                        event, log_id, order_id, stage_id, worker_id, micros, _ = entry
+                        yield event, log_id, order_id, stage_id, worker_id or None, _EPOCH + micros * _MICROSECOND
+                finally:
+                    body.release()
+
+
+def replay_sessions(directory):
+    """Fold journal events into time log rows keyed by id
+
+    Every app process appends to the journal, so a stop can land before its
+    start (an earlier segment, or an earlier batch of the same segment).
+    End events are therefore applied, in journal order, after all starts.
+    """
+    sessions = {}
+    end_events = []
+    for event, log_id, order_id, stage_id, worker_id, timestamp in iter_events(directory):
+        if event == EVENT_START:
+            sessions[log_id] = {'id': log_id, 'order_id': order_id, 'stage_id': stage_id,
+                                'worker_id': worker_id, 'start_time': timestamp,
+                                'end_time': None, 'status': EVENT_STATUSES[event]}
+        else:
+            end_events.append((event, log_id, timestamp))
+    for event, log_id, timestamp in end_events:
+        if log_id in sessions:
+            if event != EVENT_FLAG:
+                sessions[log_id]['end_time'] = timestamp
+            sessions[log_id]['status'] = EVENT_STATUSES[event]
+    return sessions
+
+
+def rebuild_from_journal(directory):
+    """Replace time_logs with the journal's sessions and recompute derived aggregates"""
+    from sketches import rebuild_sketches
+    sessions = replay_sessions(directory)
+    names = dict(db.session.query(User.id, User.full_name))
+    TimeLog.query.delete()
+    rows = []
+    for log_id in sorted(sessions):
+        row = sessions[log_id]
+        row['worker_name'] = names.get(row['worker_id'], '')
+        rows.append(row)
+        if len(rows) >= REPLAY_BATCH:
+            db.session.execute(insert(TimeLog), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(TimeLog), rows)
+    db.session.commit()
+    return {'time_logs': len(sessions), 'sketches': rebuild_sketches()}
+
+
+def _replay_app(plant, database_uri=None):
+    app = Flask(__name__, instance_path=configured_instance_path())
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///production.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_plants(app)
+    if plant not in app.config['PLANTS']:
+        raise SystemExit(f"Unknown plant '{plant}'; configured plants: {', '.join(app.config['PLANTS'])}")
+    if database_uri and plant == app.config['PLANTS'][0]:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    elif database_uri:
+        app.config['SQLALCHEMY_BINDS'][plant_bind_key(plant)] = database_uri
+    db.init_app(app)
+    init_plants(app, db)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scan journal tools')
+    parser.add_argument('command', choices=['replay', 'stats'])
+    parser.add_argument('--plant', help='Plant to replay (default: the first plant in PLANTS)')
+    parser.add_argument('--journal', help='Journal directory (default: the plant\'s journal under SCAN_JOURNAL_DIR '
+                                          'or instance/scan_journal)')
+    parser.add_argument('--database', help='Database to rebuild (default: the plant\'s database)')
+    args = parser.parse_args(argv)
+
+    plant = args.plant or configured_plants()[0]
+    app = _replay_app(plant, args.database)
+    started = time.perf_counter()
+    with app.app_context(), use_plant(plant):
+        directory = args.journal or plant_filename(configured_journal_dir(app.instance_path))
+        if args.command == 'stats':
+            sessions = replay_sessions(directory)
+            active = sum(1 for row in sessions.values() if row['status'] == 'in_progress')
+            print(f"{len(segment_paths(directory))} segments, {len(sessions)} sessions, {active} in progress")
+        else:
+            db.metadata.create_all(plant_engine(), tables=plant_tables(db, plant))
+            result = rebuild_from_journal(directory)
+            print(f"Rebuilt {result['time_logs']} time logs and {result['sketches']} sketches")
+    print(f"Done in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,55 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from plants import PlantSession
 
-db = SQLAlchemy()
+# Plant tables are routed to the current plant's database, users to the shared directory (see plants.py)
+db = SQLAlchemy(session_options={'class_': PlantSession})
+
+# ========== Constants for Project Data Validation ==========
+VALID_SYSTEMS = ['SLIM', 'JENSEN', 'LITE', 'OTTOSTUM', 'RPTECHNIK', 'W10']
+VALID_HANDLE_STYLES = ['1', '2', '3', '4', '5', 'kaseta']
+
+
+def validate_project_data(system, handle_style, welding_frames_qty, glazing_frames_qty, szpros_complication):
+    """Return an error message for invalid order project data, or None if valid"""
+    # Validate system value
+    if system and system not in VALID_SYSTEMS:
+        return f'Invalid system. Must be one of: {", ".join(VALID_SYSTEMS)}'
+    
+    # Validate handle_style value
+    if handle_style and handle_style not in VALID_HANDLE_STYLES:
+        return f'Invalid handle style. Must be one of: {", ".join(VALID_HANDLE_STYLES)}'
+    
+    # Validate welding_frames_qty (1-15)
+    if welding_frames_qty is not None:
+        if not isinstance(welding_frames_qty, int) or welding_frames_qty < 1 or welding_frames_qty > 15:
+            return 'Welding frames quantity must be between 1 and 15'
+    
+    # Validate glazing_frames_qty (1-15)
+    if glazing_frames_qty is not None:
+        if not isinstance(glazing_frames_qty, int) or glazing_frames_qty < 1 or glazing_frames_qty > 15:
+            return 'Glazing frames quantity must be between 1 and 15'
+    
+    # Validate szpros_complication (1-5)
+    if szpros_complication is not None:
+        if not isinstance(szpros_complication, int) or szpros_complication < 1 or szpros_complication > 5:
+            return 'Szpros complication must be between 1 and 5'
+    
+    return None
+
+
+MAX_SESSION_LIMIT_MINUTES = 7 * 24 * 60
+
+
+def validate_session_limit(max_session_minutes):
+    """Return an error message for an invalid stage session limit, or None if valid"""
+    if max_session_minutes is None:
+        return None
+    if (not isinstance(max_session_minutes, int) or isinstance(max_session_minutes, bool)
+            or max_session_minutes < 1 or max_session_minutes > MAX_SESSION_LIMIT_MINUTES):
+        return f'Max session minutes must be between 1 and {MAX_SESSION_LIMIT_MINUTES}'
+    return None
 
 user_stages = db.Table('user_stages',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
@@ -18,8 +65,10 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
-    assigned_stages = db.relationship('ProductionStage', secondary=user_stages, 
-                                     backref=db.backref('assigned_users', lazy='dynamic'))
+    plant = db.Column(db.String(20))  # plant the user works in; None for the first plant
+    # Read-only: the ORM would write user_stages through the plant's connection; see assign_stages in app.py
+    assigned_stages = db.relationship('ProductionStage', secondary=user_stages, viewonly=True,
+                                     backref=db.backref('assigned_users', lazy='dynamic', viewonly=True))
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     def check_password(self, password):
@@ -48,6 +97,7 @@ class ProductionStage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
+    max_session_minutes = db.Column(db.Integer)  # sessions running longer are swept as stale; None uses the default
     time_logs = db.relationship('TimeLog', backref='stage', lazy=True)
 
 class TimeLog(db.Model):
@@ -55,13 +105,60 @@ class TimeLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     stage_id = db.Column(db.Integer, db.ForeignKey('production_stages.id'), nullable=False)
-    worker_name = db.Column(db.String(100), nullable=False)
+    worker_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    worker_name = db.Column(db.String(100), nullable=False)  # display name captured at scan time
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='in_progress')
+    worker = db.relationship('User', backref=db.backref('time_logs', lazy='dynamic'))
+    __table_args__ = (
+        # Covers the active-session lookups in process_scan and get_active_sessions
+        db.Index('ix_time_logs_worker_status', 'worker_id', 'status'),
+        # Serves per-order scans in start order for timelines
+        db.Index('ix_time_logs_order_start', 'order_id', 'start_time'),
+        # Covers the completed-session aggregates in reports.py, so they read no table rows
+        db.Index('ix_time_logs_status_report', 'status', 'order_id', 'stage_id', 'worker_id',
+                 'start_time', 'end_time'),
+    )
     @property
     def duration_minutes(self):
         if self.end_time:
             delta = self.end_time - self.start_time
             return round(delta.total_seconds() / 60, 2)
         return None
+
+class StageDurationSketch(db.Model):
+    """Quantile sketch of completed session durations for one stage and order profile"""
+    __tablename__ = 'stage_duration_sketches'
+    id = db.Column(db.Integer, primary_key=True)
+    stage_id = db.Column(db.Integer, db.ForeignKey('production_stages.id'), nullable=False)
+    dimension = db.Column(db.String(30), nullable=False)  # all, system, handle_style, welding_frames_qty, glazing_frames_qty
+    value = db.Column(db.String(20), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.LargeBinary)  # packed (bucket index, count) pairs, see sketches.QuantileSketch
+    stage = db.relationship('ProductionStage')
+    __table_args__ = (
+        db.UniqueConstraint('stage_id', 'dimension', 'value', name='uq_stage_duration_sketch'),
+    )
+
+class DataVersion(db.Model):
+    """Write generation of one table in this database, bumped by every transaction writing it"""
+    __tablename__ = 'data_versions'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    """Background job (export, report rebuild) executed by the job process pool"""
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    message = db.Column(db.Text)
+    artifact_name = db.Column(db.String(200))
+    artifact_path = db.Column(db.String(500))
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,141 @@
+"""Per-plant database routing.
+
+Every plant keeps its orders, stages, time logs and derived tables in its own
+SQLite database, configured as an SQLAlchemy bind. Users and their stage
+assignments live in the shared directory database (the app's default
+database); plant databases attach it on connect, so report queries can keep
+joining users. The first plant stays in the directory database file, so a
+single-plant install keeps using production.db unchanged.
+
+The session sends directory tables to the directory database and everything
+else to the current plant: the plant pinned with use_plant(), else the plant
+the request selected (g.plant), else the first plant.
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+
+DIRECTORY_TABLES = {'users', 'user_stages'}
+
+_pinned_plant = contextvars.ContextVar('plant', default=None)
+_fan_out_pool = None
+
+
+def configured_plants():
+    """Plant codes from the comma-separated PLANTS environment variable"""
+    return [code.strip() for code in os.environ.get('PLANTS', 'main').split(',') if code.strip()]
+
+
+def configure_plants(app):
+    """Register a bind per plant after the first; must run before db.init_app(app)"""
+    plants = configured_plants()
+    app.config['PLANTS'] = plants
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for code in plants[1:]:
+        binds.setdefault(plant_bind_key(code), f'sqlite:///production_{code}.db')
+
+
+def init_plants(app, db):
+    """Attach the directory database to every plant database connection
+
+    Must run after db.init_app(app).
+    """
+    with app.app_context():
+        directory_path = db.engine.url.database
+        for code in app.config['PLANTS'][1:]:
+            engine = db.engines[plant_bind_key(code)]
+
+            @event.listens_for(engine, 'connect')
+            def attach_directory(dbapi_connection, connection_record):
+                dbapi_connection.execute('ATTACH DATABASE ? AS directory', (directory_path,))
+
+
+def plant_bind_key(code):
+    return f'plant_{code}'
+
+
+def default_plant():
+    return current_app.config['PLANTS'][0]
+
+
+def current_plant():
+    plant = _pinned_plant.get()
+    if plant:
+        return plant
+    if has_request_context() and g.get('plant'):
+        return g.plant
+    return default_plant()
+
+
+@contextmanager
+def use_plant(code):
+    """Route the current context's queries to a plant"""
+    token = _pinned_plant.set(code)
+    try:
+        yield
+    finally:
+        _pinned_plant.reset(token)
+
+
+def plant_engine(code=None):
+    db = current_app.extensions['sqlalchemy']
+    code = code or current_plant()
+    if code == default_plant():
+        return db.engine
+    return db.engines[plant_bind_key(code)]
+
+
+def plant_tables(db, code):
+    """Tables stored in a plant's database file"""
+    if code == default_plant():
+        return list(db.metadata.sorted_tables)
+    return [table for table in db.metadata.sorted_tables if table.name not in DIRECTORY_TABLES]
+
+
+def plant_filename(filename, code=None):
+    """Per-plant variant of an instance file or directory name"""
+    code = code or current_plant()
+    if code == default_plant():
+        return filename
+    stem, extension = os.path.splitext(filename)
+    return f'{stem}_{code}{extension}'
+
+
+def fan_out(fn, *args, **kwargs):
+    """Run fn once per plant in parallel; returns {plant: result}"""
+    global _fan_out_pool
+    app = current_app._get_current_object()
+    plants = app.config['PLANTS']
+    db = app.extensions['sqlalchemy']
+
+    def run(code):
+        with app.app_context(), use_plant(code):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                db.session.remove()
+
+    if _fan_out_pool is None:
+        _fan_out_pool = ThreadPoolExecutor(max_workers=max(len(plants), 2), thread_name_prefix='plant-fan-out')
+    return dict(zip(plants, _fan_out_pool.map(run, plants)))
+
+
+class PlantSession(Session):
+    """Session routing plant tables to the current plant's database"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or _targets_directory(mapper, clause):
+            return engine
+        return plant_engine()
+
+
+def _targets_directory(mapper, clause):
+    if mapper is not None:
+        return inspect(mapper).local_table.name in DIRECTORY_TABLES
+    table = getattr(clause, 'table', None)
+    return getattr(table, 'name', None) in DIRECTORY_TABLES
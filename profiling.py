@@ -0,0 +1,353 @@
+"""On-demand profiling of selected endpoints.
+
+An admin switches profiling on for an endpoint (its URL rule, e.g.
+/api/reports/order-times) with a mode and a sample rate, the fraction of
+matching requests that get profiled. Two modes are supported:
+
+* ``cprofile`` - deterministic cProfile of the request; saves the .prof
+  file and a collapsed-stack file derived from the call graph.
+* ``sampling`` - a background thread samples the request thread's stack
+  every ``interval_ms``; cheap enough for slow production requests and
+  saves true collapsed stacks.
+
+Each profile also records wall time and the time spent executing SQL,
+measured with cursor execute events on every engine (SQLite may defer work
+to row fetching, which shows up as fetchall in the top functions).
+Profiles are written to instance/profiles as <id>.json (summary with top
+functions), <id>.collapsed (flamegraph.pl / speedscope input) and, for
+cProfile, <id>.prof, by a background thread after the response is
+built. Targets are kept per process.
+"""
+import cProfile
+import heapq
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+PROFILE_DIRNAME = 'profiles'
+PROFILE_MODES = ['cprofile', 'sampling']
+DEFAULT_INTERVAL_MS = 5
+MAX_PROFILES = 200
+TOP_FUNCTIONS = 15
+MAX_STACK_DEPTH = 64
+MAX_COLLAPSED_NODES = 20000
+
+_targets = {}  # URL rule -> {'mode', 'sample_rate', 'interval_ms', 'enabled_at'}
+_targets_lock = threading.Lock()
+_profile_dir = None
+_save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-save')
+_pending_saves = set()
+_pending_lock = threading.Lock()
+
+
+# ========== Targets ==========
+
+def enable_profiling(rule, mode, sample_rate=1.0, interval_ms=DEFAULT_INTERVAL_MS):
+    with _targets_lock:
+        _targets[rule] = {
+            'rule': rule,
+            'mode': mode,
+            'sample_rate': sample_rate,
+            'interval_ms': interval_ms,
+            'enabled_at': datetime.utcnow().isoformat()
+        }
+    return _targets[rule]
+
+
+def disable_profiling(rule):
+    with _targets_lock:
+        return _targets.pop(rule, None) is not None
+
+
+def profiling_targets():
+    with _targets_lock:
+        return sorted(_targets.values(), key=lambda target: target['rule'])
+
+
+# ========== Request hooks ==========
+
+def init_profiling(app, db):
+    """Register request hooks and SQL timing listeners on every engine"""
+    global _profile_dir
+    _profile_dir = os.path.join(app.instance_path, PROFILE_DIRNAME)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.teardown_request(_abort_request_profile)
+
+
+def _start_request_profile():
+    if not _targets or request.url_rule is None:
+        return
+    target = _targets.get(request.url_rule.rule)
+    if not target or random.random() >= target['sample_rate']:
+        return
+    profile = RequestProfile(target['mode'], target['interval_ms'])
+    if profile.start():
+        g._request_profile = profile
+
+
+def _finish_request_profile(response):
+    profile = g.pop('_request_profile', None)
+    if profile:
+        profile.stop()
+        _save_in_background(profile, request.url_rule.rule, request.method, request.full_path.rstrip('?'),
+                            response.status_code)
+    return response
+
+
+def _abort_request_profile(error=None):
+    profile = g.pop('_request_profile', None)
+    if profile:
+        profile.stop()
+        _save_in_background(profile, request.url_rule.rule, request.method, request.full_path.rstrip('?'), 500)
+
+
+def _save_in_background(profile, rule, method, path, status):
+    """Write the profile off the request thread so the profiled response is not held up"""
+    future = _save_pool.submit(profile.save, rule, method, path, status)
+    with _pending_lock:
+        _pending_saves.add(future)
+    future.add_done_callback(_forget_save)
+
+
+def _forget_save(future):
+    with _pending_lock:
+        _pending_saves.discard(future)
+
+
+def wait_for_saves(timeout=None):
+    """Block until profiles of finished requests are written"""
+    with _pending_lock:
+        pending = list(_pending_saves)
+    wait(pending, timeout=timeout)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('_request_profile'):
+        conn.info.setdefault('_profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_profile_query_start')
+    if starts and has_request_context() and g.get('_request_profile'):
+        g._request_profile.add_query(time.perf_counter() - starts.pop())
+
+
+# ========== Profilers ==========
+
+class RequestProfile:
+    """One profiled request"""
+
+    def __init__(self, mode, interval_ms):
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.sql_seconds = 0.0
+        self.sql_queries = 0
+        self._profiler = None
+        self._samples = Counter()
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+
+    def start(self):
+        self.started_at = datetime.utcnow()
+        self._wall_start = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:  # another profiler is already active in this interpreter
+                return False
+        else:
+            thread_id = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample, args=(thread_id,), daemon=True)
+            self._sampler.start()
+        return True
+
+    def stop(self):
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        if self._profiler:
+            self._profiler.disable()
+        if self._sampler:
+            self._stop_sampling.set()
+            self._sampler.join()
+
+    def add_query(self, seconds):
+        self.sql_seconds += seconds
+        self.sql_queries += 1
+
+    def _sample(self, thread_id):
+        while not self._stop_sampling.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self._samples[';'.join(reversed(stack))] += 1
+
+    def save(self, rule, method, path, status):
+        rule_slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', rule.strip('/')).strip('_')
+        profile_id = f'{self.started_at.strftime("%Y%m%dT%H%M%S%f")}_{rule_slug}'
+        os.makedirs(_profile_dir, exist_ok=True)
+        base_path = os.path.join(_profile_dir, profile_id)
+        files = ['collapsed']
+        if self._profiler:
+            self._profiler.dump_stats(base_path + '.prof')
+            files.append('prof')
+            stats = pstats.Stats(self._profiler)
+            collapsed = collapsed_from_stats(stats)
+            top_functions = top_functions_from_stats(stats)
+        else:
+            collapsed = self._samples
+            top_functions = top_functions_from_samples(self._samples, self.interval)
+        with open(base_path + '.collapsed', 'w') as f:
+            for stack, weight in sorted(collapsed.items()):
+                if weight > 0:
+                    f.write(f'{stack} {weight}\n')
+        summary = {
+            'id': profile_id,
+            'rule': rule,
+            'method': method,
+            'path': path,
+            'status': status,
+            'mode': self.mode,
+            'started_at': self.started_at.isoformat(),
+            'wall_ms': round(self.wall_seconds * 1000, 2),
+            'sql_ms': round(self.sql_seconds * 1000, 2),
+            'sql_queries': self.sql_queries,
+            'samples': sum(self._samples.values()) if not self._profiler else None,
+            'top_functions': top_functions,
+            'files': files
+        }
+        with open(base_path + '.json', 'w') as f:
+            json.dump(summary, f)
+        prune_profiles()
+        return summary
+
+
+def _function_label(func):
+    filename, line, name = func
+    if filename == '~':  # built-in
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def top_functions_from_stats(stats, limit=TOP_FUNCTIONS):
+    """Functions with the most own time in a cProfile run"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [{
+        'function': _function_label(func),
+        'calls': calls,
+        'self_ms': round(self_time * 1000, 2),
+        'cumulative_ms': round(cumulative * 1000, 2)
+    } for func, (_, calls, self_time, cumulative, _) in rows]
+
+
+def top_functions_from_samples(samples, interval, limit=TOP_FUNCTIONS):
+    """Functions with the most own (leaf) and total samples in a sampling run"""
+    self_counts = Counter()
+    total_counts = Counter()
+    for stack, count in samples.items():
+        frames = stack.split(';')
+        self_counts[frames[-1]] += count
+        for frame in set(frames):
+            total_counts[frame] += count
+    return [{
+        'function': function,
+        'calls': None,
+        'self_ms': round(count * interval * 1000, 2),
+        'cumulative_ms': round(total_counts[function] * interval * 1000, 2)
+    } for function, count in self_counts.most_common(limit)]
+
+
+def collapsed_from_stats(stats, max_nodes=MAX_COLLAPSED_NODES):
+    """Collapsed stacks (microseconds) from a cProfile call graph
+
+    cProfile keeps caller -> callee edges, not whole stacks, so each
+    function's time is split across its callers in proportion to the time
+    spent under each of them, walking down from the roots. The number of
+    call paths grows exponentially with the graph, so the walk expands the
+    heaviest paths first and stops after max_nodes stacks; time under a
+    stack that is not expanded (budget, depth or less than a microsecond)
+    stays on that stack as its own time. Recursive edges are dropped, since
+    cProfile already counts every recursion level in the outer call.
+    """
+    children = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+    collapsed = Counter()
+    heap = []
+    for order, (func, row) in enumerate(stats.stats.items()):
+        if not row[4] and row[3] > 0:
+            heapq.heappush(heap, (-row[3], order, func, (_function_label(func),), row[3]))
+    pushed = len(heap)
+
+    while heap:
+        _, _, func, stack, share = heapq.heappop(heap)
+        _, _, self_time, cumulative, _ = stats.stats[func]
+        fraction = min(share / cumulative, 1.0)
+        own = self_time * fraction
+        if pushed < max_nodes and len(stack) < MAX_STACK_DEPTH:
+            for child, edge_time in children.get(func, []):
+                child_share = edge_time * fraction
+                label = _function_label(child)
+                if label in stack:
+                    continue  # recursive call: its time is already in the outer call's own and child time
+                if child_share * 1e6 < 1 or stats.stats[child][3] <= 0 or pushed >= max_nodes:
+                    own += child_share
+                    continue
+                heapq.heappush(heap, (-child_share, pushed, child, stack + (label,), child_share))
+                pushed += 1
+        else:
+            own = share
+        collapsed[';'.join(stack)] += int(own * 1e6)
+    return collapsed
+
+
+# ========== Stored profiles ==========
+
+def recent_profiles(limit=50):
+    """Summaries of the newest saved profiles"""
+    if not _profile_dir or not os.path.isdir(_profile_dir):
+        return []
+    names = sorted((name for name in os.listdir(_profile_dir) if name.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        with open(os.path.join(_profile_dir, name)) as f:
+            profiles.append(json.load(f))
+    return profiles
+
+
+def profile_file(profile_id, kind):
+    """Path of a saved profile's .prof or .collapsed file, or None"""
+    if kind not in ('prof', 'collapsed') or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(_profile_dir, f'{profile_id}.{kind}')
+    return path if os.path.exists(path) else None
+
+
+def prune_profiles(keep=MAX_PROFILES):
+    """Delete all but the newest profiles"""
+    summaries = sorted(name for name in os.listdir(_profile_dir) if name.endswith('.json'))
+    for name in summaries[:-keep]:
+        profile_id = name[:-len('.json')]
+        for extension in ('.json', '.collapsed', '.prof'):
+            path = os.path.join(_profile_dir, profile_id + extension)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,376 @@
+"""Report queries shared by the JSON report endpoints and the XLSX exports.
+
+Each report statement is built once per combination of active filters, with
+bind parameters in place of the filter values, and reused for every request.
+"""
+from functools import lru_cache
+from sqlalchemy import select, bindparam
+from generations import write_generation
+from models import db, Order, ProductionStage, TimeLog, User
+from plants import current_plant
+
+# Calculate duration in days (SQLite Julian day difference)
+duration_days = db.func.julianday(TimeLog.end_time) - db.func.julianday(TimeLog.start_time)
+
+# Current name of the worker, or the name captured at scan time for logs without a user
+worker_name = db.func.coalesce(User.full_name, TimeLog.worker_name)
+
+# Filter name -> (request arg type, criterion built from the bind parameter)
+ORDER_FILTERS = {
+    'order_id': (int, lambda param: Order.id == param),
+    'system': (str, lambda param: Order.system == param),
+    'handle_style': (str, lambda param: Order.handle_style == param),
+    'welding_frames_min': (int, lambda param: Order.welding_frames_qty >= param),
+    'glazing_frames_min': (int, lambda param: Order.glazing_frames_qty >= param),
+    'szpros_complication': (int, lambda param: Order.szpros_complication == param),
+}
+
+
+def parse_order_filters(args):
+    """Read the active order filters from request args into bind parameter values"""
+    filters = {}
+    for name, (arg_type, _) in ORDER_FILTERS.items():
+        value = args.get(name, type=arg_type)
+        if value:
+            filters[name] = value
+    return filters
+
+
+def order_filter_criteria(filters):
+    """Criteria for parsed order filters with their values inlined, for ad-hoc queries"""
+    return [ORDER_FILTERS[name][1](value) for name, value in filters.items()]
+
+
+def _filter_criteria(filter_names):
+    return [ORDER_FILTERS[name][1](bindparam(name)) for name in filter_names]
+
+
+@lru_cache(maxsize=None)
+def _order_times_statement(filter_names):
+    return select(
+        Order.order_number,
+        Order.description,
+        Order.system,
+        Order.handle_style,
+        Order.welding_frames_qty,
+        Order.glazing_frames_qty,
+        Order.szpros_complication,
+        ProductionStage.name.label('stage_name'),
+        db.func.count(TimeLog.id).label('work_sessions'),
+        db.func.sum(duration_days).label('total_days')
+    ).select_from(Order)\
+     .join(TimeLog, Order.id == TimeLog.order_id)\
+     .join(ProductionStage, TimeLog.stage_id == ProductionStage.id)\
+     .where(TimeLog.status == 'completed', *_filter_criteria(filter_names))\
+     .group_by(Order.id, ProductionStage.id)
+
+
+@lru_cache(maxsize=None)
+def _worker_productivity_statement(filter_names):
+    statement = select(
+        TimeLog.worker_id,
+        worker_name.label('worker_name'),
+        db.func.count(TimeLog.id).label('work_sessions'),
+        db.func.sum(duration_days).label('total_days')
+    ).select_from(TimeLog)\
+     .outerjoin(User, TimeLog.worker_id == User.id)
+    if filter_names:
+        statement = statement.join(Order, Order.id == TimeLog.order_id)
+    return statement.where(TimeLog.status == 'completed', *_filter_criteria(filter_names))\
+                    .group_by(TimeLog.worker_id, worker_name)
+
+
+@lru_cache(maxsize=None)
+def _stage_efficiency_statement(filter_names):
+    statement = select(
+        ProductionStage.name,
+        db.func.count(TimeLog.id).label('work_sessions'),
+        db.func.avg(duration_days).label('avg_days'),
+        db.func.sum(duration_days).label('total_days')
+    ).select_from(ProductionStage)\
+     .join(TimeLog, TimeLog.stage_id == ProductionStage.id)
+    if filter_names:
+        statement = statement.join(Order, Order.id == TimeLog.order_id)
+    return statement.where(TimeLog.status == 'completed', *_filter_criteria(filter_names))\
+                    .group_by(ProductionStage.id)
+
+
+@lru_cache(maxsize=None)
+def _dashboard_statement(filter_names):
+    return select(
+        Order.id.label('order_id'),
+        Order.order_number,
+        Order.description,
+        Order.system,
+        Order.handle_style,
+        Order.welding_frames_qty,
+        Order.glazing_frames_qty,
+        Order.szpros_complication,
+        ProductionStage.id.label('stage_id'),
+        ProductionStage.name.label('stage_name'),
+        TimeLog.worker_id,
+        worker_name.label('worker_name'),
+        db.func.count(TimeLog.id).label('work_sessions'),
+        db.func.sum(duration_days).label('total_days')
+    ).select_from(TimeLog)\
+     .join(Order, Order.id == TimeLog.order_id)\
+     .join(ProductionStage, TimeLog.stage_id == ProductionStage.id)\
+     .outerjoin(User, TimeLog.worker_id == User.id)\
+     .where(TimeLog.status == 'completed', *_filter_criteria(filter_names))\
+     .group_by(Order.id, ProductionStage.id, TimeLog.worker_id, worker_name)
+
+
+def _execute(statement_factory, filters):
+    filters = filters or {}
+    return db.session.execute(statement_factory(tuple(sorted(filters))), filters).all()
+
+
+def _with_totals(item, total_days):
+    total_minutes = (total_days * 24 * 60) if total_days else 0
+    item['total_minutes'] = round(total_minutes, 2)
+    item['total_hours'] = round(total_minutes / 60, 2)
+    return item
+
+
+def order_times_report(filters=None):
+    """Time per order and stage for completed sessions"""
+    return [_with_totals({
+        'order_number': row.order_number,
+        'description': row.description,
+        'system': row.system,
+        'handle_style': row.handle_style,
+        'welding_frames_qty': row.welding_frames_qty,
+        'glazing_frames_qty': row.glazing_frames_qty,
+        'szpros_complication': row.szpros_complication,
+        'stage_name': row.stage_name,
+        'work_sessions': row.work_sessions
+    }, row.total_days) for row in _execute(_order_times_statement, filters)]
+
+
+def worker_productivity_report(filters=None):
+    """Sessions and time per worker for completed sessions"""
+    return [_with_totals({
+        'worker_id': row.worker_id,
+        'worker_name': row.worker_name,
+        'work_sessions': row.work_sessions
+    }, row.total_days) for row in _execute(_worker_productivity_statement, filters)]
+
+
+def stage_efficiency_report(filters=None):
+    """Sessions, average and total time per production stage"""
+    report_data = []
+    for row in _execute(_stage_efficiency_statement, filters):
+        avg_minutes = (row.avg_days * 24 * 60) if row.avg_days else 0
+        report_data.append(_with_totals({
+            'stage_name': row.name,
+            'work_sessions': row.work_sessions,
+            'avg_minutes': round(avg_minutes, 2),
+            'avg_hours': round(avg_minutes / 60, 2)
+        }, row.total_days))
+    return report_data
+
+
+def dashboard_report(filters=None):
+    """Order, worker and stage reports rolled up from one (order, stage, worker) query
+
+    Completed logs are aggregated once at the finest grain and the three
+    reports are summed from those rows, so time_logs is joined a single time.
+    """
+    order_stages = {}
+    workers = {}
+    stages = {}
+    for row in _execute(_dashboard_statement, filters):
+        key = (row.order_id, row.stage_id)
+        if key not in order_stages:
+            order_stages[key] = {
+                'order_number': row.order_number,
+                'description': row.description,
+                'system': row.system,
+                'handle_style': row.handle_style,
+                'welding_frames_qty': row.welding_frames_qty,
+                'glazing_frames_qty': row.glazing_frames_qty,
+                'szpros_complication': row.szpros_complication,
+                'stage_name': row.stage_name,
+                'work_sessions': 0,
+                'total_days': 0
+            }
+        worker_key = (row.worker_id, row.worker_name)
+        if worker_key not in workers:
+            workers[worker_key] = {
+                'worker_id': row.worker_id,
+                'worker_name': row.worker_name,
+                'work_sessions': 0,
+                'total_days': 0
+            }
+        if row.stage_id not in stages:
+            stages[row.stage_id] = {
+                'stage_name': row.stage_name,
+                'work_sessions': 0,
+                'total_days': 0
+            }
+        for item in (order_stages[key], workers[worker_key], stages[row.stage_id]):
+            item['work_sessions'] += row.work_sessions
+            item['total_days'] += row.total_days or 0
+
+    stage_efficiency = []
+    for item in stages.values():
+        avg_minutes = item['total_days'] * 24 * 60 / item['work_sessions']
+        item['avg_minutes'] = round(avg_minutes, 2)
+        item['avg_hours'] = round(avg_minutes / 60, 2)
+        stage_efficiency.append(_with_totals(item, item.pop('total_days')))
+
+    return {
+        'order_times': [_with_totals(item, item.pop('total_days')) for item in order_stages.values()],
+        'worker_productivity': [_with_totals(item, item.pop('total_days')) for item in workers.values()],
+        'stage_efficiency': stage_efficiency
+    }
+
+
+# ========== Facets ==========
+
+# Facet name -> order column it counts; every report filter except order_id is a facet
+FACET_COLUMNS = {
+    'system': Order.system,
+    'handle_style': Order.handle_style,
+    'welding_frames_min': Order.welding_frames_qty,
+    'glazing_frames_min': Order.glazing_frames_qty,
+    'szpros_complication': Order.szpros_complication,
+}
+# Minimum filters cover every order at or above the chosen quantity
+CUMULATIVE_FACETS = {'welding_frames_min', 'glazing_frames_min'}
+FACET_CACHE_SIZE = 256
+
+# Completed time per order, the unit facets count
+_order_days = select(
+    TimeLog.order_id,
+    db.func.sum(duration_days).label('total_days')
+).where(TimeLog.status == 'completed')\
+ .group_by(TimeLog.order_id)\
+ .subquery('order_days')
+
+_facet_cache = {}  # (plant, write generation, filters) -> facets
+
+
+@lru_cache(maxsize=None)
+def _facet_statement(facet, filter_names):
+    column = FACET_COLUMNS[facet]
+    return select(
+        column.label('value'),
+        db.func.count(Order.id).label('orders'),
+        db.func.sum(_order_days.c.total_days).label('total_days')
+    ).select_from(_order_days)\
+     .join(Order, Order.id == _order_days.c.order_id)\
+     .where(column.isnot(None), *_filter_criteria(filter_names))\
+     .group_by(column)
+
+
+def _facet_values(facet, filters):
+    # A facet ignores its own filter, so every alternative value keeps its count
+    others = {name: value for name, value in filters.items() if name != facet}
+    rows = db.session.execute(_facet_statement(facet, tuple(sorted(others))), others).all()
+    if facet in CUMULATIVE_FACETS and rows:
+        # Every quantity up to the largest gets a count, including ones no order has exactly
+        exact = {row.value: row for row in rows}
+        values = []
+        orders = total_days = 0
+        for quantity in range(max(exact), min(min(exact), 1) - 1, -1):
+            if quantity in exact:
+                orders += exact[quantity].orders
+                total_days += exact[quantity].total_days or 0
+            values.append(_with_totals({'value': quantity, 'orders': orders}, total_days))
+        return values[::-1]
+    return [_with_totals({'value': row.value, 'orders': row.orders}, row.total_days) for row in rows]
+
+
+def report_facets(filters=None):
+    """Orders with completed work and their hours per filter value, under the other active filters
+
+    One grouped query per facet. Results are cached per plant until any app
+    process next writes orders or time logs.
+    """
+    filters = filters or {}
+    plant = current_plant()
+    generation = write_generation('orders', 'time_logs')
+    key = (plant, generation, tuple(sorted(filters.items())))
+    facets = _facet_cache.get(key)
+    if facets is None:
+        facets = {facet: _facet_values(facet, filters) for facet in FACET_COLUMNS}
+        for stale_key in [cached for cached in list(_facet_cache)
+                          if cached[0] == plant and cached[1] != generation]:
+            _facet_cache.pop(stale_key, None)
+        if len(_facet_cache) >= FACET_CACHE_SIZE:
+            _facet_cache.clear()
+        _facet_cache[key] = facets
+    return facets
+
+
+# ========== Cross-plant merging ==========
+
+def merge_order_times(results):
+    """Combine per-plant order time reports, tagging rows with their plant"""
+    return [dict(row, plant=plant) for plant, rows in results.items() for row in rows]
+
+
+def merge_worker_productivity(results):
+    """Combine per-plant worker productivity reports, summed per worker"""
+    workers = {}
+    for rows in results.values():
+        for row in rows:
+            # Logs without a user are told apart by the name captured at scan time
+            item = workers.setdefault((row['worker_id'], row['worker_name']), {
+                'worker_id': row['worker_id'],
+                'worker_name': row['worker_name'],
+                'work_sessions': 0,
+                'total_minutes': 0
+            })
+            item['work_sessions'] += row['work_sessions']
+            item['total_minutes'] += row['total_minutes']
+    return [_with_totals(item, item.pop('total_minutes') / (24 * 60)) for item in workers.values()]
+
+
+def merge_stage_efficiency(results):
+    """Combine per-plant stage efficiency reports, summed per stage name"""
+    stages = {}
+    for rows in results.values():
+        for row in rows:
+            item = stages.setdefault(row['stage_name'], {
+                'stage_name': row['stage_name'],
+                'work_sessions': 0,
+                'total_minutes': 0
+            })
+            item['work_sessions'] += row['work_sessions']
+            item['total_minutes'] += row['total_minutes']
+    report_data = []
+    for item in stages.values():
+        total_minutes = item.pop('total_minutes')
+        avg_minutes = total_minutes / item['work_sessions'] if item['work_sessions'] else 0
+        item['avg_minutes'] = round(avg_minutes, 2)
+        item['avg_hours'] = round(avg_minutes / 60, 2)
+        report_data.append(_with_totals(item, total_minutes / (24 * 60)))
+    return report_data
+
+
+def merge_dashboard(results):
+    """Combine per-plant dashboard reports"""
+    return {
+        'order_times': merge_order_times({plant: report['order_times'] for plant, report in results.items()}),
+        'worker_productivity': merge_worker_productivity(
+            {plant: report['worker_productivity'] for plant, report in results.items()}),
+        'stage_efficiency': merge_stage_efficiency(
+            {plant: report['stage_efficiency'] for plant, report in results.items()})
+    }
+
+
+def merge_facets(results):
+    """Combine per-plant facets, summed per facet value"""
+    merged = {}
+    for facet in FACET_COLUMNS:
+        values = {}
+        for facets in results.values():
+            for row in facets[facet]:
+                item = values.setdefault(row['value'], {'value': row['value'], 'orders': 0, 'total_minutes': 0})
+                item['orders'] += row['orders']
+                item['total_minutes'] += row['total_minutes']
+        merged[facet] = [_with_totals(item, item.pop('total_minutes') / (24 * 60))
+                         for item in sorted(values.values(), key=lambda item: item['value'])]
+    return merged
@@ -0,0 +1,57 @@
+"""In-memory de-duplication of repeated QR scans.
+
+Handheld scanners often read the same code two or three times within a
+second. The first scan is processed normally and its response remembered
+for a short window under (worker id, order, stage, action); repeats of the
+same action inside that window get the remembered response without touching
+the time logs, while the opposite action (a stop right after a start) is
+processed normally. Clients can also send an idempotency key, whose response
+is remembered for longer so retried requests are answered from memory too.
+Workers are keyed by their resolved user id, so a scan sent with a name and
+one sent with an id match. Entries live per process.
+"""
+import threading
+import time
+
+
+class ScanDeduplicator:
+    """TTL tables of recent scan responses"""
+
+    def __init__(self, debounce_seconds=2.0, idempotency_seconds=600.0):
+        self.debounce_seconds = debounce_seconds
+        self.idempotency_seconds = idempotency_seconds
+        self._lock = threading.Lock()
+        self._recent = {}      # (worker_id, order_number, stage, action) -> (expires, status, payload)
+        self._idempotent = {}  # (worker_id, idempotency_key) -> (expires, status, payload)
+        self._next_purge = 0
+
+    def lookup(self, worker_id, order_number, stage_key, action, idempotency_key=None):
+        """Remembered (status, payload) for a repeated scan, or None"""
+        now = time.monotonic()
+        with self._lock:
+            for table, key in ((self._idempotent, (worker_id, idempotency_key)),
+                               (self._recent, (worker_id, order_number, stage_key, action))):
+                if key[-1] is None:
+                    continue
+                entry = table.get(key)
+                if entry and entry[0] > now:
+                    return entry[1], entry[2]
+        return None
+
+    def remember(self, worker_id, order_number, stage_key, action, status, payload, idempotency_key=None):
+        now = time.monotonic()
+        with self._lock:
+            self._recent[(worker_id, order_number, stage_key, action)] = (now + self.debounce_seconds, status, payload)
+            if idempotency_key is not None:
+                self._idempotent[(worker_id, idempotency_key)] = (now + self.idempotency_seconds, status, payload)
+            if now >= self._next_purge:
+                self._purge(now)
+
+    def _purge(self, now):
+        for table in (self._recent, self._idempotent):
+            for key in [key for key, entry in table.items() if entry[0] <= now]:
+                del table[key]
+        self._next_purge = now + self.debounce_seconds
+
+
+scan_deduplicator = ScanDeduplicator()
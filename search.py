@@ -0,0 +1,105 @@
+"""Order search backed by an SQLite FTS5 index over order number and description.
+
+orders_fts is an external-content FTS5 table: it stores only the index and
+reads column values from the orders table. Triggers keep it in sync with
+every insert, update and delete on orders, including bulk imports. If the
+SQLite build has no FTS5, search falls back to a LIKE prefix match.
+"""
+import re
+from sqlalchemy import column, select, table, text
+from sqlalchemy.exc import OperationalError
+from models import db, Order
+from plants import plant_engine
+
+MAX_PER_PAGE = 50
+
+SEARCH_INDEX_DDL = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+        order_number, description,
+        content='orders', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS orders_fts_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO orders_fts(rowid, order_number, description)
+        VALUES (new.id, new.order_number, new.description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS orders_fts_delete AFTER DELETE ON orders BEGIN
+        INSERT INTO orders_fts(orders_fts, rowid, order_number, description)
+        VALUES ('delete', old.id, old.order_number, old.description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS orders_fts_update AFTER UPDATE OF order_number, description ON orders BEGIN
+        INSERT INTO orders_fts(orders_fts, rowid, order_number, description)
+        VALUES ('delete', old.id, old.order_number, old.description);
+        INSERT INTO orders_fts(rowid, order_number, description)
+        VALUES (new.id, new.order_number, new.description);
+    END''',
+]
+
+orders_fts = table('orders_fts', column('rowid'), column('rank'), column('orders_fts'))
+
+fts_available = True
+
+
+def ensure_search_index():
+    """Create the current plant's FTS table and sync triggers; index existing orders on first creation"""
+    global fts_available
+    try:
+        with plant_engine().connect() as conn:
+            created = not conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders_fts'")).first()
+            for statement in SEARCH_INDEX_DDL:
+                conn.execute(text(statement))
+            if created:
+                conn.execute(text("INSERT INTO orders_fts(orders_fts) VALUES ('rebuild')"))
+            conn.commit()
+    except OperationalError:
+        fts_available = False
+        print("SQLite FTS5 is not available, order search falls back to LIKE matching")
+
+
+def match_expression(query):
+    """FTS5 query that prefix-matches every word of the user's input"""
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', query))
+
+
+def order_search_result(order):
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'description': order.description,
+        'system': order.system,
+        'handle_style': order.handle_style,
+        'welding_frames_qty': order.welding_frames_qty,
+        'glazing_frames_qty': order.glazing_frames_qty,
+        'szpros_complication': order.szpros_complication,
+        'created_at': order.created_at.isoformat() if order.created_at else None
+    }
+
+
+def search_orders(query, page=1, per_page=20):
+    """Ranked, paginated orders matching the query; newest orders for an empty query"""
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    page = max(1, page)
+    expression = match_expression(query or '')
+
+    if not expression:
+        orders_query = Order.query.order_by(Order.created_at.desc(), Order.id.desc())
+        total = Order.query.count()
+    elif fts_available:
+        match = orders_fts.c.orders_fts.op('MATCH')(expression)
+        ranked = select(orders_fts.c.rowid.label('id'), orders_fts.c.rank.label('rank')).where(match).subquery()
+        orders_query = Order.query.join(ranked, Order.id == ranked.c.id).order_by(ranked.c.rank)
+        total = db.session.execute(select(db.func.count()).select_from(orders_fts).where(match)).scalar()
+    else:
+        pattern = f'{query.strip()}%'
+        orders_query = Order.query.filter(db.or_(Order.order_number.like(pattern), Order.description.like(pattern)))\
+            .order_by(Order.order_number)
+        total = orders_query.count()
+
+    orders = orders_query.offset((page - 1) * per_page).limit(per_page).all()
+    return {
+        'results': [order_search_result(order) for order in orders],
+        'total': total,
+        'page': page,
+        'per_page': per_page
+    }
@@ -0,0 +1,127 @@
+"""Mergeable quantile sketches for session durations.
+
+Durations are kept in a log-bucketed histogram (the DDSketch scheme): every
+value lands in the bucket ``ceil(log(x) / log(gamma))``, so any quantile is
+returned within ``RELATIVE_ACCURACY`` of the true value. Sketches merge by
+adding bucket counts, which lets them be updated one session at a time when
+work stops and summed across profiles without touching time_logs.
+"""
+import math
+import struct
+from models import db, Order, TimeLog, StageDurationSketch
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+MIN_MINUTES = 0.01  # Shorter sessions are counted in the lowest bucket
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+# Order attributes the sketches are broken down by, besides the 'all' profile
+PROFILE_DIMENSIONS = ['system', 'handle_style', 'welding_frames_qty', 'glazing_frames_qty']
+
+_BUCKET = struct.Struct('<hI')
+
+
+class QuantileSketch:
+    """Log-bucketed histogram with relative-error quantiles"""
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or {}
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def add(self, minutes):
+        index = math.ceil(math.log(max(minutes, MIN_MINUTES)) / LOG_GAMMA)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * GAMMA ** index / (GAMMA + 1)
+
+    def to_bytes(self):
+        return b''.join(_BUCKET.pack(index, count) for index, count in sorted(self.buckets.items()))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls({index: count for index, count in _BUCKET.iter_unpack(data or b'')})
+
+
+def order_profiles(order):
+    """(dimension, value) pairs an order's sessions are recorded under"""
+    profiles = [('all', '')]
+    for dimension in PROFILE_DIMENSIONS:
+        value = getattr(order, dimension)
+        if value is not None:
+            profiles.append((dimension, str(value)))
+    return profiles
+
+
+def record_session_duration(time_log, order):
+    """Add a completed session to its stage's sketches; the caller commits"""
+    minutes = (time_log.end_time - time_log.start_time).total_seconds() / 60
+    for dimension, value in order_profiles(order):
+        row = StageDurationSketch.query.filter_by(
+            stage_id=time_log.stage_id, dimension=dimension, value=value
+        ).first()
+        if not row:
+            row = StageDurationSketch(stage_id=time_log.stage_id, dimension=dimension, value=value, count=0)
+            db.session.add(row)
+        sketch = QuantileSketch.from_bytes(row.data)
+        sketch.add(minutes)
+        row.data = sketch.to_bytes()
+        row.count = row.count + 1
+
+
+def rebuild_sketches():
+    """Recompute every sketch from completed time logs in one streamed scan"""
+    sketches = {}
+    rows = db.session.query(
+        TimeLog.stage_id, TimeLog.start_time, TimeLog.end_time, *[getattr(Order, d) for d in PROFILE_DIMENSIONS]
+    ).join(Order, Order.id == TimeLog.order_id)\
+     .filter(TimeLog.status == 'completed')\
+     .execution_options(yield_per=1000)
+    for row in rows:
+        minutes = (row.end_time - row.start_time).total_seconds() / 60
+        for dimension, value in order_profiles(row):
+            sketches.setdefault((row.stage_id, dimension, value), QuantileSketch()).add(minutes)
+
+    StageDurationSketch.query.delete()
+    db.session.add_all([
+        StageDurationSketch(stage_id=stage_id, dimension=dimension, value=value,
+                            count=sketch.count, data=sketch.to_bytes())
+        for (stage_id, dimension, value), sketch in sketches.items()
+    ])
+    db.session.commit()
+    return len(sketches)
+
+
+def stage_percentiles(dimension='all'):
+    """p50/p90/p99 minutes per stage and profile value, read from stored sketches"""
+    report_data = []
+    for row in StageDurationSketch.query.filter_by(dimension=dimension)\
+            .order_by(StageDurationSketch.stage_id, StageDurationSketch.value):
+        sketch = QuantileSketch.from_bytes(row.data)
+        item = {
+            'stage_id': row.stage_id,
+            'stage_name': row.stage.name,
+            'dimension': dimension,
+            'value': row.value or None,
+            'work_sessions': row.count
+        }
+        for label, q in QUANTILES.items():
+            item[f'{label}_minutes'] = round(sketch.quantile(q), 2)
+        report_data.append(item)
+    return report_data
@@ -0,0 +1,276 @@
+// Show/hide stages selection based on role
+document.getElementById('role').addEventListener('change', function() {
+    const stagesGroup = document.getElementById('stagesGroup');
+    if (this.value === 'worker') {
+        stagesGroup.style.display = 'block';
+    } else {
+        stagesGroup.style.display = 'none';
+    }
+});
+
+// Submit form to create user
+document.getElementById('userForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    
+    const formData = new FormData(e.target);
+    const data = {
+        username: formData.get('username'),
+        password: formData.get('password'),
+        full_name: formData.get('full_name'),
+        role: formData.get('role'),
+        stage_ids: []
+    };
+    
+    // Get selected stages
+    if (data.role === 'worker') {
+        const checkboxes = document.querySelectorAll('input[name="stages"]:checked');
+        data.stage_ids = Array.from(checkboxes).map(cb => parseInt(cb.value));
+    }
+    
+    try {
+        const response = await fetch('/api/users', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(data)
+        });
+        
+        const result = await response.json();
+        
+        if (response.ok) {
+            showMessage('Użytkownik został dodany pomyślnie!', 'success');
+            setTimeout(() => location.reload(), 1500);
+        } else {
+            showMessage(result.error || 'Błąd podczas dodawania użytkownika', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+});
+
+function showMessage(msg, type) {
+    const messageDiv = document.getElementById('message');
+    messageDiv.textContent = msg;
+    messageDiv.className = `message ${type}`;
+    messageDiv.style.display = 'block';
+    
+    setTimeout(() => {
+        messageDiv.style.display = 'none';
+    }, 5000);
+}
+
+async function deleteUser(userId) {
+    if (!confirm('Czy na pewno chcesz usunąć tego użytkownika?')) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/users/${userId}`, {
+            method: 'DELETE'
+        });
+        
+        if (response.ok) {
+            showMessage('Użytkownik został usunięty', 'success');
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            showMessage('Błąd podczas usuwania użytkownika', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+}
+
+function editUser(userId) {
+    // Simplified edit - in production you'd have a modal or edit page
+    alert('Funkcja edycji użytkownika - w przygotowaniu. Możesz usunąć użytkownika i dodać go ponownie z nowymi ustawieniami.');
+}
+
+// ========== Stage Management Functions ==========
+
+// Submit form to create stage
+document.getElementById('stageForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    
+    const name = document.getElementById('stageName').value.trim();
+    const description = document.getElementById('stageDescription').value.trim();
+    const limitHours = document.getElementById('stageLimit').value;
+    
+    if (!name) {
+        showMessage('Nazwa procesu nie może być pusta', 'error');
+        return;
+    }
+    
+    const data = { name, description };
+    if (limitHours) data.max_session_minutes = Math.round(parseFloat(limitHours) * 60);
+    
+    try {
+        const response = await fetch('/api/stages', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(data)
+        });
+        
+        const result = await response.json();
+        
+        if (response.ok) {
+            showMessage('Proces został dodany pomyślnie!', 'success');
+            setTimeout(() => location.reload(), 1500);
+        } else {
+            showMessage(result.error || 'Błąd podczas dodawania procesu', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+});
+
+// Helper to get data from button attributes
+function editStageFromData(button) {
+    const stageId = button.dataset.stageId;
+    const currentName = button.dataset.stageName;
+    const currentDescription = button.dataset.stageDesc;
+    const currentLimit = button.dataset.stageLimit;
+    editStage(stageId, currentName, currentDescription, currentLimit);
+}
+
+function deleteStageFromData(button) {
+    const stageId = button.dataset.stageId;
+    const stageName = button.dataset.stageName;
+    deleteStage(stageId, stageName);
+}
+
+async function editStage(stageId, currentName, currentDescription, currentLimit) {
+    const newName = prompt('Nowa nazwa procesu:', currentName);
+    if (newName === null) return; // User cancelled
+    
+    if (!newName.trim()) {
+        showMessage('Nazwa procesu nie może być pusta', 'error');
+        return;
+    }
+    
+    const newDescription = prompt('Nowy opis procesu (pozostaw puste aby usunąć):', currentDescription);
+    if (newDescription === null) return; // User cancelled
+    
+    const newLimit = prompt('Limit sesji w godzinach (pozostaw puste dla limitu domyślnego):',
+                            currentLimit ? (currentLimit / 60).toString() : '');
+    if (newLimit === null) return; // User cancelled
+    const limitHours = parseFloat(newLimit.replace(',', '.'));
+    if (newLimit.trim() && !(limitHours > 0)) {
+        showMessage('Limit sesji musi być liczbą godzin większą od zera', 'error');
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/stages/${stageId}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                name: newName.trim(),
+                description: newDescription.trim(),
+                max_session_minutes: newLimit.trim() ? Math.round(limitHours * 60) : null
+            })
+        });
+        
+        const result = await response.json();
+        
+        if (response.ok) {
+            showMessage('Proces został zaktualizowany', 'success');
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            showMessage(result.error || 'Błąd podczas aktualizacji procesu', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+}
+
+async function deleteStage(stageId, stageName) {
+    if (!confirm(`Czy na pewno chcesz usunąć proces "${stageName}"?\n\nUWAGA: Proces z powiązanymi wpisami czasowymi nie może zostać usunięty.`)) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/stages/${stageId}`, {
+            method: 'DELETE'
+        });
+        
+        const result = await response.json();
+        
+        if (response.ok) {
+            showMessage('Proces został usunięty', 'success');
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            showMessage(result.error || 'Błąd podczas usuwania procesu', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+}
+
+// ========== Stale Session Sweeps ==========
+
+async function loadStaleSweeps() {
+    try {
+        const response = await fetch('/api/admin/stale-sessions');
+        const data = await response.json();
+        renderStaleSweeps(data.reports);
+    } catch (error) {
+        document.getElementById('staleSweeps').innerHTML = '<p class="error">Błąd podczas ładowania przeglądów</p>';
+    }
+}
+
+async function runStaleSweep() {
+    try {
+        const response = await fetch('/api/admin/stale-sessions', {method: 'POST'});
+        const result = await response.json();
+        if (response.ok) {
+            showMessage(`Przegląd zakończony: ${result.swept} sesji`, 'success');
+            loadStaleSweeps();
+        } else {
+            showMessage(result.error || 'Błąd podczas przeglądu sesji', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+}
+
+function renderStaleSweeps(reports) {
+    const container = document.getElementById('staleSweeps');
+    const touched = reports.filter(report => report.swept > 0);
+    if (touched.length === 0) {
+        container.innerHTML = `<p class="text-muted">Brak niezamkniętych sesji${reports.length ? ` (ostatni przegląd: ${formatUtc(reports[0].swept_at)})` : ''}</p>`;
+        return;
+    }
+    
+    let html = '<table class="table"><thead><tr><th>Przegląd</th><th>Zlecenie</th><th>Etap</th><th>Pracownik</th><th>Początek</th><th>Zamknięta na</th></tr></thead><tbody>';
+    touched.forEach(report => {
+        report.sessions.forEach(session => {
+            html += `<tr>
+                <td>${formatUtc(report.swept_at)}</td>
+                <td>${escapeHtml(session.order_number)}</td>
+                <td>${escapeHtml(session.stage_name)}</td>
+                <td>${escapeHtml(session.worker_name)}</td>
+                <td>${formatUtc(session.start_time)}</td>
+                <td>${session.end_time ? formatUtc(session.end_time) : 'do weryfikacji'}</td>
+            </tr>`;
+        });
+    });
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+function formatUtc(isoString) {
+    return new Date(isoString + 'Z').toLocaleString('pl-PL');
+}
+
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+loadStaleSweeps();
@@ -0,0 +1,220 @@
+document.getElementById('orderForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    
+    const orderNumber = document.getElementById('orderNumber').value;
+    const description = document.getElementById('description').value;
+    const system = document.getElementById('system').value;
+    const handleStyle = document.getElementById('handleStyle').value;
+    const weldingFramesQty = document.getElementById('weldingFramesQty').value;
+    const glazingFramesQty = document.getElementById('glazingFramesQty').value;
+    const szprosComplication = document.getElementById('szprosComplication').value;
+    
+    const orderData = {
+        order_number: orderNumber,
+        description: description
+    };
+    
+    // Add optional fields if they have values
+    if (system) orderData.system = system;
+    if (handleStyle) orderData.handle_style = handleStyle;
+    if (weldingFramesQty) orderData.welding_frames_qty = parseInt(weldingFramesQty);
+    if (glazingFramesQty) orderData.glazing_frames_qty = parseInt(glazingFramesQty);
+    if (szprosComplication) orderData.szpros_complication = parseInt(szprosComplication);
+    
+    try {
+        const response = await fetch('/api/orders', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(orderData)
+        });
+        
+        const data = await response.json();
+        
+        if (response.ok) {
+            showMessage('Zlecenie utworzone pomyślnie!', 'success');
+            document.getElementById('orderForm').reset();
+            loadOrders();
+        } else {
+            showMessage(data.error || 'Błąd podczas tworzenia zlecenia', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+});
+
+document.getElementById('importForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    
+    const formData = new FormData();
+    formData.append('file', document.getElementById('importFile').files[0]);
+    
+    const messageDiv = document.getElementById('importMessage');
+    const errorsDiv = document.getElementById('importErrors');
+    errorsDiv.innerHTML = '';
+    
+    try {
+        const response = await fetch('/api/orders/import', {
+            method: 'POST',
+            body: formData
+        });
+        
+        const data = await response.json();
+        
+        if (response.ok) {
+            messageDiv.textContent = `Zaimportowano ${data.imported} z ${data.total_rows} zleceń`;
+            messageDiv.className = `message ${data.errors.length ? 'error' : 'success'}`;
+            
+            if (data.errors.length) {
+                let html = '<table class="table"><thead><tr><th>Wiersz</th><th>Numer zlecenia</th><th>Błąd</th></tr></thead><tbody>';
+                data.errors.forEach(error => {
+                    html += `<tr><td>${error.row}</td><td>${error.order_number || '-'}</td><td>${error.error}</td></tr>`;
+                });
+                html += '</tbody></table>';
+                errorsDiv.innerHTML = html;
+            }
+            loadOrders();
+        } else {
+            messageDiv.textContent = data.error || 'Błąd podczas importu';
+            messageDiv.className = 'message error';
+        }
+    } catch (error) {
+        messageDiv.textContent = 'Błąd komunikacji z serwerem';
+        messageDiv.className = 'message error';
+    }
+    messageDiv.style.display = 'block';
+});
+
+function showMessage(msg, type) {
+    const messageDiv = document.getElementById('message');
+    messageDiv.textContent = msg;
+    messageDiv.className = `message ${type}`;
+    messageDiv.style.display = 'block';
+    
+    setTimeout(() => {
+        messageDiv.style.display = 'none';
+    }, 5000);
+}
+
+const ORDERS_PER_PAGE = 20;
+const SEARCH_DEBOUNCE_MS = 250;
+let ordersPage = 1;
+let searchTimer = null;
+
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+async function loadOrders() {
+    const query = document.getElementById('orderSearch').value;
+    const params = new URLSearchParams({q: query, page: ordersPage, per_page: ORDERS_PER_PAGE});
+    
+    try {
+        const response = await fetch(`/api/orders/search?${params.toString()}`);
+        const data = await response.json();
+        const container = document.getElementById('ordersList');
+        
+        if (data.results.length === 0) {
+            container.innerHTML = query
+                ? '<p class="text-muted">Brak zleceń pasujących do wyszukiwania.</p>'
+                : '<p class="text-muted">Brak zleceń. Utwórz pierwsze zlecenie powyżej.</p>';
+            document.getElementById('ordersPager').style.display = 'none';
+            return;
+        }
+        
+        let html = `
+            <table class="table">
+                <thead>
+                    <tr>
+                        <th>Numer zlecenia</th>
+                        <th>Opis</th>
+                        <th>System</th>
+                        <th>Styl klamki</th>
+                        <th>Ramy spaw.</th>
+                        <th>Ramy szkl.</th>
+                        <th>Szprosy</th>
+                        <th>Data utworzenia</th>
+                        <th>Akcje</th>
+                    </tr>
+                </thead>
+                <tbody>
+        `;
+        
+        data.results.forEach(order => {
+            const createdAt = order.created_at ? order.created_at.slice(0, 16).replace('T', ' ') : '-';
+            html += `
+                <tr>
+                    <td>${escapeHtml(order.order_number)}</td>
+                    <td>${escapeHtml(order.description)}</td>
+                    <td>${escapeHtml(order.system || '-')}</td>
+                    <td>${escapeHtml(order.handle_style || '-')}</td>
+                    <td>${order.welding_frames_qty || '-'}</td>
+                    <td>${order.glazing_frames_qty || '-'}</td>
+                    <td>${order.szpros_complication || '-'}</td>
+                    <td>${createdAt}</td>
+                    <td>
+                        <a href="/api/orders/${order.id}/qrcode" class="btn btn-small" download>Pobierz kod QR</a>
+                        <button class="btn btn-small" data-order-id="${order.id}" data-order-number="${escapeHtml(order.order_number)}"
+                                onclick="showQR(this.dataset.orderId, this.dataset.orderNumber)">
+                            Pokaż kod QR
+                        </button>
+                    </td>
+                </tr>
+            `;
+        });
+        
+        html += '</tbody></table>';
+        container.innerHTML = html;
+        
+        const pages = Math.max(1, Math.ceil(data.total / data.per_page));
+        document.getElementById('pageInfo').textContent = `Strona ${data.page} z ${pages} (${data.total} zleceń)`;
+        document.getElementById('prevPageBtn').disabled = data.page <= 1;
+        document.getElementById('nextPageBtn').disabled = data.page >= pages;
+        document.getElementById('ordersPager').style.display = 'flex';
+    } catch (error) {
+        document.getElementById('ordersList').innerHTML = '<p class="error">Błąd podczas ładowania zleceń</p>';
+    }
+}
+
+document.getElementById('orderSearch').addEventListener('input', () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        ordersPage = 1;
+        loadOrders();
+    }, SEARCH_DEBOUNCE_MS);
+});
+
+document.getElementById('prevPageBtn').addEventListener('click', () => {
+    ordersPage -= 1;
+    loadOrders();
+});
+
+document.getElementById('nextPageBtn').addEventListener('click', () => {
+    ordersPage += 1;
+    loadOrders();
+});
+
+loadOrders();
+
+function showQR(orderId, orderNumber) {
+    const modal = document.getElementById('qrModal');
+    const container = document.getElementById('qrCodeContainer');
+    document.getElementById('modalOrderNumber').textContent = orderNumber;
+    
+    container.innerHTML = `<img src="/api/orders/${orderId}/qrcode" alt="QR Code" style="max-width: 100%;">`;
+    modal.style.display = 'block';
+}
+
+function closeModal() {
+    document.getElementById('qrModal').style.display = 'none';
+}
+
+window.onclick = function(event) {
+    const modal = document.getElementById('qrModal');
+    if (event.target == modal) {
+        modal.style.display = 'none';
+    }
+}
@@ -0,0 +1,369 @@
+function showTab(tabName, event) {
+    // Hide all tabs
+    const tabs = document.querySelectorAll('.tab-content');
+    tabs.forEach(tab => tab.classList.remove('active'));
+    
+    // Remove active class from all buttons
+    const buttons = document.querySelectorAll('.tab-btn');
+    buttons.forEach(btn => btn.classList.remove('active'));
+    
+    // Show selected tab
+    document.getElementById(tabName).classList.add('active');
+    
+    // Add active class to clicked button
+    event.target.classList.add('active');
+}
+
+const SEARCH_DEBOUNCE_MS = 250;
+let searchTimer = null;
+
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+// Order picker: fetch only matching orders from the search API as the user types
+async function loadOrderSuggestions() {
+    const query = document.getElementById('orderSearch').value;
+    const list = document.getElementById('orderSuggestions');
+    if (!query.trim()) {
+        list.style.display = 'none';
+        return;
+    }
+    
+    try {
+        const params = new URLSearchParams({q: query, per_page: 10});
+        const response = await fetch(`/api/orders/search?${params.toString()}`);
+        const data = await response.json();
+        
+        if (data.results.length === 0) {
+            list.innerHTML = '<div class="typeahead-empty">Brak pasujących zleceń</div>';
+        } else {
+            list.innerHTML = data.results.map(order => `
+                <div class="typeahead-item" data-order-id="${order.id}"
+                     data-label="${escapeHtml(order.order_number)}">
+                    <strong>${escapeHtml(order.order_number)}</strong> ${escapeHtml(order.description || '')}
+                </div>
+            `).join('');
+        }
+        list.style.display = 'block';
+    } catch (error) {
+        console.error('Error searching orders:', error);
+    }
+}
+
+document.getElementById('orderSearch').addEventListener('input', () => {
+    // Typing invalidates the previous selection until a suggestion is picked
+    document.getElementById('orderFilter').value = '';
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(loadOrderSuggestions, SEARCH_DEBOUNCE_MS);
+});
+
+document.getElementById('orderSuggestions').addEventListener('click', (e) => {
+    const item = e.target.closest('.typeahead-item');
+    if (!item) return;
+    document.getElementById('orderFilter').value = item.dataset.orderId;
+    document.getElementById('orderSearch').value = item.dataset.label;
+    document.getElementById('orderSuggestions').style.display = 'none';
+    loadFacets();
+});
+
+document.addEventListener('click', (e) => {
+    if (!e.target.closest('.typeahead')) {
+        document.getElementById('orderSuggestions').style.display = 'none';
+    }
+});
+
+function getReportParams() {
+    const orderId = document.getElementById('orderFilter').value;
+    const system = document.getElementById('systemFilter').value;
+    const handleStyle = document.getElementById('handleStyleFilter').value;
+    const weldingFrames = document.getElementById('weldingFramesFilter').value;
+    const glazingFrames = document.getElementById('glazingFramesFilter').value;
+    const szpros = document.getElementById('szprosFilter').value;
+    
+    const params = new URLSearchParams();
+    if (orderId) params.append('order_id', orderId);
+    if (system) params.append('system', system);
+    if (handleStyle) params.append('handle_style', handleStyle);
+    if (weldingFrames) params.append('welding_frames_min', weldingFrames);
+    if (glazingFrames) params.append('glazing_frames_min', glazingFrames);
+    if (szpros) params.append('szpros_complication', szpros);
+    const plantScope = document.getElementById('plantScope');
+    if (plantScope && plantScope.value) params.append('plant', plantScope.value);
+    return params;
+}
+
+// Filter select -> facet returned by /api/reports/facets
+const FACET_SELECTS = {
+    system: 'systemFilter',
+    handle_style: 'handleStyleFilter',
+    welding_frames_min: 'weldingFramesFilter',
+    glazing_frames_min: 'glazingFramesFilter',
+    szpros_complication: 'szprosFilter'
+};
+
+// Show how many orders and hours each filter value covers under the other filters
+async function loadFacets() {
+    const params = getReportParams();
+    const url = `/api/reports/facets${params.toString() ? '?' + params.toString() : ''}`;
+    
+    try {
+        const response = await fetch(url);
+        if (!response.ok) return;
+        const facets = await response.json();
+        
+        Object.entries(FACET_SELECTS).forEach(([facet, selectId]) => {
+            const counts = {};
+            facets[facet].forEach(row => { counts[String(row.value)] = row; });
+            Array.from(document.getElementById(selectId).options).forEach(option => {
+                if (!option.value) return;
+                if (!option.dataset.label) option.dataset.label = option.textContent;
+                const row = counts[option.value];
+                option.textContent = row
+                    ? `${option.dataset.label} (${row.orders} zlec., ${row.total_hours} h)`
+                    : `${option.dataset.label} (0)`;
+            });
+        });
+    } catch (error) {
+        console.error('Error loading filter counts:', error);
+    }
+}
+
+Object.values(FACET_SELECTS).forEach(selectId => {
+    document.getElementById(selectId).addEventListener('change', loadFacets);
+});
+if (document.getElementById('plantScope')) {
+    document.getElementById('plantScope').addEventListener('change', loadFacets);
+}
+
+// Load all three reports with a single request to the combined dashboard endpoint
+async function loadDashboard() {
+    const params = getReportParams();
+    const url = `/api/reports/dashboard${params.toString() ? '?' + params.toString() : ''}`;
+    
+    try {
+        const response = await fetch(url);
+        const data = await response.json();
+        
+        renderOrderTimesReport(data.order_times);
+        renderWorkerProductivityReport(data.worker_productivity);
+        renderStageEfficiencyReport(data.stage_efficiency);
+    } catch (error) {
+        ['orderTimesReport', 'workerProductivityReport', 'stageEfficiencyReport'].forEach(id => {
+            document.getElementById(id).innerHTML = '<p class="error">Błąd podczas ładowania raportu</p>';
+        });
+    }
+}
+
+function renderOrderTimesReport(data) {
+    const container = document.getElementById('orderTimesReport');
+    
+    if (data.length === 0) {
+        container.innerHTML = '<p class="text-muted">Brak danych do wyświetlenia</p>';
+        return;
+    }
+    
+    let html = `
+        <table class="table">
+            <thead>
+                <tr>
+                    <th>Zlecenie</th>
+                    <th>Opis</th>
+                    <th>System</th>
+                    <th>Klamka</th>
+                    <th>Ramy spaw.</th>
+                    <th>Ramy szkl.</th>
+                    <th>Szprosy</th>
+                    <th>Etap</th>
+                    <th>Liczba sesji</th>
+                    <th>Całkowity czas (min)</th>
+                    <th>Całkowity czas (godz)</th>
+                </tr>
+            </thead>
+            <tbody>
+    `;
+    
+    data.forEach(row => {
+        html += `
+            <tr>
+                <td>${row.order_number}</td>
+                <td>${row.description || '-'}</td>
+                <td>${row.system || '-'}</td>
+                <td>${row.handle_style || '-'}</td>
+                <td>${row.welding_frames_qty || '-'}</td>
+                <td>${row.glazing_frames_qty || '-'}</td>
+                <td>${row.szpros_complication || '-'}</td>
+                <td>${row.stage_name}</td>
+                <td>${row.work_sessions}</td>
+                <td>${row.total_minutes}</td>
+                <td>${row.total_hours}</td>
+            </tr>
+        `;
+    });
+    
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+function renderWorkerProductivityReport(data) {
+    const container = document.getElementById('workerProductivityReport');
+    
+    if (data.length === 0) {
+        container.innerHTML = '<p class="text-muted">Brak danych do wyświetlenia</p>';
+        return;
+    }
+    
+    let html = `
+        <table class="table">
+            <thead>
+                <tr>
+                    <th>Pracownik</th>
+                    <th>Liczba sesji</th>
+                    <th>Całkowity czas (min)</th>
+                    <th>Całkowity czas (godz)</th>
+                </tr>
+            </thead>
+            <tbody>
+    `;
+    
+    data.forEach(row => {
+        html += `
+            <tr>
+                <td>${row.worker_name}</td>
+                <td>${row.work_sessions}</td>
+                <td>${row.total_minutes}</td>
+                <td>${row.total_hours}</td>
+            </tr>
+        `;
+    });
+    
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+function renderStageEfficiencyReport(data) {
+    const container = document.getElementById('stageEfficiencyReport');
+    
+    if (data.length === 0) {
+        container.innerHTML = '<p class="text-muted">Brak danych do wyświetlenia</p>';
+        return;
+    }
+    
+    let html = `
+        <table class="table">
+            <thead>
+                <tr>
+                    <th>Etap</th>
+                    <th>Liczba sesji</th>
+                    <th>Średni czas (min)</th>
+                    <th>Średni czas (godz)</th>
+                    <th>Całkowity czas (min)</th>
+                    <th>Całkowity czas (godz)</th>
+                </tr>
+            </thead>
+            <tbody>
+    `;
+    
+    data.forEach(row => {
+        html += `
+            <tr>
+                <td>${row.stage_name}</td>
+                <td>${row.work_sessions}</td>
+                <td>${row.avg_minutes}</td>
+                <td>${row.avg_hours}</td>
+                <td>${row.total_minutes}</td>
+                <td>${row.total_hours}</td>
+            </tr>
+        `;
+    });
+    
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+// Export functions - exports run as background jobs, the browser polls until the file is ready
+const JOB_POLL_MS = 1000;
+
+async function runExportJob(report, containerId) {
+    const filters = Object.fromEntries(getReportParams());
+    const container = document.getElementById(containerId);
+    const status = document.createElement('p');
+    status.className = 'text-muted';
+    status.textContent = 'Przygotowywanie eksportu...';
+    container.prepend(status);
+    
+    try {
+        const response = await fetch('/api/jobs', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({kind: 'export', params: {report: report, filters: filters}})
+        });
+        let job = await response.json();
+        if (!response.ok) {
+            status.textContent = job.error || 'Błąd podczas eksportu';
+            return;
+        }
+        
+        while (job.status === 'queued' || job.status === 'running') {
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_MS));
+            job = await (await fetch(`/api/jobs/${job.id}`)).json();
+            status.textContent = `Przygotowywanie eksportu... ${job.progress}%`;
+        }
+        
+        if (job.status === 'completed') {
+            status.remove();
+            window.location.href = `/api/jobs/${job.id}/artifact`;
+        } else {
+            status.textContent = `Błąd podczas eksportu: ${job.message || ''}`;
+        }
+    } catch (error) {
+        status.textContent = 'Błąd komunikacji z serwerem';
+    }
+}
+
+function exportOrderTimesReport() {
+    runExportJob('order-times', 'orderTimesReport');
+}
+
+function exportWorkerProductivityReport() {
+    runExportJob('worker-productivity', 'workerProductivityReport');
+}
+
+function exportStageEfficiencyReport() {
+    runExportJob('stage-efficiency', 'stageEfficiencyReport');
+}
+
+const WIP_REFRESH_MS = 5000; // Served from memory on the server, cheap to poll
+
+async function loadWipBoard() {
+    try {
+        const response = await fetch('/api/wip');
+        const data = await response.json();
+        
+        let html = '<table class="table"><thead><tr><th>Etap</th><th>Zlecenia</th><th>Pracownicy</th><th>Aktywne sesje</th></tr></thead><tbody>';
+        data.forEach(row => {
+            html += `<tr>
+                <td>${row.stage_name}</td>
+                <td>${row.orders}</td>
+                <td>${row.workers}</td>
+                <td>${row.sessions}</td>
+            </tr>`;
+        });
+        html += '</tbody></table>';
+        document.getElementById('wipBoard').innerHTML = html;
+    } catch (error) {
+        console.error('Error loading WIP board:', error);
+    }
+}
+
+// Load initial reports on page load
+window.addEventListener('load', () => {
+    loadDashboard();
+    loadFacets();
+    loadWipBoard();
+    setInterval(loadWipBoard, WIP_REFRESH_MS);
+});
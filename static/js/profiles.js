@@ -0,0 +1,130 @@
+// Switch profiling on for an endpoint
+document.getElementById('profilingForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+
+    const formData = new FormData(e.target);
+    const data = {
+        rule: formData.get('rule'),
+        mode: formData.get('mode'),
+        sample_rate: parseFloat(formData.get('sample_rate')),
+        interval_ms: parseInt(formData.get('interval_ms'))
+    };
+
+    try {
+        const response = await fetch('/api/admin/profiling', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(data)
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showMessage(`Profilowanie włączone dla ${result.rule}`, 'success');
+            loadProfiling();
+        } else {
+            showMessage(result.error || 'Błąd podczas włączania profilowania', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+});
+
+async function disableProfiling(rule) {
+    try {
+        const response = await fetch(`/api/admin/profiling?rule=${encodeURIComponent(rule)}`, {method: 'DELETE'});
+        const result = await response.json();
+        if (response.ok) {
+            showMessage('Profilowanie wyłączone', 'success');
+            loadProfiling();
+        } else {
+            showMessage(result.error || 'Błąd podczas wyłączania profilowania', 'error');
+        }
+    } catch (error) {
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    }
+}
+
+async function loadProfiling() {
+    try {
+        const response = await fetch('/api/admin/profiling');
+        const data = await response.json();
+        renderTargets(data.targets);
+        renderProfiles(data.profiles);
+    } catch (error) {
+        document.getElementById('profiles').innerHTML = '<p class="error">Błąd podczas ładowania profili</p>';
+    }
+}
+
+function renderTargets(targets) {
+    const container = document.getElementById('targets');
+    if (targets.length === 0) {
+        container.innerHTML = '<p class="text-muted">Profilowanie jest wyłączone</p>';
+        return;
+    }
+
+    let html = '<table class="table"><thead><tr><th>Endpoint</th><th>Tryb</th><th>Odsetek żądań</th><th>Interwał (ms)</th><th>Od</th><th></th></tr></thead><tbody>';
+    targets.forEach(target => {
+        html += `<tr>
+            <td>${escapeHtml(target.rule)}</td>
+            <td>${escapeHtml(target.mode)}</td>
+            <td>${target.sample_rate}</td>
+            <td>${target.mode === 'sampling' ? target.interval_ms : '-'}</td>
+            <td>${new Date(target.enabled_at + 'Z').toLocaleString('pl-PL')}</td>
+            <td><button class="btn btn-small btn-danger" data-rule="${escapeHtml(target.rule)}" onclick="disableProfiling(this.dataset.rule)">Wyłącz</button></td>
+        </tr>`;
+    });
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+function renderProfiles(profiles) {
+    const container = document.getElementById('profiles');
+    if (profiles.length === 0) {
+        container.innerHTML = '<p class="text-muted">Brak zapisanych profili</p>';
+        return;
+    }
+
+    let html = '<table class="table"><thead><tr><th>Czas</th><th>Żądanie</th><th>Tryb</th><th>Czas całkowity (ms)</th><th>SQL (ms)</th><th>Najdroższe funkcje</th><th>Pliki</th></tr></thead><tbody>';
+    profiles.forEach(profile => {
+        const sqlShare = profile.wall_ms ? Math.round(100 * profile.sql_ms / profile.wall_ms) : 0;
+        const functions = profile.top_functions.slice(0, 5).map(fn =>
+            `<div><code>${escapeHtml(fn.function)}</code> - ${fn.self_ms} ms${fn.calls ? ` (${fn.calls}×)` : ''}</div>`
+        ).join('');
+        const files = profile.files.map(kind =>
+            `<a href="/api/admin/profiles/${encodeURIComponent(profile.id)}/${kind}">${kind === 'prof' ? '.prof' : 'flamegraph'}</a>`
+        ).join(' ');
+        html += `<tr>
+            <td>${new Date(profile.started_at + 'Z').toLocaleString('pl-PL')}</td>
+            <td>${escapeHtml(profile.method)} ${escapeHtml(profile.path)} <span class="text-muted">(${profile.status})</span></td>
+            <td>${escapeHtml(profile.mode)}</td>
+            <td>${profile.wall_ms}</td>
+            <td>${profile.sql_ms} (${sqlShare}%, ${profile.sql_queries} zapytań)</td>
+            <td>${functions}</td>
+            <td>${files}</td>
+        </tr>`;
+    });
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+function showMessage(msg, type) {
+    const messageDiv = document.getElementById('message');
+    messageDiv.textContent = msg;
+    messageDiv.className = `message ${type}`;
+    messageDiv.style.display = 'block';
+
+    setTimeout(() => {
+        messageDiv.style.display = 'none';
+    }, 5000);
+}
+
+loadProfiling();
@@ -0,0 +1,398 @@
+const SCAN_COOLDOWN_MS = 3000; // 3 seconds between scans
+const SCAN_RETRY_DELAYS_MS = [500, 1500]; // resends of a scan whose request failed in transit
+
+let currentWorkerName = '';
+let currentWorkerId = '';
+let checkInterval = null;
+let html5QrcodeScanner = null;
+let isScanning = false;
+let scanCooldown = false;
+let lastProcessedQR = '';
+let lastProcessedTime = 0;
+
+function setupEventListeners() {
+    // Get worker name from logged-in user (stored in hidden field)
+    const workerNameEl = document.getElementById('workerName');
+    if (workerNameEl && workerNameEl.value) {
+        currentWorkerName = workerNameEl.value;
+        currentWorkerId = document.getElementById('workerId').value;
+        // Load active sessions immediately
+        loadActiveSessions();
+        // Set up periodic refresh of active sessions
+        if (!checkInterval) {
+            checkInterval = setInterval(loadActiveSessions, 30000); // Check every 30 seconds
+        }
+    }
+    
+    // Allow Enter key on QR input for quick scanning
+    const qrInputEl = document.getElementById('qrInput');
+    if (qrInputEl) {
+        qrInputEl.addEventListener('keypress', (e) => {
+            if (e.key === 'Enter') {
+                document.getElementById('startBtn').click();
+            }
+        });
+    }
+    
+    // Camera QR scanning functionality
+    const startScanBtnEl = document.getElementById('startScanBtn');
+    if (startScanBtnEl) {
+        startScanBtnEl.addEventListener('click', () => {
+            startQRScanner();
+        });
+    }
+    
+    const stopScanBtnEl = document.getElementById('stopScanBtn');
+    if (stopScanBtnEl) {
+        stopScanBtnEl.addEventListener('click', () => {
+            stopQRScanner();
+        });
+    }
+}
+
+async function processQRScan(qrData) {
+    const now = Date.now();
+    
+    // Check if this is the same QR code scanned too recently
+    if (lastProcessedQR === qrData && (now - lastProcessedTime) < SCAN_COOLDOWN_MS) {
+        console.log('Scan ignored - same QR code within cooldown period');
+        return;
+    }
+    
+    // Prevent multiple rapid scans during cooldown period
+    if (scanCooldown) {
+        console.log('Scan blocked - cooldown active for different QR');
+        return;
+    }
+    
+    const workerName = document.getElementById('workerName').value.trim();
+    const stageId = document.getElementById('stageSelect').value;
+    
+    if (!workerName) {
+        showMessage('Błąd: brak informacji o pracowniku', 'error');
+        return;
+    }
+    
+    if (!stageId) {
+        showMessage('Wybierz etap produkcji przed skanowaniem', 'error');
+        return;
+    }
+    
+    // Set cooldown to prevent multiple scans
+    scanCooldown = true;
+    lastProcessedQR = qrData;
+    lastProcessedTime = now;
+    console.log('Processing QR code:', qrData, 'at', new Date(now).toISOString());
+    
+    // Update currentWorkerName to ensure consistency
+    currentWorkerName = workerName;
+    const workerId = document.getElementById('workerId').value;
+    
+    // Check if there's an active session for this order AND stage
+    const activeSessions = await getActiveSessionsForWorker(workerId);
+    console.log('Active sessions for worker:', activeSessions);
+    console.log('Looking for QR:', qrData, 'Worker:', workerId, 'Stage:', stageId, '(as int:', parseInt(stageId), ')');
+    
+    const existingSession = activeSessions.find(session => {
+        const matches = session.qr_data === qrData && 
+                       session.worker_id === parseInt(workerId) && 
+                       session.stage_id === parseInt(stageId);
+        console.log('Checking session:', session, 'Matches:', matches);
+        return matches;
+    });
+    
+    const action = existingSession ? 'stop' : 'start';
+    console.log('Existing session found:', existingSession);
+    console.log('Action determined:', action);
+    
+    let success = false;
+    
+    try {
+        const response = await postScan({
+            qr_data: qrData,
+            worker_id: parseInt(workerId),
+            stage_id: stageId,
+            action: action
+        });
+        
+        const data = await response.json();
+        
+        if (response.ok) {
+            console.log('Scan successful:', data);
+            success = true;
+            if (data.duplicate) {
+                showMessage(`ℹ️ Skan zlecenia ${data.order_number} został już przetworzony`, 'success');
+            } else if (action === 'start') {
+                showMessage(`✅ Rozpoczęto pracę nad zleceniem ${data.order_number} na etapie ${data.stage}`, 'success');
+                showStatusBanner('green', `🟢 Praca w toku`, `Zlecenie: ${data.order_number} - Etap: ${data.stage}`);
+            } else {
+                showMessage(`⏹️ Zakończono pracę. Czas trwania: ${data.duration_minutes} minut`, 'success');
+                showStatusBanner('red', `🔴 Praca zakończona`, `Czas trwania: ${data.duration_minutes} minut`);
+            }
+            loadActiveSessions();
+        } else {
+            console.error('Scan failed:', data);
+            showMessage(data.error || 'Błąd podczas przetwarzania', 'error');
+        }
+    } catch (error) {
+        console.error('Scan error:', error);
+        showMessage('Błąd komunikacji z serwerem', 'error');
+    } finally {
+        // Clear cooldown - immediately on error, after delay on success
+        if (success) {
+            setTimeout(() => {
+                scanCooldown = false;
+                console.log('Cooldown cleared - ready for next scan');
+            }, SCAN_COOLDOWN_MS);
+        } else {
+            scanCooldown = false;
+            console.log('Cooldown cleared immediately due to error');
+        }
+    }
+}
+
+async function postScan(scan) {
+    // One key per scan: a resend after a lost response is answered from the server's
+    // idempotency cache instead of being processed twice
+    const idempotencyKey = newIdempotencyKey();
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await fetch('/api/scan', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': idempotencyKey,
+                },
+                body: JSON.stringify(scan)
+            });
+        } catch (error) {
+            if (attempt >= SCAN_RETRY_DELAYS_MS.length) {
+                throw error;
+            }
+            console.warn('Scan request failed, resending:', error);
+            await new Promise(resolve => setTimeout(resolve, SCAN_RETRY_DELAYS_MS[attempt]));
+        }
+    }
+}
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function getActiveSessions() {
+    if (!currentWorkerId) return [];
+    return await getActiveSessionsForWorker(currentWorkerId);
+}
+
+async function getActiveSessionsForWorker(workerId) {
+    if (!workerId) return [];
+    
+    try {
+        const response = await fetch(`/api/worker/active-sessions?worker_id=${encodeURIComponent(workerId)}`);
+        if (response.ok) {
+            return await response.json();
+        }
+    } catch (error) {
+        console.error('Error fetching active sessions:', error);
+    }
+    return [];
+}
+
+async function loadActiveSessions() {
+    if (!currentWorkerId) return;
+    
+    try {
+        const response = await fetch(`/api/worker/active-sessions?worker_id=${encodeURIComponent(currentWorkerId)}`);
+        const sessions = await response.json();
+        
+        const container = document.getElementById('activeSessions');
+        
+        if (sessions.length === 0) {
+            container.innerHTML = '<p class="text-muted">Brak aktywnych sesji pracy</p>';
+        } else {
+            let html = '<table class="table"><thead><tr><th>Zlecenie</th><th>Etap</th><th>Czas rozpoczęcia</th></tr></thead><tbody>';
+            sessions.forEach(session => {
+                const startTime = new Date(session.start_time).toLocaleString('pl-PL');
+                html += `<tr>
+                    <td>${session.order_number}</td>
+                    <td>${session.stage_name}</td>
+                    <td>${startTime}</td>
+                </tr>`;
+            });
+            html += '</tbody></table>';
+            container.innerHTML = html;
+        }
+    } catch (error) {
+        console.error('Error loading active sessions:', error);
+    }
+}
+
+function showMessage(msg, type) {
+    const messageDiv = document.getElementById('message');
+    messageDiv.textContent = msg;
+    messageDiv.className = `message ${type}`;
+    messageDiv.style.display = 'block';
+    
+    setTimeout(() => {
+        messageDiv.style.display = 'none';
+    }, 5000);
+}
+
+function showStatusBanner(color, mainText, detailsText) {
+    const banner = document.getElementById('statusBanner');
+    const statusText = document.getElementById('statusText');
+    const statusDetails = document.getElementById('statusDetails');
+    
+    if (color === 'green') {
+        banner.style.backgroundColor = '#27ae60';
+        banner.style.color = 'white';
+    } else if (color === 'red') {
+        banner.style.backgroundColor = '#e74c3c';
+        banner.style.color = 'white';
+    }
+    
+    statusText.textContent = mainText;
+    statusDetails.textContent = detailsText;
+    banner.style.display = 'block';
+    
+    // Hide banner after 15 seconds (increased from 8 seconds)
+    setTimeout(() => {
+        banner.style.display = 'none';
+    }, 15000);
+}
+
+function startQRScanner() {
+    if (isScanning) return;
+    
+    // Check if Html5Qrcode library is loaded
+    if (typeof Html5Qrcode === 'undefined') {
+        showMessage('Biblioteka skanowania nie została załadowana. Sprawdź połączenie internetowe i odśwież stronę.', 'error');
+        return;
+    }
+    
+    const qrReaderDiv = document.getElementById('qrReader');
+    qrReaderDiv.style.display = 'block';
+    
+    html5QrcodeScanner = new Html5Qrcode("qrReader");
+    
+    const config = {
+        fps: 10,
+        qrbox: { width: 250, height: 250 },
+        aspectRatio: 1.0,
+        disableFlip: false  // Try both normal and flipped orientations
+    };
+    
+    html5QrcodeScanner.start(
+        { facingMode: "environment" }, // Use back camera on mobile
+        config,
+        (decodedText, decodedResult) => {
+            // QR code successfully scanned - automatically process it
+            processQRScan(decodedText);
+        },
+        (errorMessage) => {
+            // Scanning error or no QR code detected - this is normal, ignore
+        }
+    ).then(() => {
+        isScanning = true;
+        document.getElementById('startScanBtn').style.display = 'none';
+        document.getElementById('stopScanBtn').style.display = 'inline-block';
+    }).catch((err) => {
+        let errorMsg = 'Błąd uruchamiania kamery: ';
+        const errMessage = err.message || '';
+        
+        if (err.name === 'NotReadableError' || errMessage.includes('NotReadableError')) {
+            errorMsg += 'Kamera jest już używana przez inną aplikację lub kartę przeglądarki. Zamknij inne aplikacje używające kamery i odśwież stronę.';
+        } else if (err.name === 'NotAllowedError' || errMessage.includes('Permission denied')) {
+            errorMsg += 'Brak dostępu do kamery. Zezwól na użycie kamery w ustawieniach przeglądarki i odśwież stronę.';
+        } else if (err.name === 'NotFoundError' || errMessage.includes('Requested device not found')) {
+            errorMsg += 'Nie znaleziono kamery. Upewnij się, że urządzenie ma podłączoną kamerę.';
+        } else {
+            errorMsg += (err.message || err);
+        }
+        
+        showMessage(errorMsg, 'error');
+        qrReaderDiv.style.display = 'none';
+        
+        // Reset scanner state
+        if (html5QrcodeScanner) {
+            try {
+                html5QrcodeScanner.clear();
+            } catch (clearErr) {
+                console.error('Error clearing scanner:', clearErr);
+            }
+            html5QrcodeScanner = null;
+        }
+        isScanning = false;
+        
+        // Show start button to allow manual retry
+        document.getElementById('startScanBtn').style.display = 'inline-block';
+        document.getElementById('stopScanBtn').style.display = 'none';
+    });
+}
+
+function stopQRScanner() {
+    if (!isScanning || !html5QrcodeScanner) return;
+    
+    html5QrcodeScanner.stop().then(() => {
+        resetScannerUI();
+    }).catch((err) => {
+        console.error('Error stopping scanner:', err);
+        // Reset UI even if stopping fails
+        resetScannerUI();
+    });
+}
+
+function resetScannerUI() {
+    if (html5QrcodeScanner) {
+        try {
+            html5QrcodeScanner.clear();
+        } catch (err) {
+            console.error('Error clearing scanner:', err);
+        }
+        html5QrcodeScanner = null;
+    }
+    isScanning = false;
+    document.getElementById('qrReader').style.display = 'block';
+    document.getElementById('startScanBtn').style.display = 'inline-block';
+    document.getElementById('stopScanBtn').style.display = 'none';
+}
+
+// Auto-start scanner after library loads with delay to ensure permissions
+function initScanner() {
+    if (typeof Html5Qrcode !== 'undefined') {
+        // Hide start button initially while auto-starting
+        document.getElementById('startScanBtn').style.display = 'none';
+        
+        // Add a small delay before auto-starting to allow page to fully load
+        setTimeout(() => {
+            startQRScanner();
+        }, 500);
+    } else {
+        // Show start button if library takes too long to load
+        setTimeout(() => {
+            if (typeof Html5Qrcode === 'undefined') {
+                document.getElementById('startScanBtn').style.display = 'inline-block';
+                showMessage('Ładowanie biblioteki skanowania... Jeśli trwa to długo, sprawdź połączenie internetowe.', 'info');
+            }
+        }, 3000);
+        
+        // Retry after a short delay if library not loaded yet
+        setTimeout(initScanner, 100);
+    }
+}
+
+// Initialize everything when DOM is ready
+function initializePage() {
+    setupEventListeners();
+    initScanner();
+}
+
+// Start when DOM is ready
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', initializePage);
+} else {
+    initializePage();
+}
@@ -0,0 +1,134 @@
+"""Background sweep of stale in-progress sessions.
+
+Workers sometimes never scan "stop", which leaves time logs in progress for
+days. A session is stale once it has run longer than its stage's
+max_session_minutes, or STALE_SESSION_MINUTES when the stage sets no limit.
+Stale sessions are either closed at start + limit with status 'auto_closed'
+or, with the 'flag' action, marked 'stale' without an end time for a manager
+to correct. Neither status counts as completed, so reports, estimates and
+duration sketches ignore them; timelines leave out stale sessions, which
+have no end.
+
+Each stage is swept with a range over the in-progress rows of the
+(status, ...) time log index. Rows are updated in batches of SWEEP_BATCH with
+one commit each, so scans are never blocked for long. Every change is
+journaled and taken off the WIP index. The last sweeps of each plant are
+kept in memory for the admin panel.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from journal import EVENT_AUTO_CLOSE, EVENT_FLAG, scan_journal
+from models import db, Order, ProductionStage, TimeLog
+from plants import current_plant, use_plant
+from wip import wip_index
+
+SWEEP_ACTIONS = {'close': ('auto_closed', EVENT_AUTO_CLOSE), 'flag': ('stale', EVENT_FLAG)}
+SWEEP_BATCH = 500
+MAX_REPORTS = 50
+MAX_REPORTED_SESSIONS = 200
+
+_reports = defaultdict(lambda: deque(maxlen=MAX_REPORTS))  # plant -> recent sweep reports
+_sweep_lock = threading.Lock()
+_sweep_thread = None
+
+
+def sweep_stale_sessions(default_minutes, action='close', now=None, batch_size=SWEEP_BATCH):
+    """Close or flag the current plant's stale sessions; returns the sweep report"""
+    status, event = SWEEP_ACTIONS[action]
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    report = {
+        'plant': current_plant(),
+        'swept_at': now.isoformat(),
+        'action': action,
+        'swept': 0,
+        'stages': [],
+        'sessions': []
+    }
+    with _sweep_lock:
+        stages = db.session.query(ProductionStage.id, ProductionStage.name, ProductionStage.max_session_minutes)\
+            .order_by(ProductionStage.id).all()
+        for stage in stages:
+            limit = stage.max_session_minutes or default_minutes
+            swept = _sweep_stage(stage, limit, now - timedelta(minutes=limit), status, event, now,
+                                 batch_size, report['sessions'])
+            report['stages'].append({'stage_id': stage.id, 'stage_name': stage.name,
+                                     'limit_minutes': limit, 'swept': swept})
+            report['swept'] += swept
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    _reports[report['plant']].appendleft(report)
+    return report
+
+
+def _sweep_stage(stage, limit, cutoff, status, event, now, batch_size, reported_sessions):
+    swept = 0
+    while True:
+        rows = db.session.query(TimeLog.id, TimeLog.order_id, TimeLog.stage_id, TimeLog.worker_id,
+                                TimeLog.worker_name, TimeLog.start_time, Order.order_number)\
+            .join(Order, Order.id == TimeLog.order_id)\
+            .filter(TimeLog.status == 'in_progress', TimeLog.stage_id == stage.id, TimeLog.start_time < cutoff)\
+            .order_by(TimeLog.start_time).limit(batch_size).all()
+        if not rows:
+            return swept
+        end_times = {row.id: row.start_time + timedelta(minutes=limit) if status == 'auto_closed' else None
+                     for row in rows}
+        db.session.execute(
+            update(TimeLog).where(TimeLog.status == 'in_progress'),
+            [{'id': row.id, 'status': status, 'end_time': end_times[row.id]} for row in rows],
+            execution_options={'synchronize_session': None}
+        )
+        # Sessions stopped by a scan since the select above keep their status; the
+        # write lock held until commit makes this re-read exact
+        touched = {log_id for log_id, in db.session.query(TimeLog.id)
+                   .filter(TimeLog.id.in_(end_times), TimeLog.status == status)}
+        db.session.commit()
+        for row in rows:
+            if row.id not in touched:
+                continue
+            wip_index.stop(row.stage_id, row.order_id, row.worker_id)
+            scan_journal.append(event, row, timestamp=end_times[row.id] or now)
+            if len(reported_sessions) < MAX_REPORTED_SESSIONS:
+                reported_sessions.append({
+                    'log_id': row.id,
+                    'order_number': row.order_number,
+                    'stage_name': stage.name,
+                    'worker_name': row.worker_name,
+                    'start_time': row.start_time.isoformat(),
+                    'end_time': end_times[row.id].isoformat() if end_times[row.id] else None
+                })
+        swept += len(touched)
+        if len(rows) < batch_size:
+            return swept
+
+
+def sweep_reports(plant=None):
+    """Most recent sweep reports of a plant, newest first"""
+    return list(_reports[plant or current_plant()])
+
+
+def start_background_sweeps(app, interval_seconds):
+    """Sweep every plant on a daemon thread every interval; an interval of 0 disables sweeping"""
+    global _sweep_thread
+    if _sweep_thread is not None or interval_seconds <= 0:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            for plant in app.config['PLANTS']:
+                with app.app_context(), use_plant(plant):
+                    try:
+                        report = sweep_stale_sessions(app.config['STALE_SESSION_MINUTES'],
+                                                      app.config['STALE_SESSION_ACTION'])
+                        if report['swept']:
+                            app.logger.info('Swept %d stale sessions in plant %s', report['swept'], plant)
+                    except Exception as e:
+                        app.logger.exception('Stale session sweep failed for plant %s: %s', plant, e)
+                    finally:
+                        db.session.remove()
+
+    _sweep_thread = threading.Thread(target=run, name='stale-session-sweep', daemon=True)
+    _sweep_thread.start()
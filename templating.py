@@ -0,0 +1,72 @@
+"""Template bytecode caching and fragment caching for the panel pages.
+
+Compiled templates are kept in instance/jinja_cache by Jinja's filesystem
+bytecode cache, so a fresh worker process loads them instead of parsing and
+compiling every template again. Entries are checked against the template
+source, so an edited template is recompiled.
+
+Parts of a page that only change with the data they list (user tables,
+stage lists) are wrapped in a cache block:
+
+    {% cache 'admin-users', data_version('users', 'user_stages', 'production_stages') %}
+        ...
+    {% endcache %}
+
+The block body is rendered once per key and then served from memory.
+data_version() stamps a key with the current plant and the write generations
+of the given tables (see generations.py). Generations are stored in the
+database, so a fragment is re-rendered after the next write to any of them
+by any app process. Views pass lazy queries instead of lists, so a cached
+fragment costs one data_versions read per database instead of its queries.
+"""
+import os
+import threading
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from generations import write_generation
+from plants import current_plant
+
+BYTECODE_CACHE_DIRNAME = 'jinja_cache'
+MAX_FRAGMENTS = 512
+
+_fragments = {}  # (fragment name, key...) -> rendered markup
+_fragments_lock = threading.Lock()
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache name, key... %}body{% endcache %}: render body once per name and key"""
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached_fragment', [nodes.List(key)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _cached_fragment(self, key, caller):
+        key = tuple(key)
+        fragment = _fragments.get(key)
+        if fragment is None:
+            fragment = caller()
+            with _fragments_lock:
+                if len(_fragments) >= MAX_FRAGMENTS:
+                    _fragments.clear()
+                _fragments[key] = fragment
+        return fragment
+
+
+def data_version(*table_names):
+    """Cache key stamp for fragments built from the given tables"""
+    return (current_plant(), *write_generation(*table_names))
+
+
+def init_templating(app):
+    """Enable the bytecode cache and the {% cache %} tag; must run before the first render"""
+    cache_dir = os.path.join(app.instance_path, BYTECODE_CACHE_DIRNAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['data_version'] = data_version
@@ -0,0 +1,99 @@
+"""Shared fixtures: the app running against a seeded, throwaway instance directory.
+
+The environment is set before app is imported, since importing it creates
+and migrates the databases under INSTANCE_PATH.
+"""
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='production-tests-')
+os.environ['INSTANCE_PATH'] = INSTANCE_PATH
+os.environ['PLANTS'] = 'main'
+os.environ['SECRET_KEY'] = 'test'
+os.environ['ESTIMATOR_RETRAIN_INTERVAL'] = '86400'
+os.environ['SCAN_DEBOUNCE_SECONDS'] = '0'
+os.environ['STALE_SWEEP_INTERVAL'] = '0'
+
+from sqlalchemy import insert  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from models import (db, Order, ProductionStage, TimeLog, User, VALID_SYSTEMS,  # noqa: E402
+                    VALID_HANDLE_STYLES)
+
+# Seeded scale; query bounds in the tests are expressed against these
+SCALE = {
+    'orders': 2000,
+    'workers': 25,
+    'completed_logs': 20000,
+    'active_logs': 100,
+}
+
+ADMIN = {'username': 'admin', 'password': 'admin123'}
+
+
+def seed(scale, seed_value=42):
+    """Bulk insert orders, workers and time logs with a realistic spread of project data"""
+    rng = random.Random(seed_value)
+    stage_ids = [stage_id for stage_id, in db.session.query(ProductionStage.id)]
+
+    db.session.execute(insert(Order), [{
+        'order_number': f'ZL-{number:06d}',
+        'description': f'Okno {rng.choice(VALID_SYSTEMS)} {number}',
+        'created_at': datetime(2025, 1, 1) + timedelta(hours=number),
+        'system': rng.choice(VALID_SYSTEMS),
+        'handle_style': rng.choice(VALID_HANDLE_STYLES),
+        'welding_frames_qty': rng.randint(1, 15),
+        'glazing_frames_qty': rng.randint(1, 15),
+        'szpros_complication': rng.randint(1, 5),
+    } for number in range(1, scale['orders'] + 1)])
+
+    template = User(username='template', full_name='', role='worker')
+    template.set_password('worker123')
+    db.session.execute(insert(User), [{
+        'username': f'worker{number}',
+        'password_hash': template.password_hash,
+        'full_name': f'Pracownik {number}',
+        'role': 'worker',
+        'is_active': True,
+    } for number in range(1, scale['workers'] + 1)])
+    db.session.commit()
+
+    order_ids = [order_id for order_id, in db.session.query(Order.id)]
+    workers = db.session.query(User.id, User.full_name).filter_by(role='worker').all()
+    logs = []
+    for position in range(scale['completed_logs'] + scale['active_logs']):
+        worker = rng.choice(workers)
+        start = datetime(2025, 1, 1) + timedelta(minutes=7 * position)
+        active = position >= scale['completed_logs']
+        logs.append({
+            'order_id': rng.choice(order_ids),
+            'stage_id': rng.choice(stage_ids),
+            'worker_id': worker.id,
+            'worker_name': worker.full_name,
+            'start_time': start,
+            'end_time': None if active else start + timedelta(minutes=rng.randint(5, 240)),
+            'status': 'in_progress' if active else 'completed',
+        })
+    db.session.execute(insert(TimeLog), logs)
+    db.session.commit()
+
+
+@pytest.fixture(scope='session')
+def app():
+    with flask_app.app_context():
+        seed(SCALE)
+        db.session.remove()
+    yield flask_app
+    shutil.rmtree(INSTANCE_PATH, ignore_errors=True)
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    response = client.post('/login', data=ADMIN)
+    assert response.status_code == 302
+    return client
@@ -0,0 +1,72 @@
+"""Cached facets and page fragments must see writes made by other app processes."""
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import INSTANCE_PATH
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A second process writing through the ORM, like another gunicorn worker
+WRITER = textwrap.dedent('''
+    import sys
+    from datetime import datetime, timedelta
+    from flask import Flask
+    from generations import init_write_generations
+    from models import db, Order, TimeLog, User
+    from plants import PlantSession
+
+    app = Flask('writer', instance_path=sys.argv[1])
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///production.db', PLANTS=['main'])
+    db.init_app(app)
+    init_write_generations(PlantSession)
+    with app.app_context():
+        exec(sys.argv[2])
+        db.session.commit()
+''')
+
+
+def write_in_other_process(code):
+    subprocess.run([sys.executable, '-c', WRITER, INSTANCE_PATH, textwrap.dedent(code)],
+                   cwd=REPO, check=True, timeout=60)
+
+
+def test_facets_see_other_process_writes(admin_client):
+    def orders_per_system():
+        facets = admin_client.get('/api/reports/facets').get_json()
+        return {row['value']: row['orders'] for row in facets['system']}
+
+    before = orders_per_system()
+    write_in_other_process('''
+        order = Order(order_number='ZL-CROSS-1', system='W10')
+        db.session.add(order)
+        db.session.flush()
+        start = datetime(2024, 6, 1, 8)
+        db.session.add(TimeLog(order_id=order.id, stage_id=1, worker_name='Inny proces', start_time=start,
+                               end_time=start + timedelta(hours=1), status='completed'))
+    ''')
+    after = orders_per_system()
+    assert after['W10'] == before.get('W10', 0) + 1
+
+
+def test_admin_fragments_see_other_process_writes(admin_client):
+    assert 'Zenon Kowalski' not in admin_client.get('/admin').get_data(as_text=True)
+    write_in_other_process('''
+        user = User(username='zenon', full_name='Zenon Kowalski', role='worker')
+        user.set_password('zenon123')
+        db.session.add(user)
+    ''')
+    assert 'Zenon Kowalski' in admin_client.get('/admin').get_data(as_text=True)
+
+
+def test_admin_fragments_see_stage_assignments(admin_client):
+    worker_id = admin_client.post('/api/users', json={
+        'username': 'halina', 'password': 'halina123', 'full_name': 'Halina Nowak', 'role': 'worker'
+    }).get_json()['id']
+    admin_client.get('/admin')
+    response = admin_client.put(f'/api/users/{worker_id}', json={'stage_ids': [2]})
+    stage_name = response.get_json()['assigned_stages'][0]['name']
+    page = admin_client.get('/admin').get_data(as_text=True)
+    row = page[page.index('Halina Nowak'):].split('</tr>')[0]
+    assert stage_name in row
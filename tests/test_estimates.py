@@ -0,0 +1,34 @@
+"""Stage time estimate requests are validated before scoring."""
+import pytest
+
+import estimator
+
+
+@pytest.fixture
+def trained(app):
+    with app.app_context():
+        estimator.retrain(app, app.config['PLANTS'][0])
+
+
+@pytest.mark.parametrize('payload, error', [
+    ({'orders': ['x']}, 'orders[0] must be an object'),
+    ({'orders': [{'system': 'SLIM'}, {'welding_frames_qty': 'abc'}]},
+     'orders[1]: Welding frames quantity must be between 1 and 15'),
+    ({'orders': {'system': 'SLIM'}}, 'orders must be a list of objects'),
+    ({'order_ids': ['1']}, 'order_ids must be a list of integers'),
+    ({'order_ids': [1.5]}, 'order_ids must be a list of integers'),
+    ([1, 2], 'Request body must be a JSON object'),
+    ('SLIM', 'Request body must be a JSON object'),
+])
+def test_invalid_estimate_request(app, trained, payload, error):
+    response = app.test_client().post('/api/estimates/stage-times', json=payload)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+
+def test_estimate_project_data(app, trained):
+    response = app.test_client().post('/api/estimates/stage-times', json={
+        'orders': [{'system': 'SLIM', 'handle_style': 'kaseta', 'welding_frames_qty': 4}]
+    })
+    assert response.status_code == 200
+    assert len(response.get_json()['estimates']) == 1
@@ -0,0 +1,31 @@
+"""Uploads that cannot be read as an order sheet are rejected with 400."""
+import io
+
+import pytest
+
+from importer import BATCH_SIZE
+from models import Order
+
+
+@pytest.mark.parametrize('filename, content, error', [
+    ('zlecenia.csv', 'order_number;opis\nZL-1;Okno łukowe\n'.encode('cp1250'), 'CSV file must be UTF-8 encoded'),
+    ('zlecenia.xlsx', b'order_number,opis\nZL-1,Okno\n', 'File is not a valid .xlsx workbook'),
+    ('zlecenia.xlsx', b'PK\x03\x04' + b'\x00' * 64, 'File is not a valid .xlsx workbook'),
+])
+def test_unreadable_upload(admin_client, filename, content, error):
+    response = admin_client.post('/api/orders/import', data={'file': (io.BytesIO(content), filename)},
+                                 content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+
+def test_encoding_error_after_first_batch_imports_nothing(app, admin_client):
+    prefix = 'ZL-ENC-'
+    lines = ['order_number;opis'] + [f'{prefix}{number};Okno' for number in range(BATCH_SIZE * 10)]
+    content = '\n'.join(lines).encode('utf-8') + f'\n{prefix}X;Okno łukowe\n'.encode('cp1250')
+    response = admin_client.post('/api/orders/import', data={'file': (io.BytesIO(content), 'zlecenia.csv')},
+                                 content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'CSV file must be UTF-8 encoded'}
+    with app.app_context():
+        assert not Order.query.filter(Order.order_number.startswith(prefix)).count()
@@ -0,0 +1,45 @@
+"""Background export jobs run in spawned pool processes."""
+import time
+
+import pytest
+
+
+def wait_for(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f'job {job_id} did not finish: {job}')
+
+
+def test_export_job(admin_client):
+    response = admin_client.post('/api/jobs', json={
+        'kind': 'export', 'params': {'report': 'stage-efficiency', 'filters': {'system': 'SLIM'}}
+    })
+    assert response.status_code == 202
+    job = wait_for(admin_client, response.get_json()['id'])
+    assert job['status'] == 'completed', job['message']
+    assert job['params']['filters'] == {'system': 'SLIM'}
+    artifact = admin_client.get(f'/api/jobs/{job["id"]}/artifact')
+    assert artifact.status_code == 200
+    assert artifact.data[:2] == b'PK'
+
+
+@pytest.mark.parametrize('params, error', [
+    (['stage-efficiency'], 'params must be an object'),
+    ({'report': 'stage-efficiency', 'filters': 'system=SLIM'}, 'params.filters must be an object'),
+    ({'report': 'stage-efficiency', 'filters': [['system', 'SLIM']]}, 'params.filters must be an object'),
+])
+def test_invalid_job_params(admin_client, params, error):
+    response = admin_client.post('/api/jobs', json={'kind': 'export', 'params': params})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+
+@pytest.mark.parametrize('payload', [['export'], 'export'])
+def test_job_request_must_be_an_object(admin_client, payload):
+    response = admin_client.post('/api/jobs', json=payload)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Request body must be a JSON object'}
@@ -0,0 +1,102 @@
+"""Scan journal encoding, torn-record recovery and replay."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import journal
+from journal import (EVENT_AUTO_CLOSE, EVENT_FLAG, EVENT_START, EVENT_STOP, ScanJournal, iter_events,
+                     replay_sessions, segment_paths)
+
+START = datetime(2025, 2, 3, 6, 30, 15, 123456)
+
+
+def log(log_id, worker_id=7, minutes=0):
+    return SimpleNamespace(id=log_id, order_id=100 + log_id, stage_id=2, worker_id=worker_id,
+                           start_time=START, end_time=START + timedelta(minutes=minutes))
+
+
+def write_journal(directory, events):
+    scan_journal = ScanJournal()
+    scan_journal.open(directory)
+    for event, time_log in events:
+        scan_journal.append(event, time_log)
+    scan_journal.close()
+    return segment_paths(directory)
+
+
+def test_round_trip(tmp_path):
+    write_journal(str(tmp_path), [(EVENT_START, log(1)), (EVENT_STOP, log(1, minutes=90)),
+                                  (EVENT_START, log(2, worker_id=None))])
+    assert list(iter_events(str(tmp_path))) == [
+        (EVENT_START, 1, 101, 2, 7, START),
+        (EVENT_STOP, 1, 101, 2, 7, START + timedelta(minutes=90)),
+        (EVENT_START, 2, 102, 2, None, START),
+    ]
+
+
+def test_torn_record_ends_replay(tmp_path):
+    [path] = write_journal(str(tmp_path), [(EVENT_START, log(1)), (EVENT_STOP, log(1, minutes=5))])
+    with open(path, 'ab') as f:
+        f.write(journal.encode_event(EVENT_START, 2, 102, 2, 7, START)[:-5])  # crash mid-write
+    assert [event[:2] for event in iter_events(str(tmp_path))] == [(EVENT_START, 1), (EVENT_STOP, 1)]
+
+
+def test_corrupt_record_ends_replay(tmp_path):
+    [path] = write_journal(str(tmp_path), [(EVENT_START, log(1)), (EVENT_START, log(2)), (EVENT_START, log(3))])
+    with open(path, 'r+b') as f:
+        f.seek(len(journal.SEGMENT_MAGIC) + journal._ENTRY.size + 3)
+        f.write(b'\xff')
+    assert [event[:2] for event in iter_events(str(tmp_path))] == [(EVENT_START, 1)]
+
+
+def test_replay_folds_sweep_events(tmp_path):
+    write_journal(str(tmp_path), [
+        (EVENT_START, log(1)), (EVENT_STOP, log(1, minutes=30)),
+        (EVENT_START, log(2)), (EVENT_AUTO_CLOSE, log(2, minutes=720)),
+        (EVENT_START, log(3)), (EVENT_FLAG, log(3, minutes=800)),
+        (EVENT_START, log(4)),
+    ])
+    sessions = replay_sessions(str(tmp_path))
+    assert {log_id: (row['status'], row['end_time']) for log_id, row in sessions.items()} == {
+        1: ('completed', START + timedelta(minutes=30)),
+        2: ('auto_closed', START + timedelta(minutes=720)),
+        3: ('stale', None),
+        4: ('in_progress', None),
+    }
+
+
+@pytest.mark.parametrize('journal_dir', [None, 'elsewhere'])
+def test_tools_resolve_paths_like_the_app(tmp_path, monkeypatch, capsys, journal_dir):
+    instance = tmp_path / 'instance'
+    monkeypatch.setenv('INSTANCE_PATH', str(instance))
+    if journal_dir:
+        monkeypatch.setenv('SCAN_JOURNAL_DIR', str(tmp_path / journal_dir))
+    else:
+        monkeypatch.delenv('SCAN_JOURNAL_DIR', raising=False)
+    write_journal(str(tmp_path / journal_dir) if journal_dir else str(instance / 'scan_journal'),
+                  [(EVENT_START, log(1)), (EVENT_START, log(2))])
+
+    assert journal._replay_app('main').instance_path == str(instance)
+    journal.main(['stats'])
+    assert '1 segments, 2 sessions, 2 in progress' in capsys.readouterr().out
+
+
+def test_replay_applies_a_stop_written_before_its_start(tmp_path, monkeypatch):
+    # Two processes share the journal; each segment holds two records
+    monkeypatch.setattr(journal, 'SEGMENT_BYTES', len(journal.SEGMENT_MAGIC) + 2 * journal._ENTRY.size)
+    first, second = ScanJournal(), ScanJournal()
+    first.open(str(tmp_path))
+    second.open(str(tmp_path))
+    for time_log in (log(2), log(3), log(1)):
+        first.append(EVENT_START, time_log)
+    first.flush()  # rotates: log 1 starts in the second segment
+    second.append(EVENT_STOP, log(1, minutes=45))
+    second.flush()  # still appends to the first segment
+    first.close()
+    second.close()
+
+    assert len(segment_paths(str(tmp_path))) == 2
+    sessions = replay_sessions(str(tmp_path))
+    assert (sessions[1]['status'], sessions[1]['end_time']) == ('completed', START + timedelta(minutes=45))
+    assert sessions[2]['status'] == sessions[3]['status'] == 'in_progress'
@@ -0,0 +1,40 @@
+"""?plant= switches the plant for later requests only from a page view."""
+import pytest
+from flask import g, session
+
+from app import select_plant
+
+
+@pytest.fixture
+def plants(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PLANTS', ['main', 'north'])
+    return app
+
+
+@pytest.mark.parametrize('method, path, kept', [
+    ('GET', '/manager', True),
+    ('GET', '/api/reports/order-times', False),
+    ('POST', '/api/scan', False),
+])
+def test_plant_argument(plants, method, path, kept):
+    with plants.test_request_context(f'{path}?plant=north', method=method):
+        session['role'] = 'manager'
+        select_plant()
+        assert g.plant == 'north'
+        assert session.get('plant') == ('north' if kept else None)
+
+
+def test_plant_argument_needs_a_manager(plants):
+    with plants.test_request_context('/manager?plant=north'):
+        session['role'] = 'worker'
+        select_plant()
+        assert g.plant == 'main'
+        assert 'plant' not in session
+
+
+def test_api_call_keeps_the_chosen_plant(plants):
+    with plants.test_request_context('/api/reports/order-times?plant=main'):
+        session.update(role='admin', plant='north')
+        select_plant()
+        assert g.plant == 'main'
+        assert session['plant'] == 'north'
@@ -0,0 +1,46 @@
+"""Profiles of endpoints with converters in their rule are saved under portable file names,
+and collapsed stacks are derived from a real call graph in bounded time."""
+import cProfile
+import pstats
+import re
+import time
+
+from profiling import MAX_COLLAPSED_NODES, collapsed_from_stats, wait_for_saves
+
+RULE = '/api/orders/<int:order_id>/timeline'
+
+
+def test_profile_id_is_a_portable_file_name(admin_client):
+    response = admin_client.post('/api/admin/profiling', json={'rule': RULE, 'mode': 'cprofile'})
+    assert response.status_code == 201
+    try:
+        assert admin_client.get('/api/orders/1/timeline').status_code == 200
+    finally:
+        admin_client.delete('/api/admin/profiling', query_string={'rule': RULE})
+    wait_for_saves(timeout=30)
+
+    [profile] = [profile for profile in admin_client.get('/api/admin/profiling').get_json()['profiles']
+                 if profile['rule'] == RULE]
+    assert re.fullmatch(r'[A-Za-z0-9_.-]+', profile['id']), profile['id']
+    for kind in ('prof', 'collapsed'):
+        assert admin_client.get(f'/api/admin/profiles/{profile["id"]}/{kind}').status_code == 200
+
+
+def test_collapsed_stacks_of_a_report_request_are_bounded(admin_client):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        assert admin_client.get('/api/reports/order-times').status_code == 200
+    finally:
+        profiler.disable()
+    stats = pstats.Stats(profiler)
+
+    started = time.perf_counter()
+    collapsed = collapsed_from_stats(stats)
+    assert time.perf_counter() - started < 5
+    assert 0 < len(collapsed) <= MAX_COLLAPSED_NODES
+
+    # Splitting time across callers keeps the total profiled time, less truncation to microseconds
+    root_time = sum(row[3] for row in stats.stats.values() if not row[4])
+    total = sum(collapsed.values()) / 1e6
+    assert root_time - len(collapsed) / 1e6 - 1e-3 <= total <= root_time + 1e-3
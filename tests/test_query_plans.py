@@ -0,0 +1,219 @@
+"""Query plan regression tests for the report, scan, active-session and export queries.
+
+Each test drives a real endpoint against the seeded database, captures the
+SQL it sends that touches time_logs or orders, and checks every statement:
+
+* its EXPLAIN QUERY PLAN must not scan time_logs or orders without an index;
+* re-running it must stay within a work budget for the seeded scale.
+
+SQLite does not report rows examined to Python, so work is measured in
+virtual machine steps through a progress handler. A step count grows with the
+rows a statement visits, so budgets are given as steps per seeded row: point
+lookups get a fixed budget far below one pass over time_logs, and reports
+get a budget proportional to the completed sessions they aggregate.
+"""
+import re
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, update
+
+import reports
+from conftest import SCALE
+from models import db, Order, ProductionStage, TimeLog, User
+from wip import wip_index
+
+TABLES = re.compile(r'\b(time_logs|orders)\b')
+UNINDEXED_SCAN = re.compile(r'^SCAN (time_logs|orders)\b(?! USING (COVERING )?INDEX)')
+STEP_GRANULARITY = 100
+
+# Work budgets in VM steps
+POINT_LOOKUP = 5000
+PER_COMPLETED_LOG = 80
+ALL_COMPLETED_LOGS = PER_COMPLETED_LOG * SCALE['completed_logs']
+ALL_LOGS = PER_COMPLETED_LOG * (SCALE['completed_logs'] + SCALE['active_logs'])
+
+
+@pytest.fixture
+def captured_queries(app):
+    """Statements touching time_logs or orders sent by this thread while the test runs"""
+    statements = []
+    thread = threading.get_ident()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if (threading.get_ident() == thread and not executemany
+                and statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE'))
+                and TABLES.search(statement)):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    yield statements
+    for engine in engines:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def query_plan(connection, statement, parameters):
+    return [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+def vm_steps(connection, statement, parameters):
+    """Virtual machine steps taken to run a statement to completion; writes are rolled back"""
+    steps = 0
+
+    def count():
+        nonlocal steps
+        steps += STEP_GRANULARITY
+        return 0
+
+    connection.set_progress_handler(count, STEP_GRANULARITY)
+    try:
+        connection.execute(statement, parameters).fetchall()
+    finally:
+        connection.set_progress_handler(None, 0)
+        connection.rollback()
+    return steps
+
+
+def check_queries(app, statements, budget):
+    assert statements, 'no time_logs or orders queries were captured'
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        try:
+            for statement, parameters in statements:
+                sql = ' '.join(statement.split())
+                plan = query_plan(connection, statement, parameters)
+                scans = [step for step in plan if UNINDEXED_SCAN.match(step)]
+                assert not scans, f'{sql}\nscans without an index: {scans}\nplan: {plan}'
+                steps = vm_steps(connection, statement, parameters)
+                assert steps <= budget, f'{sql}\ntook {steps} steps, budget {budget}\nplan: {plan}'
+        finally:
+            connection.close()
+
+
+@pytest.fixture(scope='module')
+def sample(app):
+    """Ids and values of a seeded order and worker to plug into request URLs"""
+    with app.app_context():
+        order = Order.query.order_by(Order.id).first()
+        workers = User.query.filter_by(role='worker').order_by(User.id).all()
+        return {'order_id': order.id, 'order_number': order.order_number, 'system': order.system,
+                'worker_id': workers[0].id, 'order_ids': '1,2,3,4,5'}
+
+
+def test_unindexed_scan_is_detected(app):
+    """The plan check itself: a filter on an unindexed column must be reported"""
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        try:
+            plan = query_plan(connection, 'SELECT id FROM time_logs WHERE worker_name = ?', ('x',))
+        finally:
+            connection.close()
+    assert any(UNINDEXED_SCAN.match(step) for step in plan)
+
+
+# ========== Reports ==========
+
+REPORTS = ['order-times', 'worker-productivity', 'stage-efficiency', 'dashboard']
+
+# Query string -> budget; order_id narrows a report to one order's sessions
+REPORT_FILTERS = {
+    '': ALL_COMPLETED_LOGS,
+    'system={system}': ALL_COMPLETED_LOGS,
+    'handle_style=kaseta&welding_frames_min=8': ALL_COMPLETED_LOGS,
+    'szpros_complication=3&glazing_frames_min=4': ALL_COMPLETED_LOGS,
+    'order_id={order_id}': POINT_LOOKUP,
+}
+
+
+@pytest.mark.parametrize('query', list(REPORT_FILTERS))
+@pytest.mark.parametrize('report', REPORTS)
+def test_report_queries(app, admin_client, captured_queries, sample, report, query):
+    response = admin_client.get(f'/api/reports/{report}?{query.format(**sample)}')
+    assert response.status_code == 200
+    check_queries(app, captured_queries, REPORT_FILTERS[query])
+
+
+@pytest.mark.parametrize('query', list(REPORT_FILTERS))
+def test_facet_queries(app, admin_client, captured_queries, sample, query):
+    reports._facet_cache.clear()  # other tests may have cached these facets
+    response = admin_client.get(f'/api/reports/facets?{query.format(**sample)}')
+    assert response.status_code == 200
+    check_queries(app, captured_queries, ALL_COMPLETED_LOGS)
+
+
+@pytest.mark.parametrize('query', ['', 'system={system}', 'order_id={order_id}'])
+@pytest.mark.parametrize('report', ['order-times', 'worker-productivity', 'stage-efficiency'])
+def test_export_queries(app, admin_client, captured_queries, sample, report, query):
+    response = admin_client.get(f'/api/reports/{report}/export?{query.format(**sample)}')
+    assert response.status_code == 200
+    check_queries(app, captured_queries, REPORT_FILTERS[query])
+
+
+# ========== Scans and active sessions ==========
+
+def test_scan_queries(app, captured_queries, sample):
+    client = app.test_client()
+    scan = {'qr_data': f'ORDER:{sample["order_number"]}', 'stage_id': 1, 'worker_id': sample['worker_id']}
+    response = client.post('/api/scan', json={**scan, 'action': 'start'})
+    assert response.status_code == 201
+    response = client.post('/api/scan', json={**scan, 'action': 'stop'})
+    assert response.status_code == 200
+    check_queries(app, captured_queries, POINT_LOOKUP)
+
+
+def test_active_session_queries(app, captured_queries, sample):
+    response = app.test_client().get(f'/api/worker/active-sessions?worker_id={sample["worker_id"]}')
+    assert response.status_code == 200
+    assert response.get_json()
+    check_queries(app, captured_queries, POINT_LOOKUP)
+
+
+# ========== Timelines and search ==========
+
+@pytest.mark.parametrize('url, budget', [
+    ('/api/orders/{order_id}/timeline', POINT_LOOKUP),
+    ('/api/orders/timelines?order_ids={order_ids}', POINT_LOOKUP),
+    ('/api/orders/timelines?system={system}&intervals=0', ALL_LOGS),
+])
+def test_timeline_queries(app, admin_client, captured_queries, sample, url, budget):
+    response = admin_client.get(url.format(**sample))
+    assert response.status_code == 200
+    check_queries(app, captured_queries, budget)
+
+
+def test_search_queries(app, admin_client, captured_queries, sample):
+    response = admin_client.get(f'/api/orders/search?q={sample["order_number"]}')
+    assert response.status_code == 200
+    assert response.get_json()['total'] >= 1
+    check_queries(app, captured_queries, POINT_LOOKUP)
+
+
+# ========== Stale session sweep ==========
+
+@pytest.fixture
+def stale_sessions(app):
+    """Number of in-progress sessions the sweep will close; they are reopened afterwards"""
+    with app.app_context():
+        now = datetime.utcnow()
+        limits = {stage_id: minutes or app.config['STALE_SESSION_MINUTES']
+                  for stage_id, minutes in db.session.query(ProductionStage.id, ProductionStage.max_session_minutes)}
+        stale_ids = [log_id for log_id, stage_id, start_time in db.session.query(
+            TimeLog.id, TimeLog.stage_id, TimeLog.start_time).filter(TimeLog.status == 'in_progress')
+            if start_time < now - timedelta(minutes=limits[stage_id])]
+        yield len(stale_ids)
+        db.session.execute(update(TimeLog).where(TimeLog.id.in_(stale_ids))
+                           .values(status='in_progress', end_time=None))
+        db.session.commit()
+        wip_index.rebuild()
+
+
+def test_stale_session_sweep_queries(app, admin_client, captured_queries, stale_sessions):
+    assert stale_sessions
+    response = admin_client.post('/api/admin/stale-sessions', json={'action': 'close'})
+    assert response.status_code == 200
+    assert response.get_json()['swept'] == stale_sessions
+    check_queries(app, captured_queries, PER_COMPLETED_LOG * stale_sessions)
@@ -0,0 +1,39 @@
+"""Report totals for time logs whose worker account is gone."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Order, TimeLog
+
+ORPHAN_NAME = 'Były Pracownik'
+
+
+@pytest.fixture(scope='module')
+def orphan_log(app):
+    """A completed hour of work logged by a worker without a user account"""
+    with app.app_context():
+        order = Order.query.order_by(Order.id).first()
+        start = datetime(2024, 6, 1, 8)
+        log = TimeLog(order_id=order.id, stage_id=1, worker_id=None, worker_name=ORPHAN_NAME,
+                      start_time=start, end_time=start + timedelta(hours=1), status='completed')
+        db.session.add(log)
+        db.session.commit()
+        yield {'order_id': order.id}
+        db.session.delete(db.session.get(TimeLog, log.id))
+        db.session.commit()
+
+
+def test_productivity_keeps_logs_without_user(admin_client, orphan_log):
+    rows = admin_client.get('/api/reports/worker-productivity').get_json()
+    orphan = [row for row in rows if row['worker_name'] == ORPHAN_NAME]
+    assert orphan == [{'worker_id': None, 'worker_name': ORPHAN_NAME, 'work_sessions': 1,
+                       'total_minutes': 60.0, 'total_hours': 1.0}]
+
+
+def test_dashboard_matches_standalone_reports(admin_client, orphan_log):
+    query = f'order_id={orphan_log["order_id"]}'
+    dashboard = admin_client.get(f'/api/reports/dashboard?{query}').get_json()
+    for report in ['order-times', 'worker-productivity', 'stage-efficiency']:
+        standalone = admin_client.get(f'/api/reports/{report}?{query}').get_json()
+        key = report.replace('-', '_')
+        assert sorted(dashboard[key], key=repr) == sorted(standalone, key=repr), report
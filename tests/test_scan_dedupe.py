@@ -0,0 +1,113 @@
+"""Scan debouncing and idempotency keys: repeats are answered from memory, other scans go through."""
+from datetime import datetime
+
+import pytest
+
+import scan_dedupe
+from models import db, Order, TimeLog, User
+from scan_dedupe import ScanDeduplicator, scan_deduplicator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scan_dedupe.time, 'monotonic', clock)
+    return clock
+
+
+def test_repeat_within_debounce_window(clock):
+    dedupe = ScanDeduplicator(debounce_seconds=2, idempotency_seconds=600)
+    dedupe.remember(7, 'ORDER:1', '1', 'start', 201, {'log_id': 5})
+    clock.now += 1.5
+    assert dedupe.lookup(7, 'ORDER:1', '1', 'start') == (201, {'log_id': 5})
+    assert dedupe.lookup(7, 'ORDER:1', '1', 'stop') is None
+    assert dedupe.lookup(8, 'ORDER:1', '1', 'start') is None
+    clock.now += 1
+    assert dedupe.lookup(7, 'ORDER:1', '1', 'start') is None
+
+
+def test_idempotency_key_outlives_debounce_window(clock):
+    dedupe = ScanDeduplicator(debounce_seconds=2, idempotency_seconds=600)
+    dedupe.remember(7, 'ORDER:1', '1', 'stop', 200, {'log_id': 5}, idempotency_key='k1')
+    clock.now += 300
+    assert dedupe.lookup(7, 'ORDER:1', '1', 'stop') is None
+    assert dedupe.lookup(7, 'ORDER:1', '1', 'stop', idempotency_key='k1') == (200, {'log_id': 5})
+    assert dedupe.lookup(8, 'ORDER:1', '1', 'stop', idempotency_key='k1') is None
+    clock.now += 301
+    assert dedupe.lookup(7, 'ORDER:1', '1', 'stop', idempotency_key='k1') is None
+
+
+def test_expired_entries_are_purged(clock):
+    dedupe = ScanDeduplicator(debounce_seconds=2, idempotency_seconds=5)
+    dedupe.remember(7, 'ORDER:1', '1', 'start', 201, {}, idempotency_key='k1')
+    clock.now += 10
+    dedupe.remember(7, 'ORDER:2', '1', 'start', 201, {})
+    assert list(dedupe._recent) == [(7, 'ORDER:2', '1', 'start')]
+    assert not dedupe._idempotent
+
+
+# ========== /api/scan ==========
+
+@pytest.fixture
+def scan(app, monkeypatch):
+    """A scan of a fresh order by a seeded worker, with a long debounce window"""
+    monkeypatch.setattr(scan_deduplicator, 'debounce_seconds', 60)
+    with app.app_context():
+        worker = User.query.filter_by(role='worker').order_by(User.id).first()
+        order = Order(order_number=f'ZL-SCAN-{datetime.utcnow().timestamp()}', system='SLIM',
+                      handle_style='1', welding_frames_qty=2, glazing_frames_qty=2, szpros_complication=1)
+        db.session.add(order)
+        db.session.commit()
+        yield {'qr_data': f'ORDER:{order.order_number}', 'stage_id': 1,
+               'worker_id': worker.id, 'worker_name': worker.full_name}
+        TimeLog.query.filter_by(order_id=order.id).delete()
+        db.session.delete(db.session.get(Order, order.id))
+        db.session.commit()
+
+
+def post_scan(client, scan, action, by='worker_id', headers=None):
+    body = {'qr_data': scan['qr_data'], 'stage_id': scan['stage_id'], by: scan[by], 'action': action}
+    return client.post('/api/scan', json=body, headers=headers)
+
+
+def test_double_read_is_answered_from_memory(app, scan):
+    client = app.test_client()
+    first = post_scan(client, scan, 'start')
+    assert first.status_code == 201
+    repeat = post_scan(client, scan, 'start', by='worker_name')  # same worker, sent by name
+    assert repeat.status_code == 201
+    assert repeat.get_json() == {**first.get_json(), 'duplicate': True}
+    assert post_scan(client, scan, 'stop').status_code == 200
+
+
+def test_stop_right_after_start_is_processed(app, scan):
+    client = app.test_client()
+    start = post_scan(client, scan, 'start')
+    stop = post_scan(client, scan, 'stop')
+    assert stop.status_code == 200
+    assert stop.get_json()['action'] == 'stop'
+    assert 'duplicate' not in stop.get_json()
+    assert stop.get_json()['log_id'] == start.get_json()['log_id']
+    with app.app_context():
+        assert db.session.get(TimeLog, stop.get_json()['log_id']).status == 'completed'
+
+
+def test_retry_with_idempotency_key_is_answered_from_memory(app, scan, monkeypatch):
+    monkeypatch.setattr(scan_deduplicator, 'debounce_seconds', 0)
+    client = app.test_client()
+    assert post_scan(client, scan, 'start').status_code == 201
+    stop = post_scan(client, scan, 'stop', headers={'Idempotency-Key': 'retry-1'})
+    assert stop.status_code == 200
+    retry = post_scan(client, scan, 'stop', headers={'Idempotency-Key': 'retry-1'})
+    assert retry.status_code == 200
+    assert retry.get_json() == {**stop.get_json(), 'duplicate': True}
+    # Without the key the repeated stop reaches the database and finds no active session
+    assert post_scan(client, scan, 'stop').status_code == 404
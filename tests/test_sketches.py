@@ -0,0 +1,55 @@
+"""Quantile sketches: relative-error bounds, merging and serialization."""
+import math
+import random
+
+import pytest
+
+from sketches import QUANTILES, RELATIVE_ACCURACY, QuantileSketch
+
+
+def durations(count, seed):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(3.5, 1.2) for _ in range(count)]
+
+
+def exact_quantile(values, q):
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+def sketch_of(values):
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize('count', [1, 7, 1000, 20000])
+def test_quantiles_within_relative_accuracy(count):
+    values = durations(count, seed=count)
+    sketch = sketch_of(values)
+    assert sketch.count == count
+    for q in [0.0, 0.25, *QUANTILES.values(), 1.0]:
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= RELATIVE_ACCURACY * exact * (1 + 1e-9), q
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_merge_equals_sketch_of_union():
+    first, second = durations(3000, seed=1), durations(500, seed=2)
+    merged = sketch_of(first)
+    merged.merge(sketch_of(second))
+    union = sketch_of(first + second)
+    assert merged.buckets == union.buckets
+    for q in QUANTILES.values():
+        assert merged.quantile(q) == union.quantile(q)
+
+
+def test_serialization_round_trip():
+    sketch = sketch_of(durations(2000, seed=3) + [0.0001, 0.5, 10000])
+    restored = QuantileSketch.from_bytes(sketch.to_bytes())
+    assert restored.buckets == sketch.buckets
+    assert QuantileSketch.from_bytes(None).buckets == {}
+    assert QuantileSketch.from_bytes(b'').count == 0
@@ -0,0 +1,55 @@
+"""Sessions closed or flagged by the stale sweep stay out of estimates and timelines."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import estimator
+from models import db, Order, TimeLog
+
+START = datetime(2024, 3, 4, 7)
+
+
+@pytest.fixture
+def order(app):
+    """A fresh order; its logs are added by the test"""
+    with app.app_context():
+        order = Order(order_number=f'ZL-STALE-{datetime.utcnow().timestamp()}', system='SLIM',
+                      handle_style='1', welding_frames_qty=2, glazing_frames_qty=2, szpros_complication=1)
+        db.session.add(order)
+        db.session.commit()
+        yield order.id
+        TimeLog.query.filter_by(order_id=order.id).delete()
+        db.session.delete(db.session.get(Order, order.id))
+        db.session.commit()
+
+
+def add_log(order_id, stage_id, status, hours):
+    end = START + timedelta(hours=hours) if hours is not None else None
+    db.session.add(TimeLog(order_id=order_id, stage_id=stage_id, worker_name='Pracownik 1',
+                           start_time=START, end_time=end, status=status))
+    db.session.commit()
+
+
+def stage_samples(stage_id):
+    model = estimator.train_model()
+    return model.samples[model.stage_ids.index(stage_id)]
+
+
+@pytest.mark.parametrize('status, hours', [('auto_closed', 12), ('stale', None)])
+def test_swept_sessions_are_not_training_samples(app, order, status, hours):
+    with app.app_context():
+        before = stage_samples(1)
+        add_log(order, 1, status, hours)
+        assert stage_samples(1) == before
+        add_log(order, 1, 'completed', 2)
+        assert stage_samples(1) == before + 1
+
+
+def test_stale_sessions_are_left_out_of_timelines(app, admin_client, order):
+    with app.app_context():
+        add_log(order, 1, 'completed', 2)
+        add_log(order, 2, 'stale', None)
+    timeline = admin_client.get(f'/api/orders/{order}/timeline').get_json()
+    assert timeline['lead_time_minutes'] == 120
+    assert not timeline['in_progress']
+    assert [stage['stage_id'] for stage in timeline['stages']] == [1]
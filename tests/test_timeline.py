@@ -0,0 +1,104 @@
+"""Order timelines: interval merging, idle gaps, open sessions and the bulk endpoint."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Order, TimeLog
+from timeline import build_timeline, merge_intervals
+
+START = datetime(2024, 5, 6, 7)
+
+
+def at(minutes):
+    return START + timedelta(minutes=minutes)
+
+
+def test_merge_intervals():
+    assert merge_intervals([]) == []
+    assert merge_intervals([(at(0), at(30)), (at(10), at(20)), (at(20), at(40)), (at(50), at(60))]) == [
+        [at(0), at(40)], [at(50), at(60)]
+    ]
+    assert merge_intervals([(at(0), at(10)), (at(10), at(15))]) == [[at(0), at(15)]]
+
+
+def test_build_timeline_gaps():
+    sessions = [
+        (1, at(0), at(60), 'completed'),
+        (1, at(30), at(90), 'completed'),   # overlaps the first session on stage 1
+        (2, at(120), at(150), 'completed'),
+        (3, at(140), at(200), 'in_progress'),
+    ]
+    timeline = build_timeline(5, 'ZL-5', sessions, {1: 'Spawanie', 2: 'Szklenie', 3: 'Pakowanie'})
+    assert timeline['lead_time_minutes'] == 200
+    assert timeline['production_minutes'] == 170
+    assert timeline['idle_minutes'] == 30
+    assert timeline['in_progress']
+    assert timeline['gaps'] == [{'start': at(90).isoformat(), 'end': at(120).isoformat(), 'minutes': 30}]
+    stage = timeline['stages'][0]
+    assert (stage['worked_minutes'], stage['elapsed_minutes'], stage['work_sessions']) == (120, 90, 2)
+    assert stage['intervals'] == [{'start': at(0).isoformat(), 'end': at(90).isoformat(), 'minutes': 90}]
+
+
+@pytest.fixture
+def orders(app):
+    """Two fresh orders: one finished with overlapping sessions and a gap, one still in production"""
+    with app.app_context():
+        stamp = datetime.utcnow().timestamp()
+        created = [Order(order_number=f'ZL-TL-{stamp}-{number}', system='SLIM', handle_style='1',
+                         welding_frames_qty=2, glazing_frames_qty=2, szpros_complication=1)
+                   for number in range(2)]
+        db.session.add_all(created)
+        db.session.flush()
+        finished, running = [order.id for order in created]
+        db.session.add_all([
+            TimeLog(order_id=finished, stage_id=1, worker_name='A', start_time=at(0), end_time=at(60),
+                    status='completed'),
+            TimeLog(order_id=finished, stage_id=1, worker_name='B', start_time=at(45), end_time=at(75),
+                    status='completed'),
+            TimeLog(order_id=finished, stage_id=2, worker_name='A', start_time=at(100), end_time=at(130),
+                    status='completed'),
+            TimeLog(order_id=running, stage_id=1, worker_name='A', start_time=at(0), end_time=at(30),
+                    status='completed'),
+            TimeLog(order_id=running, stage_id=2, worker_name='A', start_time=at(40), status='in_progress'),
+        ])
+        db.session.commit()
+        yield finished, running
+        TimeLog.query.filter(TimeLog.order_id.in_([finished, running])).delete()
+        for order_id in (finished, running):
+            db.session.delete(db.session.get(Order, order_id))
+        db.session.commit()
+
+
+def test_order_timeline(admin_client, orders):
+    finished, _ = orders
+    timeline = admin_client.get(f'/api/orders/{finished}/timeline').get_json()
+    assert (timeline['lead_time_minutes'], timeline['production_minutes'], timeline['idle_minutes']) == (130, 105, 25)
+    assert [gap['minutes'] for gap in timeline['gaps']] == [25]
+    assert not timeline['in_progress']
+    assert [(stage['stage_id'], stage['elapsed_minutes'], stage['worked_minutes'])
+            for stage in timeline['stages']] == [(1, 75, 90), (2, 30, 30)]
+
+
+def test_open_session_runs_until_now(admin_client, orders):
+    _, running = orders
+    timeline = admin_client.get(f'/api/orders/{running}/timeline').get_json()
+    assert timeline['in_progress']
+    assert [gap['minutes'] for gap in timeline['gaps']] == [10]
+    open_stage = timeline['stages'][1]
+    assert open_stage['active_sessions'] == 1
+    assert datetime.fromisoformat(open_stage['last_end']) >= datetime.utcnow() - timedelta(minutes=1)
+
+
+def test_bulk_timelines(admin_client, orders):
+    finished, running = orders
+    timelines = admin_client.get(f'/api/orders/timelines?order_ids={running},{finished}').get_json()
+    assert [(timeline['order_id'], timeline['in_progress']) for timeline in timelines] == [
+        (finished, False), (running, True)
+    ]
+    assert 'gaps' in timelines[0] and 'intervals' in timelines[0]['stages'][0]
+
+    summaries = admin_client.get(f'/api/orders/timelines?order_ids={finished}&intervals=0').get_json()
+    assert summaries[0]['lead_time_minutes'] == 130
+    assert 'gaps' not in summaries[0] and 'intervals' not in summaries[0]['stages'][0]
+
+    assert admin_client.get('/api/orders/timelines?order_ids=1,x').status_code == 400
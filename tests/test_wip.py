@@ -0,0 +1,84 @@
+"""WIP counters: scan bookkeeping, rebuilding from open time logs and stale-session removal."""
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func
+
+import sweeper
+from journal import EVENT_AUTO_CLOSE
+from models import db, Order, TimeLog
+from wip import WipIndex, wip_index
+
+
+def counts(index):
+    return {row['stage_id']: (row['sessions'], row['orders'], row['workers']) for row in index.snapshot()}
+
+
+def test_start_and_stop_bookkeeping():
+    index = WipIndex()
+    index.set_stage(1, 'Spawanie')
+    index.start(1, order_id=10, worker_id=7)
+    index.start(1, order_id=10, worker_id=8)
+    index.start(1, order_id=11, worker_id=7)
+    index.start(2, order_id=10, worker_id=7)
+    assert counts(index) == {1: (3, 2, 2), 2: (1, 1, 1)}
+
+    index.stop(1, order_id=10, worker_id=8)
+    assert counts(index) == {1: (2, 2, 1), 2: (1, 1, 1)}
+    index.stop(1, order_id=10, worker_id=7)
+    index.stop(1, order_id=11, worker_id=7)
+    assert counts(index) == {1: (0, 0, 0), 2: (1, 1, 1)}
+
+    # A stop without a matching start never drives the counts negative
+    index.stop(1, order_id=10, worker_id=7)
+    assert counts(index)[1] == (0, 0, 0)
+
+    index.remove_stage(2)
+    assert [row['stage_name'] for row in index.snapshot()] == ['Spawanie']
+
+
+def test_rebuild_counts_open_time_logs(app):
+    with app.app_context():
+        index = WipIndex()
+        index.rebuild()
+        expected = {
+            stage_id: (sessions, orders, workers)
+            for stage_id, sessions, orders, workers in db.session.query(
+                TimeLog.stage_id, func.count(), func.count(TimeLog.order_id.distinct()),
+                func.count(TimeLog.worker_id.distinct())
+            ).filter(TimeLog.status == 'in_progress').group_by(TimeLog.stage_id)
+        }
+        snapshot = counts(index)
+    assert expected
+    assert {stage_id: row for stage_id, row in snapshot.items() if row[0]} == expected
+
+
+@pytest.fixture
+def stale_log(app):
+    """An in-progress session on a fresh order, started long before the seeded ones"""
+    with app.app_context():
+        order = Order(order_number=f'ZL-WIP-{datetime.utcnow().timestamp()}', system='SLIM',
+                      handle_style='1', welding_frames_qty=2, glazing_frames_qty=2, szpros_complication=1)
+        db.session.add(order)
+        db.session.flush()
+        time_log = TimeLog(order_id=order.id, stage_id=1, worker_name='Pracownik 1',
+                           start_time=datetime(2000, 1, 3, 7), status='in_progress')
+        db.session.add(time_log)
+        db.session.commit()
+        yield time_log
+        TimeLog.query.filter_by(order_id=order.id).delete()
+        db.session.delete(db.session.get(Order, order.id))
+        db.session.commit()
+        wip_index.rebuild()
+
+
+def test_swept_session_leaves_the_board(app, stale_log):
+    with app.app_context():
+        wip_index.rebuild()
+        sessions, orders, _ = counts(wip_index)[1]
+        swept = sweeper._sweep_stage(SimpleNamespace(id=1, name='Spawanie'), 60, datetime(2001, 1, 1),
+                                     'auto_closed', EVENT_AUTO_CLOSE, datetime.utcnow(), 500, [])
+        assert swept == 1
+        assert counts(wip_index)[1][:2] == (sessions - 1, orders - 1)
+        assert db.session.get(TimeLog, stale_log.id).status == 'auto_closed'
@@ -0,0 +1,104 @@
+"""Order timelines: sessions merged into elapsed production intervals.
+
+Time logs are fetched in one query ordered by (order, start time) and each
+order is processed with a single sort-and-sweep pass: overlapping sessions
+on a stage collapse into one elapsed interval, the union over all stages
+gives the time the order was actually in production, and the holes in that
+union are the idle gaps between (or within) stages.
+"""
+from datetime import datetime
+from itertools import groupby
+from models import db, Order, ProductionStage, TimeLog
+
+
+def _minutes(start, end):
+    return round((end - start).total_seconds() / 60, 2)
+
+
+def merge_intervals(intervals):
+    """Merge (start, end) pairs sorted by start into disjoint intervals"""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def build_timeline(order_id, order_number, sessions, stage_names, include_intervals=True):
+    """Timeline for one order from its (stage_id, start, end, status) rows sorted by start"""
+    stages = {}
+    for stage_id, start, end, status in sessions:
+        stage = stages.setdefault(stage_id, {'intervals': [], 'worked': 0.0, 'sessions': 0, 'open': 0})
+        stage['intervals'].append((start, end))
+        stage['worked'] += (end - start).total_seconds()
+        stage['sessions'] += 1
+        stage['open'] += status == 'in_progress'
+
+    stage_data = []
+    for stage_id, stage in stages.items():
+        merged = merge_intervals(stage['intervals'])
+        item = {
+            'stage_id': stage_id,
+            'stage_name': stage_names.get(stage_id),
+            'work_sessions': stage['sessions'],
+            'active_sessions': stage['open'],
+            'first_start': merged[0][0].isoformat(),
+            'last_end': merged[-1][1].isoformat(),
+            'worked_minutes': round(stage['worked'] / 60, 2),
+            'elapsed_minutes': round(sum((end - start).total_seconds() for start, end in merged) / 60, 2)
+        }
+        if include_intervals:
+            item['intervals'] = [{'start': start.isoformat(), 'end': end.isoformat(),
+                                  'minutes': _minutes(start, end)} for start, end in merged]
+        stage_data.append(item)
+
+    # Rows are already sorted by start time, so the order-wide union is a single sweep
+    production = merge_intervals((start, end) for _, start, end, _ in sessions)
+    gaps = [(production[i][1], production[i + 1][0]) for i in range(len(production) - 1)]
+    lead_minutes = _minutes(production[0][0], production[-1][1])
+    elapsed_minutes = round(sum((end - start).total_seconds() for start, end in production) / 60, 2)
+
+    timeline = {
+        'order_id': order_id,
+        'order_number': order_number,
+        'first_start': production[0][0].isoformat(),
+        'last_end': production[-1][1].isoformat(),
+        'lead_time_minutes': lead_minutes,
+        'production_minutes': elapsed_minutes,
+        'idle_minutes': round(lead_minutes - elapsed_minutes, 2),
+        'in_progress': any(stage['open'] for stage in stages.values()),
+        'stages': stage_data
+    }
+    if include_intervals:
+        timeline['gaps'] = [{'start': start.isoformat(), 'end': end.isoformat(),
+                             'minutes': _minutes(start, end)} for start, end in gaps]
+    return timeline
+
+
+def order_timelines(order_ids=None, criteria=None, include_intervals=True):
+    """Timelines for the given orders (or all orders matching criteria) with logs
+
+    Sessions still in progress are treated as running until now. Sessions the
+    stale sweep flagged have no end until a manager corrects them and are left out.
+    """
+    now = datetime.utcnow()
+    stage_names = dict(db.session.query(ProductionStage.id, ProductionStage.name))
+    query = db.session.query(
+        TimeLog.order_id, Order.order_number, TimeLog.stage_id, TimeLog.start_time, TimeLog.end_time, TimeLog.status
+    ).join(Order, Order.id == TimeLog.order_id)\
+     .filter(TimeLog.status != 'stale')
+    if order_ids is not None:
+        query = query.filter(TimeLog.order_id.in_(order_ids))
+    if criteria:
+        query = query.filter(*criteria)
+    rows = query.order_by(TimeLog.order_id, TimeLog.start_time).execution_options(yield_per=5000)
+
+    timelines = []
+    for (order_id, order_number), order_rows in groupby(rows, key=lambda row: (row.order_id, row.order_number)):
+        sessions = [(row.stage_id, row.start_time, row.end_time or max(now, row.start_time), row.status)
+                    for row in order_rows]
+        timelines.append(build_timeline(order_id, order_number, sessions, stage_names, include_intervals))
+    return timelines
@@ -0,0 +1,87 @@
+"""In-memory work-in-progress counters per production stage.
+
+The index is rebuilt from in-progress time logs at startup and then kept up
+to date by the scan endpoint, so the live WIP board is served without
+querying the database. Counts are per process: each app worker keeps its
+own index, which is exact as long as all scans for a database go through
+the same process. Each plant has its own index; wip_index resolves to the
+current plant's.
+"""
+import threading
+from collections import Counter, defaultdict
+from werkzeug.local import LocalProxy
+from models import db, ProductionStage, TimeLog
+from plants import current_plant
+
+
+class WipIndex:
+    """Active sessions, distinct orders and distinct workers per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stage_names = {}
+        self._orders = {}   # stage_id -> Counter(order_id -> active sessions)
+        self._workers = {}  # stage_id -> Counter(worker_id -> active sessions)
+        self._sessions = Counter()  # stage_id -> active sessions
+
+    def rebuild(self):
+        """Reload stage names and active sessions from the database"""
+        stage_names = dict(db.session.query(ProductionStage.id, ProductionStage.name))
+        orders = {stage_id: Counter() for stage_id in stage_names}
+        workers = {stage_id: Counter() for stage_id in stage_names}
+        sessions = Counter()
+        for stage_id, order_id, worker_id in db.session.query(
+                TimeLog.stage_id, TimeLog.order_id, TimeLog.worker_id).filter(TimeLog.status == 'in_progress'):
+            orders.setdefault(stage_id, Counter())[order_id] += 1
+            workers.setdefault(stage_id, Counter())[worker_id] += 1
+            sessions[stage_id] += 1
+        with self._lock:
+            self._stage_names = stage_names
+            self._orders = orders
+            self._workers = workers
+            self._sessions = sessions
+
+    def set_stage(self, stage_id, name):
+        with self._lock:
+            self._stage_names[stage_id] = name
+            self._orders.setdefault(stage_id, Counter())
+            self._workers.setdefault(stage_id, Counter())
+
+    def remove_stage(self, stage_id):
+        with self._lock:
+            self._stage_names.pop(stage_id, None)
+            self._orders.pop(stage_id, None)
+            self._workers.pop(stage_id, None)
+            self._sessions.pop(stage_id, None)
+
+    def start(self, stage_id, order_id, worker_id):
+        with self._lock:
+            self._orders.setdefault(stage_id, Counter())[order_id] += 1
+            self._workers.setdefault(stage_id, Counter())[worker_id] += 1
+            self._sessions[stage_id] += 1
+
+    def stop(self, stage_id, order_id, worker_id):
+        with self._lock:
+            if self._sessions[stage_id] > 0:
+                self._sessions[stage_id] -= 1
+            for counter, key in ((self._orders.get(stage_id), order_id), (self._workers.get(stage_id), worker_id)):
+                if counter is None or key not in counter:
+                    continue
+                counter[key] -= 1
+                if counter[key] <= 0:
+                    del counter[key]
+
+    def snapshot(self):
+        """Current counts per stage, in stage id order"""
+        with self._lock:
+            return [{
+                'stage_id': stage_id,
+                'stage_name': self._stage_names.get(stage_id),
+                'orders': len(self._orders[stage_id]),
+                'workers': len(self._workers[stage_id]),
+                'sessions': self._sessions[stage_id]
+            } for stage_id in sorted(self._orders)]
+
+
+wip_indexes = defaultdict(WipIndex)  # plant -> index
+wip_index = LocalProxy(lambda: wip_indexes[current_plant()])